@@ -0,0 +1,112 @@
+import math
+import re
+import threading
+import time
+
+# Класи запитів від найвищого пріоритету до найнижчого.
+# limit — одночасно виконуваних запитів класу, queue — скільки може чекати на місце,
+# wait_sec — найдовше очікування в черзі, після якого запит відкидається з 503
+PRIORITY_CLASSES = {
+    "iot": {"limit": 16, "queue": 64, "wait_sec": 5.0},
+    "circulation": {"limit": 8, "queue": 32, "wait_sec": 3.0},
+    "browsing": {"limit": 4, "queue": 16, "wait_sec": 1.0},
+    "reports": {"limit": 2, "queue": 2, "wait_sec": 0.2},
+}
+
+# Довгі з'єднання (SSE, long-poll) та лічильники моніторингу не займають місць у пулах
+UNMANAGED = re.compile(r"^/iot/stations/[^/]+/events(/poll)?$|^/admin/reports/(admission|coalescing|entity-cache|statement-cache|otp-throttle|sessions)$")
+
+# Правила класифікації за префіксом шляху; перше збігле правило перемагає
+RULES = (
+    ("/iot/", "iot"),
+    ("/librarian/", "circulation"),
+    ("/reservations/", "circulation"),
+    ("/loans/", "circulation"),
+    ("/auth/", "circulation"),
+    ("/admin/", "reports"),
+    ("/books/", "browsing"),
+    ("/users/", "browsing"),
+    ("/events", "browsing"),
+)
+DEFAULT_CLASS = "browsing"
+
+
+# Клас пріоритету для шляху запиту або None, якщо запит не обмежується
+def classify(path: str) -> str | None:
+    if UNMANAGED.match(path):
+        return None
+    for prefix, priority_class in RULES:
+        if path.startswith(prefix):
+            return priority_class
+    return DEFAULT_CLASS
+
+
+class _Pool:
+    def __init__(self, limit: int, queue: int, wait_sec: float):
+        self.limit = limit
+        self.queue = queue
+        self.wait_sec = wait_sec
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.condition = threading.Condition()
+
+
+# Допуск запитів за класами: кожен клас має власний обмежений пул, тож звіти
+# не забирають потоки й з'єднання з БД у поштоматів і видачі. Коли черга класу
+# заповнена або очікування затягується, запит одразу відкидається (503 + Retry-After)
+class AdmissionController:
+    def __init__(self, classes: dict = PRIORITY_CLASSES):
+        self.pools = {name: _Pool(**params) for name, params in classes.items()}
+
+    # Повертає 0, якщо місце отримано (після виконання потрібно викликати release),
+    # інакше — рекомендовану затримку для Retry-After у секундах
+    def acquire(self, priority_class: str) -> int:
+        pool = self.pools[priority_class]
+        with pool.condition:
+            if pool.active < pool.limit:
+                pool.active += 1
+                pool.admitted += 1
+                return 0
+            if pool.waiting >= pool.queue:
+                pool.shed += 1
+                return self._retry_after(pool)
+            pool.waiting += 1
+            deadline = time.monotonic() + pool.wait_sec
+            try:
+                while pool.active >= pool.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        pool.shed += 1
+                        return self._retry_after(pool)
+                    pool.condition.wait(remaining)
+            finally:
+                pool.waiting -= 1
+            pool.active += 1
+            pool.admitted += 1
+            return 0
+
+    def release(self, priority_class: str):
+        pool = self.pools[priority_class]
+        with pool.condition:
+            pool.active -= 1
+            pool.condition.notify()
+
+    # Чим глибша черга, тим довше варто зачекати клієнту
+    @staticmethod
+    def _retry_after(pool: _Pool) -> int:
+        return max(1, math.ceil(pool.wait_sec * (1 + pool.waiting / max(pool.limit, 1))))
+
+    def stats(self) -> dict:
+        report = {}
+        for name, pool in self.pools.items():
+            with pool.condition:
+                report[name] = {
+                    "limit": pool.limit, "active": pool.active, "waiting": pool.waiting,
+                    "admitted": pool.admitted, "shed": pool.shed,
+                }
+        return report
+
+
+admission = AdmissionController()
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from models import Loan, LoanArchive
+from read_models import LoanRow, loan_query, project
+
+ARCHIVE_AFTER_MONTHS = 12
+ARCHIVE_BATCH_SIZE = 1000
+
+ARCHIVE_COLUMNS = ("loan_id", "user_id", "book_id", "issue_date", "due_date", "return_date")
+
+
+# Переносить позики, повернені понад N місяців тому, у loans_archive пакетами.
+# Кожен пакет — окрема транзакція (INSERT ... SELECT + DELETE)
+def archive_returned_loans(db: Session, months: int = ARCHIVE_AFTER_MONTHS,
+                           batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=30 * months)
+    # Позика з найбільшим loan_id лишається в loans, щоб SQLite не видав її id повторно
+    max_loan_id = db.query(func.max(Loan.loan_id)).scalar()
+    if max_loan_id is None:
+        return 0
+
+    moved = 0
+    while True:
+        ids = [row.loan_id for row in (
+            db.query(Loan.loan_id)
+            .filter(
+                Loan.return_date.isnot(None),
+                Loan.return_date < cutoff,
+                Loan.loan_id < max_loan_id
+            )
+            .order_by(Loan.loan_id)
+            .limit(batch_size)
+        )]
+        if not ids:
+            break
+
+        columns = [getattr(Loan, c) for c in ARCHIVE_COLUMNS]
+        db.execute(
+            LoanArchive.__table__.insert().from_select(
+                list(ARCHIVE_COLUMNS) + ["archived_at"],
+                select(*columns, literal(datetime.utcnow(), DateTime)).where(Loan.loan_id.in_(ids))
+            )
+        )
+        db.query(Loan).filter(Loan.loan_id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        moved += len(ids)
+    return moved
+
+
+# Межа архіву: найпізніша дата повернення серед архівних позик
+def archive_horizon(db: Session) -> datetime | None:
+    return db.query(func.max(LoanArchive.return_date)).scalar()
+
+
+# Чи потрібен архів для історії, починаючи з дати since (None — вся історія)
+def archive_needed(db: Session, since: datetime | None = None) -> bool:
+    horizon = archive_horizon(db)
+    if horizon is None:
+        return False
+    return since is None or since <= horizon
+
+
+# Історія позик: гаряча таблиця + архів, лише якщо період його зачіпає
+def loan_history(db: Session, since: datetime | None = None, **filters) -> list[LoanRow]:
+    def apply(model):
+        query = loan_query(db, model)
+        for column, value in filters.items():
+            query = query.filter(getattr(model, column) == value)
+        if since is not None:
+            if model is Loan:
+                query = query.filter(Loan.return_date.is_(None) | (Loan.return_date >= since))
+            else:
+                query = query.filter(LoanArchive.return_date >= since)
+        return query
+
+    loans = project(apply(Loan), LoanRow)
+    if archive_needed(db, since):
+        loans += project(apply(LoanArchive), LoanRow)
+        loans.sort(key=lambda loan: loan.loan_id)
+    return loans
+
+
+# Об'єднання loans і loans_archive для звітів за весь час
+def all_loans(db: Session, after_loan_id: int = 0):
+    hot = select(*[getattr(Loan, c) for c in ARCHIVE_COLUMNS]).where(Loan.loan_id > after_loan_id)
+    max_archived = db.query(func.max(LoanArchive.loan_id)).scalar()
+    if max_archived is None or max_archived <= after_loan_id:
+        return hot.subquery()
+    cold = select(*[getattr(LoanArchive, c) for c in ARCHIVE_COLUMNS]).where(LoanArchive.loan_id > after_loan_id)
+    return union_all(hot, cold).subquery()
+
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal, engine
+    from models import Base
+
+    Base.metadata.create_all(bind=engine)
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_MONTHS
+    session = SessionLocal()
+    try:
+        print(f"Перенесено в архів позик: {archive_returned_loans(session, months)}")
+    finally:
+        session.close()
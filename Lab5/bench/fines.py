@@ -0,0 +1,36 @@
+# Бенчмарк векторизованого розрахунку штрафів на синтетичних відкритих позиках.
+# Запуск з каталогу Lab5: python bench/fines.py [кількість_позик]
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fines import FINE_RULES, aggregate_by_user, compute_fines, julian_day, rule_arrays
+from datetime import datetime
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    rng = np.random.default_rng(42)
+    now = julian_day(datetime.utcnow())
+    due_date = now - rng.uniform(-14, 60, n)
+    user_id = rng.integers(1, n // 5, n)
+    categories = ["", "Довідники", "Поезія", "Програмування"]
+    category_code = rng.integers(0, len(categories), n)
+    rates, caps, grace = rule_arrays(categories, FINE_RULES)
+
+    start = time.perf_counter()
+    days_overdue, fines = compute_fines(due_date, category_code, rates, caps, grace, now)
+    computed = time.perf_counter()
+    users, totals, counts = aggregate_by_user(user_id, fines)
+    aggregated = time.perf_counter()
+
+    print(f"Позик: {n}, з штрафом: {np.count_nonzero(fines)}, користувачів: {len(users)}")
+    print(f"Розрахунок: {(computed - start) * 1000:.0f} мс, агрегація: {(aggregated - computed) * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Бенчмарк нечіткого пошуку на каталозі з великою кількістю примірників.
+# Запуск з каталогу Lab5: python bench/fuzzy_search.py [кількість_примірників]
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Book, BookTrigram, BookStatus
+from translit import trigrams
+from crud.reader import fuzzy_search_books
+
+SYLLABLES = [c + v for c in "бвгджзклмнпрстфхцчш" for v in "аеиоуяюі"] + ["ко", "лен", "шев", "чен", "їн", "сть", "ор"]
+DISTINCT_TITLES = 20000
+
+
+def word(rng, parts):
+    return "".join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def misspell(rng, text):
+    i = rng.randrange(1, len(text) - 1)
+    return text[:i] + rng.choice("абвгдеклмнор") + text[i + 1:]
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+
+    editions = [
+        (f"{word(rng, 3)} {word(rng, 2)}", f"{word(rng, 2)} {word(rng, 3)}")
+        for _ in range(DISTINCT_TITLES)
+    ]
+    edition_trigrams = [sorted(trigrams(t) | trigrams(a)) for t, a in editions]
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        batch_books, batch_trigrams = [], []
+        for book_id in range(1, copies + 1):
+            n = book_id % DISTINCT_TITLES
+            title, author = editions[n]
+            batch_books.append({"book_id": book_id, "title": title, "author": author,
+                                "status": BookStatus.AVAILABLE})
+            batch_trigrams.extend({"trigram": t, "book_id": book_id} for t in edition_trigrams[n])
+            if len(batch_books) >= 20000:
+                conn.execute(Book.__table__.insert(), batch_books)
+                conn.execute(BookTrigram.__table__.insert(), batch_trigrams)
+                batch_books, batch_trigrams = [], []
+        if batch_books:
+            conn.execute(Book.__table__.insert(), batch_books)
+            conn.execute(BookTrigram.__table__.insert(), batch_trigrams)
+    print(f"Каталог: {copies} примірників, {DISTINCT_TITLES} назв, завантаження {time.perf_counter() - start:.1f} с")
+
+    db = sessionmaker(bind=engine)()
+    queries = [misspell(rng, editions[rng.randrange(DISTINCT_TITLES)][1]) for _ in range(50)]
+    timings, hits = [], 0
+    for q in queries:
+        t = time.perf_counter()
+        result = fuzzy_search_books(db, q)
+        timings.append(time.perf_counter() - t)
+        hits += bool(result)
+    timings.sort()
+    print(f"Запитів: {len(queries)}, знайдено: {hits}")
+    print(f"p50 {timings[len(timings) // 2] * 1000:.1f} мс, p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} мс")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Бенчмарк одночасних входів зі scrypt: перевірка в потоці запиту проти пулу процесів.
+# Паралельно вимірюється затримка легкого запиту (get_user), який обслуговують ті самі потоки.
+# Запуск з каталогу Lab5: python bench/passwords.py [потоків] [входів_на_потік]
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, User, UserRole
+from passwords import PasswordHasher
+import crud.reader
+from crud.reader import authenticate_user, get_user
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))] if values else 0.0
+
+
+def run(session_factory, hasher: PasswordHasher, threads: int, logins: int, users: int):
+    crud.reader.password_hasher = hasher
+    latencies, probe = [], []
+    stop = threading.Event()
+
+    def login_worker(worker: int):
+        db = session_factory()
+        for i in range(logins):
+            n = (worker * logins + i) % users + 1
+            started = time.perf_counter()
+            assert authenticate_user(db, f"reader{n}@example.com", f"password{n}")
+            latencies.append(time.perf_counter() - started)
+        db.close()
+
+    def probe_worker():
+        db = session_factory()
+        while not stop.is_set():
+            started = time.perf_counter()
+            get_user(db, 1)
+            probe.append(time.perf_counter() - started)
+            time.sleep(0.005)
+        db.close()
+
+    prober = threading.Thread(target=probe_worker)
+    prober.start()
+    workers = [threading.Thread(target=login_worker, args=(w,)) for w in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return len(latencies) / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.95), percentile(probe, 0.99)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    users = 200
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+
+    pool = PasswordHasher()
+    pool.start()
+    started = time.perf_counter()
+    hashes = pool.hash_many([f"password{i}" for i in range(1, users + 1)])
+    print(f"Ядер: {os.cpu_count()}, процесів у пулі: {pool.workers}")
+    print(f"Масове хешування {users} паролів у пулі: {time.perf_counter() - started:.2f} с")
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"user_id": i, "name": f"Читач {i}", "email": f"reader{i}@example.com",
+             "password_hash": hashes[i - 1], "role": UserRole.READER}
+            for i in range(1, users + 1)
+        ])
+
+    session_factory = sessionmaker(bind=engine)
+    print(f"Входів: {threads} потоків x {logins}")
+    print(f"{'режим':<10}{'входів/с':>10}{'p50 мс':>10}{'p95 мс':>10}{'get_user p99 мс':>17}")
+    for name, hasher in (("потік", PasswordHasher(workers=0)), ("пул", pool)):
+        throughput, p50, p95, probe = run(session_factory, hasher, threads, logins, users)
+        print(f"{name:<10}{throughput:>10.1f}{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}{probe * 1000:>17.1f}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
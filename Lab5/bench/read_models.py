@@ -0,0 +1,104 @@
+# Бенчмарк списків: повні ORM-об'єкти проти проєкцій у read_models.
+# Запуск з каталогу Lab5: python bench/read_models.py [кількість_рядків]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Book, BookStatus, Loan, User, UserRole
+from crud.reader import search_books, get_user_loans
+from crud.admin import get_users
+
+
+def books_orm(db):
+    return [{"book_id": b.book_id, "title": b.title, "author": b.author, "status": b.status.value}
+            for b in db.query(Book).order_by(Book.book_id).all()]
+
+
+def books_rows(db):
+    return [{"book_id": b.book_id, "title": b.title, "author": b.author, "status": b.status.value}
+            for b in search_books(db, "")]
+
+
+def users_orm(db):
+    return [{"user_id": u.user_id, "name": u.name, "email": u.email, "role": u.role.value}
+            for u in db.query(User).all()]
+
+
+def users_rows(db):
+    return [{"user_id": u.user_id, "name": u.name, "email": u.email, "role": u.role.value}
+            for u in get_users(db)]
+
+
+# Як було раніше: ORM-позики і окремий запит книги на кожен рядок
+def loans_orm(db):
+    return [{"loan_id": loan.loan_id, "book_title": db.query(Book).filter(Book.book_id == loan.book_id).first().title,
+             "due_date": loan.due_date.isoformat()}
+            for loan in db.query(Loan).filter(Loan.user_id == 1).all()]
+
+
+def loans_rows(db):
+    return [{"loan_id": loan.loan_id, "book_title": loan.book_title, "due_date": loan.due_date.isoformat()}
+            for loan in get_user_loans(db, 1)]
+
+
+def measure(session_factory, fn):
+    db = session_factory()
+    start = time.perf_counter()
+    fn(db)
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    db = session_factory()
+    tracemalloc.start()
+    fn(db)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.close()
+    return elapsed, peak
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+
+    now = datetime.utcnow()
+    loans_per_user = 5000 if n >= 5000 else n
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"user_id": i, "name": f"Читач {i}", "email": f"reader{i}@example.com", "password_hash": "x" * 64,
+             "phone": "+380000000000", "role": UserRole.READER}
+            for i in range(1, n + 1)
+        ])
+        conn.execute(Book.__table__.insert(), [
+            {"book_id": i, "title": f"Книга {i}", "author": f"Автор {i % 1000}", "status": BookStatus.AVAILABLE,
+             "category": "Бенчмарк", "location": "Стелаж 1", "tags": "бенчмарк"}
+            for i in range(1, n + 1)
+        ])
+        conn.execute(Loan.__table__.insert(), [
+            {"loan_id": i, "user_id": 1, "book_id": i, "issue_date": now - timedelta(days=30),
+             "due_date": now - timedelta(days=16), "return_date": now - timedelta(days=20)}
+            for i in range(1, loans_per_user + 1)
+        ])
+
+    session_factory = sessionmaker(bind=engine)
+    print(f"Рядків: {n} книг, {n} користувачів, {loans_per_user} позик одного читача")
+    print(f"{'список':<12}{'ORM мс':>10}{'рядки мс':>10}{'ORM МБ':>10}{'рядки МБ':>10}")
+    for name, before, after in (("книги", books_orm, books_rows), ("користувачі", users_orm, users_rows),
+                                ("позики", loans_orm, loans_rows)):
+        t_before, m_before = measure(session_factory, before)
+        t_after, m_after = measure(session_factory, after)
+        print(f"{name:<12}{t_before * 1000:>10.0f}{t_after * 1000:>10.0f}"
+              f"{m_before / 2**20:>10.1f}{m_after / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Мікробенчмарк гарячих запитів crud: ланцюжок db.query(...).filter(...) на кожен виклик
+# проти готових select() з bindparam зі statements.py.
+# Запуск з каталогу Lab5: python bench/statements.py [кількість_викликів]
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Book, BookStatus, Reservation, ReservationStatus, User, UserRole
+from statements import fetch_first, USER_BY_ID, USER_BY_EMAIL, ACTIVE_RESERVATION_FOR_BOOK
+
+
+def legacy_user(db, i):
+    return db.query(User).filter(User.user_id == i).first()
+
+
+def prepared_user(db, i):
+    return fetch_first(db, USER_BY_ID, user_id=i)
+
+
+def legacy_email(db, i):
+    return db.query(User).filter(User.email == f"reader{i}@example.com").first()
+
+
+def prepared_email(db, i):
+    return fetch_first(db, USER_BY_EMAIL, email=f"reader{i}@example.com")
+
+
+def legacy_reservation(db, i):
+    return db.query(Reservation).filter(
+        Reservation.book_id == i,
+        Reservation.expiry_date > datetime.utcnow(),
+        Reservation.status == ReservationStatus.ACTIVE
+    ).order_by(Reservation.reservation_date.asc()).first()
+
+
+def prepared_reservation(db, i):
+    return fetch_first(db, ACTIVE_RESERVATION_FOR_BOOK, book_id=i, now=datetime.utcnow())
+
+
+def timed(db, fn, calls: int, rows: int) -> float:
+    for i in range(100):
+        fn(db, i % rows + 1)
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(db, i % rows + 1)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rows = 1000
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"user_id": i, "name": f"Читач {i}", "email": f"reader{i}@example.com", "password_hash": "x",
+             "role": UserRole.READER} for i in range(1, rows + 1)
+        ])
+        conn.execute(Book.__table__.insert(), [
+            {"book_id": i, "title": f"Книга {i}", "author": "Автор", "status": BookStatus.RESERVED}
+            for i in range(1, rows + 1)
+        ])
+        conn.execute(Reservation.__table__.insert(), [
+            {"reservation_id": i, "user_id": i, "book_id": i, "reservation_date": now,
+             "expiry_date": now + timedelta(days=7), "status": ReservationStatus.ACTIVE}
+            for i in range(1, rows + 1)
+        ])
+
+    db = sessionmaker(bind=engine)()
+    print(f"Викликів: {calls}")
+    print(f"{'запит':<14}{'query мкс':>12}{'select мкс':>12}{'економія':>10}")
+    for name, legacy, prepared in (("get_user", legacy_user, prepared_user),
+                                   ("by_email", legacy_email, prepared_email),
+                                   ("reservation", legacy_reservation, prepared_reservation)):
+        before = timed(db, legacy, calls, rows)
+        after = timed(db, prepared, calls, rows)
+        print(f"{name:<14}{before * 1e6:>12.1f}{after * 1e6:>12.1f}{(1 - after / before) * 100:>9.0f}%")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
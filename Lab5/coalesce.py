@@ -0,0 +1,118 @@
+import functools
+import threading
+import time
+from flask import Response, current_app, request
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Single-flight: одночасні виклики з однаковим ключем чекають на одне обчислення
+# і отримують спільний результат. Необов'язковий ttl тримає успішний результат
+# ще кілька секунд після завершення, щоб прикрити запити, що прийшли трохи пізніше
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._recent = {}     # key -> (expires_at, result)
+        self.counters = {"requests": 0, "executions": 0, "joined": 0, "ttl_hits": 0}
+
+    def do(self, key, fn, ttl: float = 0, cacheable=lambda result: True):
+        now = time.monotonic()
+        with self._lock:
+            self.counters["requests"] += 1
+            recent = self._recent.get(key)
+            if recent and recent[0] > now:
+                self.counters["ttl_hits"] += 1
+                return recent[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["executions"] += 1
+            else:
+                self.counters["joined"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and ttl > 0 and cacheable(call.result):
+                    self._prune(now)
+                    self._recent[key] = (time.monotonic() + ttl, call.result)
+            call.done.set()
+        return call.result
+
+    # Чи приєднається виклик з цим ключем до вже наявного результату (в обчисленні чи в ttl)
+    def joinable(self, key) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent.get(key)
+            return key in self._calls or bool(recent and recent[0] > now)
+
+    def _prune(self, now: float):
+        for key in [k for k, (expires_at, _) in self._recent.items() if expires_at <= now]:
+            del self._recent[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            in_flight = len(self._calls)
+        shared = counters["joined"] + counters["ttl_hits"]
+        return {
+            **counters,
+            "in_flight": in_flight,
+            "coalescing_ratio": round(shared / counters["requests"], 3) if counters["requests"] else 0.0,
+        }
+
+
+single_flight = SingleFlight()
+
+
+# Ключ поточного запиту: маршрут, параметри шляху та відсортовані параметри запиту
+def request_key() -> tuple:
+    return (request.endpoint, tuple(sorted((request.view_args or {}).items())),
+            tuple(sorted(request.args.items(multi=True))))
+
+
+# Запит до маршруту з @coalesced, який лише отримає вже наявний результат.
+# Такому запиту не потрібне місце в пулі допуску: обчислення вже виконується (або готове)
+def joins_in_flight() -> bool:
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "coalesced", False) and single_flight.joinable(request_key())
+
+
+# Декоратор для маршрутів читання: ключ — маршрут і відсортовані параметри запиту.
+# Ділиться готове тіло відповіді; кожен запит отримує власний об'єкт Response
+def coalesced(ttl: float = 0):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request_key()
+
+            def compute():
+                response = current_app.make_response(view(*args, **kwargs))
+                return response.get_data(), response.status_code, response.mimetype
+
+            body, status, mimetype = single_flight.do(
+                key, compute, ttl, cacheable=lambda result: result[1] == 200
+            )
+            return Response(body, status=status, mimetype=mimetype)
+        # functools.wraps зовнішніх декораторів копіює позначку до функції маршруту
+        wrapper.coalesced = True
+        return wrapper
+    return decorator
@@ -1,8 +1,16 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime
-from models import User, Book, Loan, UserRole
+from models import User, Book, Loan, UserRole, CirculationRollup
 from crud.reader import hash_password
+from passwords import password_hasher
+from rollups import GRANULARITIES, GROUP_BY, bucket_start
+from archive import all_loans
+from fines import assess_fines
+from entity_cache import entity_cache
+from sessions import session_store
+from read_models import UserRow, OverdueRow, USER_COLUMNS, project
+from statements import fetch_first, USER_BY_ID, USER_BY_EMAIL
 
 # Створення користувача
 def create_user(
@@ -13,7 +21,7 @@ def create_user(
     phone: str = None,
     role: UserRole = UserRole.READER
 ):
-    if db.query(User).filter(User.email == email).first():
+    if fetch_first(db, USER_BY_EMAIL, email=email):
         raise ValueError("Користувач з таким email уже існує")
 
     user = User(
@@ -28,16 +36,41 @@ def create_user(
     db.refresh(user)
     return user
 
+# Масовий імпорт користувачів: паролі хешуються паралельно в пулі процесів,
+# усі записи додаються однією транзакцією. Повертає створених користувачів
+def import_users(db: Session, records: list[dict]) -> list[User]:
+    emails = [r.get("email") for r in records]
+    if not all(r.get("name") and r.get("email") and r.get("password") for r in records):
+        raise ValueError("Кожен користувач має містити name, email та password")
+    if len(set(emails)) != len(emails):
+        raise ValueError("Email користувачів у пакеті повторюються")
+    existing = {row.email for row in db.query(User.email).filter(User.email.in_(emails))}
+    if existing:
+        raise ValueError(f"Користувачі з такими email уже існують: {', '.join(sorted(existing))}")
+    try:
+        roles = [UserRole(r.get("role", UserRole.READER.value)) for r in records]
+    except ValueError:
+        raise ValueError("Недійсна роль користувача")
+
+    hashes = password_hasher.hash_many([r["password"] for r in records])
+    users = [
+        User(name=r["name"], email=r["email"], password_hash=h, phone=r.get("phone"), role=role)
+        for r, h, role in zip(records, hashes, roles)
+    ]
+    db.add_all(users)
+    db.commit()
+    return users
+
 # Отримання списку користувачів
-def get_users(db: Session, role: UserRole = None):
-    query = db.query(User)
+def get_users(db: Session, role: UserRole = None) -> list[UserRow]:
+    query = db.query(*USER_COLUMNS)
     if role:
         query = query.filter(User.role == role)
-    return query.all()
+    return project(query, UserRow)
 
 # Оновлення користувача
 def update_user(db: Session, user_id: int, **kwargs):
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = fetch_first(db, USER_BY_ID, user_id=user_id)
     if not user:
         return None
 
@@ -57,17 +90,23 @@ def update_user(db: Session, user_id: int, **kwargs):
 
     for key, value in kwargs.items():
         setattr(user, key, value)
+    entity_cache.invalidate(db, "user", user_id)
 
     db.commit()
+    # Сесії зберігають роль — після зміни ролі чи пароля потрібен повторний вхід
+    if "role" in kwargs or "password_hash" in kwargs:
+        session_store.revoke_user(user_id)
     db.refresh(user)
     return user
 
 # Видалення користувача
 def delete_user(db, user_id):
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = fetch_first(db, USER_BY_ID, user_id=user_id)
     if user:
         db.delete(user)
+        entity_cache.invalidate(db, "user", user_id)
         db.commit()
+        session_store.revoke_user(user_id)
         return True
     return False
 
@@ -78,55 +117,122 @@ def change_user_role(db: Session, user_id: int, new_role: str):
     except ValueError:
         raise ValueError("Недійсна роль користувача")
 
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = fetch_first(db, USER_BY_ID, user_id=user_id)
     if not user:
         return None
 
     user.role = new_role_enum
+    entity_cache.invalidate(db, "user", user_id)
     db.commit()
+    session_store.revoke_user(user_id)
     db.refresh(user)
     return user
 
 # Топ популярних книг
 def get_popular_books(db: Session, limit: int = 10):
+    loans = all_loans(db)
     return (
         db.query(
             Book.book_id,
             Book.title,
             Book.author,
-            func.count(Loan.loan_id).label("loan_count")
+            func.count(loans.c.loan_id).label("loan_count")
         )
-        .join(Loan, Book.book_id == Loan.book_id)
+        .join(loans, Book.book_id == loans.c.book_id)
         .group_by(Book.book_id)
-        .order_by(func.count(Loan.loan_id).desc())
+        .order_by(func.count(loans.c.loan_id).desc())
         .limit(limit)
         .all()
     )
 
-# Прострочені позики
-def get_overdue_loans(db: Session):
-    return (
-        db.query(Loan)
+# Прострочені позики (рядки OverdueRow)
+def get_overdue_loans(db: Session) -> list[OverdueRow]:
+    return project(
+        db.query(User.name, User.email, Book.title, Loan.due_date)
+        .join(User, User.user_id == Loan.user_id)
+        .join(Book, Book.book_id == Loan.book_id)
         .filter(
             Loan.return_date.is_(None),
             Loan.due_date < datetime.utcnow()
-        )
-        .all()
+        ),
+        OverdueRow
     )
 
 # Активність читачів
 def get_reader_activity(db: Session, limit: int = 10):
+    loans = all_loans(db)
     return (
         db.query(
             User.user_id,
             User.name,
             User.email,
-            func.count(Loan.loan_id).label("loan_count")
+            func.count(loans.c.loan_id).label("loan_count")
         )
-        .join(Loan, User.user_id == Loan.user_id)
+        .join(loans, User.user_id == loans.c.user_id)
         .filter(User.role == UserRole.READER)
         .group_by(User.user_id)
-        .order_by(func.count(Loan.loan_id).desc())
+        .order_by(func.count(loans.c.loan_id).desc())
         .limit(limit)
         .all()
-    )
\ No newline at end of file
+    )
+
+def _trend_filter(db: Session, start: datetime, end: datetime, granularity: str, group_by: str):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Недійсна гранулярність. Дозволені значення: {list(GRANULARITIES)}")
+    if group_by not in GROUP_BY:
+        raise ValueError(f"Недійсне групування. Дозволені значення: {list(GROUP_BY)}")
+    if start > end:
+        raise ValueError("Початок періоду має бути раніше за кінець")
+    return db.query(CirculationRollup).filter(
+        CirculationRollup.granularity == granularity,
+        CirculationRollup.group_by == group_by,
+        CirculationRollup.bucket >= bucket_start(start, granularity),
+        CirculationRollup.bucket <= end
+    )
+
+# Динаміка видач і повернень за період (читає лише агрегати)
+def get_circulation_trends(db: Session, start: datetime, end: datetime,
+                           granularity: str = "day", group_by: str = "all"):
+    return (
+        _trend_filter(db, start, end, granularity, group_by)
+        .order_by(CirculationRollup.bucket, CirculationRollup.loans.desc())
+        .all()
+    )
+
+# Найпопулярніші категорії чи автори за період
+def get_trend_leaders(db: Session, start: datetime, end: datetime,
+                      granularity: str = "day", group_by: str = "category", limit: int = 10):
+    if group_by == "all":
+        raise ValueError("Для рейтингу потрібне групування за category або author")
+    return (
+        _trend_filter(db, start, end, granularity, group_by)
+        .with_entities(
+            CirculationRollup.group_key,
+            func.sum(CirculationRollup.loans).label("loan_count"),
+            func.sum(CirculationRollup.returns).label("return_count")
+        )
+        .group_by(CirculationRollup.group_key)
+        .order_by(func.sum(CirculationRollup.loans).desc())
+        .limit(limit)
+        .all()
+    )
+
+# Звіт про штрафи: розрахунок по всіх відкритих позиках та топ боржників
+def get_fines_report(db: Session, limit: int = 50, persist: bool = True):
+    report = assess_fines(db, persist=persist, top=limit)
+    top = report["users"]
+    users = {
+        u.user_id: u for u in
+        db.query(User.user_id, User.name, User.email).filter(User.user_id.in_([t[0] for t in top]))
+    }
+    report["users"] = [
+        {
+            "user_id": user_id,
+            "name": users[user_id].name if user_id in users else None,
+            "email": users[user_id].email if user_id in users else None,
+            "amount": amount,
+            "fined_loans": fined_loans,
+        }
+        for user_id, amount, fined_loans in top
+    ]
+    return report
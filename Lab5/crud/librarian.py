@@ -1,10 +1,20 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from models import User, Book, Loan, Reservation, BookStatus, ReservationStatus, UserRole
-
-# Створення видачі
-def create_loan(db: Session, user_id: int, book_id: int, days: int = 14):
-    book = db.query(Book).filter(Book.book_id == book_id).first()
+from crud.reader import index_book_search_keys, set_book_status, stage_in_locker
+from lockers import cell_allocator, cell_for_reservation
+from read_models import LoanRow, UserRow, USER_COLUMNS, project
+from statements import fetch_first, BOOK_BY_ID, LOAN_BY_ID, ACTIVE_RESERVATION_FOR_BOOK
+from events import append_event
+from suggest import suggest_index
+from rollups import record_circulation
+from archive import loan_history
+
+# Створення видачі; issued_at — фактичний час видачі (для подій, що надійшли від поштомату із затримкою).
+# З commit=False зміни лише скидаються в БД, щоб викликач міг зафіксувати кілька операцій разом
+def create_loan(db: Session, user_id: int, book_id: int, days: int = 14,
+                issued_at: datetime | None = None, commit: bool = True):
+    book = fetch_first(db, BOOK_BY_ID, book_id=book_id)
     if not book:
         raise ValueError("Книга не знайдена")
     if book.status == BookStatus.WITHDRAWN:
@@ -12,53 +22,64 @@ def create_loan(db: Session, user_id: int, book_id: int, days: int = 14):
     if book.status == BookStatus.ISSUED:
         raise ValueError("Книга вже видана")
 
+    issue_date = issued_at or datetime.utcnow()
     # Перевірка активного бронювання
-    active_res = db.query(Reservation).filter(
-        Reservation.book_id == book_id,
-        Reservation.expiry_date > datetime.utcnow(),
-        Reservation.status == ReservationStatus.ACTIVE
-    ).first()
+    active_res = fetch_first(db, ACTIVE_RESERVATION_FOR_BOOK, book_id=book_id, now=issue_date)
 
     if active_res and active_res.user_id != user_id:
         raise ValueError("Книга зарезервована іншим користувачем")
 
     if active_res and active_res.user_id == user_id:
         active_res.status = ReservationStatus.COMPLETED
+        locker_id = cell_allocator.release(db, active_res.reservation_id)
+        append_event(db, "reservation_completed", active_res.reservation_id,
+                     user_id=user_id, book_id=book_id, locker_id=locker_id)
 
     loan = Loan(
         user_id=user_id,
         book_id=book_id,
-        due_date=datetime.utcnow() + timedelta(days=days)
+        issue_date=issue_date,
+        due_date=issue_date + timedelta(days=days)
     )
     db.add(loan)
-    book.status = BookStatus.ISSUED
+    db.flush()
+    append_event(db, "loan_created", loan.loan_id, user_id=user_id, book_id=book_id, due_date=loan.due_date)
+    set_book_status(db, book, BookStatus.ISSUED)
+    record_circulation(db, "loans", issue_date, book)
+    if not commit:
+        db.flush()
+        return loan
     db.commit()
     db.refresh(loan)
+    suggest_index.record_loan(book_id)
     return loan
 
 # Повернення книги
-def return_book(db: Session, loan_id: int):
-    loan = db.query(Loan).filter(Loan.loan_id == loan_id).first()
+def return_book(db: Session, loan_id: int, returned_at: datetime | None = None, commit: bool = True):
+    loan = fetch_first(db, LOAN_BY_ID, loan_id=loan_id)
     if not loan:
         raise ValueError("Позика не знайдена")
     if loan.return_date:
         raise ValueError("Книга вже повернута")
 
-    loan.return_date = datetime.utcnow()
+    loan.return_date = returned_at or datetime.utcnow()
     book = loan.book
+    append_event(db, "loan_returned", loan.loan_id, user_id=loan.user_id, book_id=loan.book_id)
 
     # Перевірка наявності наступного бронювання
-    next_res = db.query(Reservation).filter(
-        Reservation.book_id == book.book_id,
-        Reservation.expiry_date > datetime.utcnow(),
-        Reservation.status == ReservationStatus.ACTIVE
-    ).order_by(Reservation.reservation_date.asc()).first()
+    next_res = fetch_first(db, ACTIVE_RESERVATION_FOR_BOOK, book_id=book.book_id, now=datetime.utcnow())
 
     if next_res:
-        book.status = BookStatus.RESERVED
+        set_book_status(db, book, BookStatus.RESERVED)
+        if not cell_for_reservation(db, next_res.reservation_id):
+            stage_in_locker(db, next_res)
     else:
-        book.status = BookStatus.AVAILABLE
+        set_book_status(db, book, BookStatus.AVAILABLE)
 
+    record_circulation(db, "returns", loan.return_date, book)
+    if not commit:
+        db.flush()
+        return loan
     db.commit()
     db.refresh(loan)
     return loan
@@ -67,14 +88,18 @@ def return_book(db: Session, loan_id: int):
 def create_book(db: Session, title: str, author: str, **kwargs):
     book = Book(title=title, author=author, **kwargs)
     db.add(book)
+    index_book_search_keys(db, book)
+    db.flush()
+    append_event(db, "book_created", book.book_id, title=book.title, author=book.author, status=book.status.value)
     db.commit()
     db.refresh(book)
+    suggest_index.upsert_book(book.book_id, book.title, book.author)
     return book
 
 # Оновлення інформації по книзі
 def update_book(db: Session, book_id: int, **kwargs):
     from models import BookStatus, BookCondition
-    book = db.query(Book).filter(Book.book_id == book_id).first()
+    book = fetch_first(db, BOOK_BY_ID, book_id=book_id)
     if not book:
         return None
 
@@ -91,6 +116,9 @@ def update_book(db: Session, book_id: int, **kwargs):
         except ValueError:
             raise ValueError(f"Недійсний стан книги. Дозволені значення: {[c.value for c in BookCondition]}")
 
+    if "status" in kwargs:
+        set_book_status(db, book, kwargs.pop("status"))
+
     # Оновлення інших полів
     for key, value in kwargs.items():
         if hasattr(book, key):
@@ -98,25 +126,75 @@ def update_book(db: Session, book_id: int, **kwargs):
         else:
             raise ValueError(f"Поле '{key}' не існує в моделі Book")
 
+    if {"title", "author", "tags"} & kwargs.keys():
+        index_book_search_keys(db, book)
+    if kwargs:
+        append_event(db, "book_updated", book.book_id, fields=sorted(kwargs))
+
     db.commit()
     db.refresh(book)
+    if {"title", "author"} & kwargs.keys():
+        suggest_index.upsert_book(book.book_id, book.title, book.author)
     return book
 
 # Видалення книги
 def delete_book(db: Session, book_id: int) -> bool:
-    book = db.query(Book).filter(Book.book_id == book_id).first()
+    book = fetch_first(db, BOOK_BY_ID, book_id=book_id)
     if not book:
         return False
     if book.status != BookStatus.WITHDRAWN:
         raise ValueError("Можна видаляти лише списані книги (статус 'withdrawn')")
     db.delete(book)
+    append_event(db, "book_deleted", book_id)
     db.commit()
+    suggest_index.remove_book(book_id)
     return True
 
 # Отримати інформацію по всіх користувачах
-def get_all_readers(db: Session):
-    return db.query(User).filter(User.role == UserRole.READER).all()
+def get_all_readers(db: Session) -> list[UserRow]:
+    return project(db.query(*USER_COLUMNS).filter(User.role == UserRole.READER), UserRow)
 
 # Отримати інформацію про видачі
-def get_reader_loans(db: Session, user_id: int):
-    return db.query(Loan).filter(Loan.user_id == user_id).all()
\ No newline at end of file
+def get_reader_loans(db: Session, user_id: int, since: datetime | None = None) -> list[LoanRow]:
+    return loan_history(db, since, user_id=user_id)
+
+# Ручне розміщення бронювання в поштоматі (наприклад, коли під час бронювання не було вільних комірок)
+def stage_reservation(db: Session, reservation_id: int, station_id: str | None = None, size: str | None = None):
+    res = db.query(Reservation).filter(
+        Reservation.reservation_id == reservation_id,
+        Reservation.status == ReservationStatus.ACTIVE,
+        Reservation.expiry_date > datetime.utcnow()
+    ).first()
+    if not res:
+        raise ValueError("Активне бронювання не знайдено")
+    if res.book.status != BookStatus.RESERVED:
+        raise ValueError("Книга ще не готова до видачі")
+
+    locker_id = cell_for_reservation(db, reservation_id)
+    if locker_id:
+        return locker_id
+    locker_id = stage_in_locker(db, res, station_id, size)
+    if not locker_id:
+        raise ValueError("Немає вільних комірок потрібного розміру")
+    db.commit()
+    return locker_id
+
+# Розміщує активні бронювання, для яких книга вже відкладена, але комірки ще немає
+def stage_pending_reservations(db: Session) -> int:
+    pending = (
+        db.query(Reservation)
+        .join(Book, Book.book_id == Reservation.book_id)
+        .filter(
+            Reservation.status == ReservationStatus.ACTIVE,
+            Reservation.expiry_date > datetime.utcnow(),
+            Book.status == BookStatus.RESERVED
+        )
+        .order_by(Reservation.reservation_date)
+        .all()
+    )
+    staged = 0
+    for res in pending:
+        if not cell_for_reservation(db, res.reservation_id) and stage_in_locker(db, res):
+            staged += 1
+    db.commit()
+    return staged
@@ -1,40 +1,156 @@
 from sqlalchemy.orm import Session
-from models import User, Book, Loan, Reservation
-import hashlib
+from sqlalchemy import func
+from models import User, Book, Loan, Reservation, BookSearchKey, BookTrigram
+from translit import tokenize, search_keys, trigrams
+from archive import loan_history
+from events import append_event
+from lockers import cell_allocator, DEFAULT_STATION, DEFAULT_SIZE
+from entity_cache import entity_cache
+from read_models import BookRow, UserRow, LoanRow, BOOK_COLUMNS, loan_query, project
+from passwords import password_hasher
+from statements import fetch_first, USER_BY_ID, USER_BY_EMAIL, BOOK_BY_ID, RESERVATION_FOR_BOOK
+import math
 from datetime import datetime, timedelta
 
-# Авторизація
+# Авторизація (scrypt обчислюється в пулі процесів, див. passwords.py)
 def hash_password(pw: str) -> str:
-    return hashlib.sha256(pw.encode()).hexdigest()
+    return password_hasher.hash(pw)
 
 def get_user_by_email(db: Session, email: str) -> User | None:
-    return db.query(User).filter(User.email == email).first()
+    return fetch_first(db, USER_BY_EMAIL, email=email)
 
+# Після успішного входу хеш застарілого формату замінюється поточним
 def authenticate_user(db: Session, email: str, password: str) -> User | None:
     user = get_user_by_email(db, email)
-    if user and user.password_hash == hash_password(password):
-        return user
-    return None
+    ok, needs_rehash = password_hasher.verify(password or "", user.password_hash if user else None)
+    if not ok:
+        return None
+    if needs_rehash:
+        user.password_hash = password_hasher.hash(password)
+        db.commit()
+    return user
 
 def get_user(db: Session, user_id: int) -> User | None:
-    return db.query(User).filter(User.user_id == user_id).first()
+    return fetch_first(db, USER_BY_ID, user_id=user_id)
+
+# Ім'я, email і роль користувача для відображення (з кешу між запитами)
+def get_user_summary(db: Session, user_id: int) -> UserRow | None:
+    return entity_cache.user(db, user_id)
 
 
 # Книги
 def get_book(db: Session, book_id: int) -> Book | None:
-    return db.query(Book).filter(Book.book_id == book_id).first()
-
-# Пошук
-def search_books(db: Session, q: str):
-    pattern = f"%{q}%"
-    return db.query(Book).filter(
-        Book.title.like(pattern) |
-        Book.author.like(pattern) |
-        Book.tags.like(pattern)
-    ).all()
+    return fetch_first(db, BOOK_BY_ID, book_id=book_id)
+
+# Зміна статусу книги з записом події
+def set_book_status(db: Session, book: Book, status):
+    if book.status != status:
+        append_event(db, "book_status_changed", book.book_id,
+                     old=book.status.value if book.status else None, new=status.value)
+        book.status = status
+
+# Нечіткий пошук: мінімальна частка триграм запиту, яка має знайтися в книзі
+FUZZY_THRESHOLD = 0.5
+FUZZY_MAX_CANDIDATES = 200
+
+# Оновлює ключі пошуку та триграми книги (викликається з операцій каталогу перед commit)
+def index_book_search_keys(db: Session, book: Book):
+    words = set(tokenize(book.title) + tokenize(book.author) + tokenize(book.tags))
+    keys = {(kind, key) for w in words for kind, key in search_keys(w).items() if key}
+    book.search_keys = [BookSearchKey(kind=kind, key=key[:100]) for kind, key in sorted(keys)]
+    book_trigrams = trigrams(book.title) | trigrams(book.author)
+    book.trigrams = [BookTrigram(trigram=t) for t in sorted(book_trigrams)]
+
+# Перебудова ключів пошуку для всього каталогу
+def rebuild_search_keys(db: Session) -> int:
+    books = db.query(Book).all()
+    for book in books:
+        index_book_search_keys(db, book)
+    db.commit()
+    return len(books)
+
+# Пошук книг за ключем через індекс (префіксний діапазон по (kind, key))
+def _lookup_search_key(db: Session, kind: str, key: str) -> set[int]:
+    rows = db.query(BookSearchKey.book_id).filter(
+        BookSearchKey.kind == kind,
+        BookSearchKey.key >= key,
+        BookSearchKey.key < key + "\uffff"
+    ).distinct()
+    return {row.book_id for row in rows}
+
+# Розміщення заброньованої книги в комірці поштомату (подія reservation_staged)
+def stage_in_locker(db: Session, reservation: Reservation, station_id: str | None = None,
+                    size: str | None = None) -> str | None:
+    locker_id = cell_allocator.allocate(db, reservation.reservation_id,
+                                        station_id or DEFAULT_STATION, size or DEFAULT_SIZE)
+    if locker_id:
+        append_event(db, "reservation_staged", reservation.reservation_id,
+                     user_id=reservation.user_id, book_id=reservation.book_id, locker_id=locker_id)
+    return locker_id
+
+# Пошук (рядки BookRow)
+def search_books(db: Session, q: str) -> list[BookRow]:
+    words = tokenize(q)
+    if not words:
+        return project(db.query(*BOOK_COLUMNS).order_by(Book.book_id), BookRow)
+
+    # Кожне слово запиту розгортається у транслітерацію та фонетичний ключ;
+    # книга підходить, якщо в ній знайдено всі слова запиту
+    book_ids = None
+    for word in words:
+        matched = set()
+        for kind, key in search_keys(word).items():
+            if key:
+                matched |= _lookup_search_key(db, kind, key)
+        book_ids = matched if book_ids is None else book_ids & matched
+        if not book_ids:
+            return []
+
+    return project(db.query(*BOOK_COLUMNS).filter(Book.book_id.in_(book_ids)).order_by(Book.book_id), BookRow)
+
+# Подібність Жаккара між множинами триграм
+def _trigram_similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+# Нечіткий пошук за назвою та автором через таблицю триграм.
+# Кандидати відбираються лише з posting-списків триграм запиту
+def fuzzy_search_books(db: Session, q: str, threshold: float = FUZZY_THRESHOLD) -> list[BookRow]:
+    query_trigrams = trigrams(q)
+    if not query_trigrams:
+        return []
+
+    min_shared = max(1, math.ceil(threshold * len(query_trigrams)))
+    shared = func.count(BookTrigram.trigram).label("shared")
+    candidates = (
+        db.query(BookTrigram.book_id, shared)
+        .filter(BookTrigram.trigram.in_(query_trigrams))
+        .group_by(BookTrigram.book_id)
+        .having(shared >= min_shared)
+        .order_by(shared.desc())
+        .limit(FUZZY_MAX_CANDIDATES)
+        .all()
+    )
+    if not candidates:
+        return []
+
+    shared_by_book = {c.book_id: c.shared for c in candidates}
+    books = project(db.query(*BOOK_COLUMNS).filter(Book.book_id.in_(shared_by_book)), BookRow)
+
+    # Спочатку частка знайдених триграм запиту, потім найкраща подібність з назвою чи автором
+    def score(book: BookRow):
+        similarity = max(
+            _trigram_similarity(query_trigrams, trigrams(book.title)),
+            _trigram_similarity(query_trigrams, trigrams(book.author))
+        )
+        return (shared_by_book[book.book_id] / len(query_trigrams), similarity, -book.book_id)
+
+    return sorted(books, key=score, reverse=True)
 
 # Бронювання
-def create_reservation(db: Session, user_id: int, book_id: int, days: int = 7):
+def create_reservation(db: Session, user_id: int, book_id: int, days: int = 7, station_id: str | None = None):
     from models import BookStatus
 
     book = get_book(db, book_id)
@@ -42,10 +158,7 @@ def create_reservation(db: Session, user_id: int, book_id: int, days: int = 7):
         raise ValueError("Книга не знайдена")
 
     # Перевірка активного бронювання
-    active_res = db.query(Reservation).filter(
-        Reservation.book_id == book_id,
-        Reservation.expiry_date > datetime.utcnow()
-    ).first()
+    active_res = fetch_first(db, RESERVATION_FOR_BOOK, book_id=book_id, now=datetime.utcnow())
 
     if active_res:
         raise ValueError("Книга вже зарезервована іншим користувачем")
@@ -56,10 +169,17 @@ def create_reservation(db: Session, user_id: int, book_id: int, days: int = 7):
         expiry_date=datetime.utcnow() + timedelta(days=days)
     )
 
-    if book.status == BookStatus.AVAILABLE:
-        book.status = BookStatus.RESERVED
+    staged = book.status == BookStatus.AVAILABLE
+    if staged:
+        set_book_status(db, book, BookStatus.RESERVED)
 
     db.add(reservation)
+    db.flush()
+    append_event(db, "reservation_created", reservation.reservation_id,
+                 user_id=user_id, book_id=book_id, expiry_date=reservation.expiry_date)
+    # Книга доступна — її одразу розміщують у вільній комірці (обраного поштомату, якщо вказано)
+    if staged:
+        stage_in_locker(db, reservation, station_id)
     db.commit()
     db.refresh(reservation)
     return reservation
@@ -72,19 +192,20 @@ def get_user_active_reservations(db: Session, user_id: int):
     ).all()
 
 
-# Видача
-def get_user_loans(db: Session, user_id: int):
-    return db.query(Loan).filter(Loan.user_id == user_id).all()
+# Видача (історія разом з архівом, якщо період його зачіпає)
+def get_user_loans(db: Session, user_id: int, since: datetime | None = None) -> list[LoanRow]:
+    return loan_history(db, since, user_id=user_id)
 
 # Активні видачі
-def get_active_loans(db: Session, user_id: int):
-    return db.query(Loan).filter(
+def get_active_loans(db: Session, user_id: int) -> list[LoanRow]:
+    return project(loan_query(db, Loan).filter(
         Loan.user_id == user_id,
         Loan.return_date.is_(None)
-    ).all()
+    ), LoanRow)
 
 # Подовжити видачу
-def extend_loan(db: Session, loan_id: int, days: int = 7):
+# caller_id — хто продовжує; читач (не is_staff) може продовжити лише власну позику
+def extend_loan(db: Session, loan_id: int, days: int = 7, caller_id: int | None = None, is_staff: bool = False):
     loan = db.query(Loan).filter(
         Loan.loan_id == loan_id,
         Loan.return_date.is_(None)
@@ -92,26 +213,36 @@ def extend_loan(db: Session, loan_id: int, days: int = 7):
 
     if not loan:
         raise ValueError("Активна позика не знайдена або вже повернута")
+    if caller_id is not None and not is_staff and loan.user_id != caller_id:
+        raise PermissionError("Позика належить іншому користувачу")
 
     loan.due_date += timedelta(days=days)
+    append_event(db, "loan_extended", loan.loan_id,
+                 user_id=loan.user_id, book_id=loan.book_id, due_date=loan.due_date)
     db.commit()
     db.refresh(loan)
     return loan
 
-# Відмінити бронювання
-def cancel_reservation(db: Session, reservation_id: int) -> Reservation | None:
+# Відмінити бронювання; читач (не is_staff) може скасувати лише власне
+def cancel_reservation(db: Session, reservation_id: int, caller_id: int | None = None,
+                       is_staff: bool = False) -> Reservation | None:
     from models import Reservation, ReservationStatus, Book, BookStatus
     res = db.query(Reservation).filter(Reservation.reservation_id == reservation_id).first()
     if not res:
         return None
+    if caller_id is not None and not is_staff and res.user_id != caller_id:
+        raise PermissionError("Бронювання належить іншому користувачу")
     if res.status != ReservationStatus.ACTIVE:
         raise ValueError("Бронювання вже скасовано або завершене")
 
-    # Скасовує бронювання
+    # Скасовує бронювання та звільняє комірку
     res.status = ReservationStatus.CANCELLED
+    locker_id = cell_allocator.release(db, res.reservation_id)
+    append_event(db, "reservation_cancelled", res.reservation_id,
+                 user_id=res.user_id, book_id=res.book_id, locker_id=locker_id)
 
     # Оновлює статус книги. Тобто, якщо вона була reserved, то тепер available
-    book = db.query(Book).filter(Book.book_id == res.book_id).first()
+    book = get_book(db, res.book_id)
     if book and book.status == BookStatus.RESERVED:
         # Перевіряє, чи немає інших активних бронювань на цю книгу
         other_active = db.query(Reservation).filter(
@@ -122,8 +253,37 @@ def cancel_reservation(db: Session, reservation_id: int) -> Reservation | None:
         ).first()
 
         if not other_active:
-            book.status = BookStatus.AVAILABLE
+            set_book_status(db, book, BookStatus.AVAILABLE)
 
     db.commit()
     db.refresh(res)
-    return res
\ No newline at end of file
+    return res
+
+# Позначає прострочені активні бронювання як expired і звільняє книги
+def expire_reservations(db: Session, now: datetime | None = None) -> int:
+    from models import ReservationStatus, BookStatus
+    now = now or datetime.utcnow()
+    expired = db.query(Reservation).filter(
+        Reservation.status == ReservationStatus.ACTIVE,
+        Reservation.expiry_date <= now
+    ).all()
+
+    for res in expired:
+        res.status = ReservationStatus.EXPIRED
+        locker_id = cell_allocator.release(db, res.reservation_id)
+        append_event(db, "reservation_expired", res.reservation_id,
+                     user_id=res.user_id, book_id=res.book_id, locker_id=locker_id)
+
+    for book_id in {res.book_id for res in expired}:
+        book = get_book(db, book_id)
+        if book and book.status == BookStatus.RESERVED:
+            other_active = db.query(Reservation).filter(
+                Reservation.book_id == book_id,
+                Reservation.status == ReservationStatus.ACTIVE,
+                Reservation.expiry_date > now
+            ).first()
+            if not other_active:
+                set_book_status(db, book, BookStatus.AVAILABLE)
+
+    db.commit()
+    return len(expired)
@@ -1,8 +1,12 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.util import LRUCache
 
 DATABASE_URL = "sqlite:///library.db"
-engine = create_engine(DATABASE_URL, echo=False)
+# Власний кеш скомпільованих запитів (опція compiled_cache): його розмір видно у звіті statement-cache
+COMPILED_CACHE_SIZE = 500
+compiled_cache = LRUCache(COMPILED_CACHE_SIZE)
+engine = create_engine(DATABASE_URL, echo=False, execution_options={"compiled_cache": compiled_cache})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
\ No newline at end of file
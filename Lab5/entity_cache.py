@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User
+from read_models import UserRow, USER_COLUMNS
+
+MAX_ENTRIES = 10000
+
+
+# Кеш знімків користувачів (read_models) між запитами (LRU з обмеженим розміром).
+# Записи скидаються функціями crud, що змінюють сутність: одразу (щоб поточна сесія
+# не прочитала старе) і ще раз після commit — на випадок, якщо паралельний запит
+# встиг покласти в кеш значення, прочитане до фіксації змін
+class EntityCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()     # (kind, id) -> знімок
+        self.counters = {kind: {"hits": 0, "misses": 0, "invalidations": 0} for kind in ("user",)}
+
+    def _get(self, kind: str, entity_id: int):
+        with self._lock:
+            entry = self._entries.get((kind, entity_id))
+            if entry is not None:
+                self._entries.move_to_end((kind, entity_id))
+                self.counters[kind]["hits"] += 1
+            else:
+                self.counters[kind]["misses"] += 1
+            return entry
+
+    def _put(self, kind: str, entity_id: int, entry):
+        with self._lock:
+            self._entries[(kind, entity_id)] = entry
+            self._entries.move_to_end((kind, entity_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def user(self, db: Session, user_id: int) -> UserRow | None:
+        entry = self._get("user", user_id)
+        if entry is None:
+            values = db.query(*USER_COLUMNS).filter(User.user_id == user_id).first()
+            if values is None:
+                return None
+            entry = UserRow(*values)
+            self._put("user", user_id, entry)
+        return entry
+
+    # Викликається crud-функцією до commit зміненої сутності
+    def invalidate(self, db: Session, kind: str, entity_id: int):
+        self._drop(kind, entity_id)
+        db.info.setdefault("entity_cache_pending", set()).add((kind, entity_id))
+
+    def _drop(self, kind: str, entity_id: int):
+        with self._lock:
+            if self._entries.pop((kind, entity_id), None) is not None:
+                self.counters[kind]["invalidations"] += 1
+
+    def after_transaction(self, session: Session):
+        for kind, entity_id in session.info.pop("entity_cache_pending", ()):
+            self._drop(kind, entity_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            report = {"entries": len(self._entries), "max_entries": self.max_entries}
+            for kind, counters in self.counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                report[kind] = {**counters, "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0}
+            return report
+
+
+entity_cache = EntityCache()
+
+
+@event.listens_for(Session, "after_commit")
+def _entity_cache_after_commit(session):
+    entity_cache.after_transaction(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _entity_cache_after_rollback(session):
+    entity_cache.after_transaction(session)
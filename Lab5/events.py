@@ -0,0 +1,95 @@
+import json
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import DomainEvent
+
+logger = logging.getLogger(__name__)
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+# Додає подію в журнал у поточній транзакції (запис з'явиться разом із самою зміною)
+def append_event(db: Session, type: str, entity_id: int | None = None, **payload) -> DomainEvent:
+    record = DomainEvent(
+        type=type,
+        entity_id=entity_id,
+        payload=json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=_json_default),
+        created_at=datetime.utcnow()
+    )
+    db.add(record)
+    return record
+
+
+# Підписка на події в межах процесу; callback(event_dict) викликається після commit.
+# Повертає функцію для відписки
+def subscribe(callback, types=None):
+    entry = (callback, frozenset(types) if types else None)
+    with _subscribers_lock:
+        _subscribers.append(entry)
+
+    def unsubscribe():
+        with _subscribers_lock:
+            if entry in _subscribers:
+                _subscribers.remove(entry)
+    return unsubscribe
+
+
+def event_to_dict(record: DomainEvent) -> dict:
+    return {
+        "seq": record.seq,
+        "type": record.type,
+        "entity_id": record.entity_id,
+        "payload": json.loads(record.payload) if record.payload else {},
+        "created_at": record.created_at.isoformat(),
+    }
+
+
+# Події після заданого номера послідовності
+def events_since(db: Session, since: int = 0, limit: int = 500, types=None) -> list[DomainEvent]:
+    query = db.query(DomainEvent).filter(DomainEvent.seq > since)
+    if types:
+        query = query.filter(DomainEvent.type.in_(types))
+    return query.order_by(DomainEvent.seq).limit(limit).all()
+
+
+def last_seq(db: Session) -> int:
+    record = db.query(DomainEvent.seq).order_by(DomainEvent.seq.desc()).first()
+    return record.seq if record else 0
+
+
+# Після flush номери seq уже відомі — запам'ятовує події до commit
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_events(session, flush_context):
+    flushed = [obj for obj in session.new if isinstance(obj, DomainEvent)]
+    if flushed:
+        session.info.setdefault("pending_events", []).extend(event_to_dict(obj) for obj in flushed)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed_events(session):
+    pending = session.info.pop("pending_events", None)
+    if not pending:
+        return
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for record in pending:
+        for callback, types in subscribers:
+            if types is not None and record["type"] not in types:
+                continue
+            try:
+                callback(record)
+            except Exception:
+                logger.exception("Помилка підписника на подію %s", record["type"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_events(session):
+    session.info.pop("pending_events", None)
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import os
+import re
+import shutil
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+from sqlalchemy.orm import Session
+from models import Book, User
+from archive import all_loans
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
+STATE_FILE = "_state.json"
+CHUNK_SIZE = 10000
+
+COLUMNS = [
+    "loan_id", "user_id", "book_id", "issue_date", "due_date", "return_date",
+    "title", "author", "category", "user_name", "user_email",
+]
+INT_COLUMNS = ("loan_id", "user_id", "book_id")
+DATE_COLUMNS = ("issue_date", "due_date", "return_date")
+
+
+# Позики (разом з архівом) з книгами та користувачами, починаючи після high-water mark
+def circulation_rows(db: Session, after_loan_id: int = 0, chunk_size: int = CHUNK_SIZE):
+    loans = all_loans(db, after_loan_id)
+    return (
+        db.query(
+            loans.c.loan_id, loans.c.user_id, loans.c.book_id,
+            loans.c.issue_date, loans.c.due_date, loans.c.return_date,
+            Book.title, Book.author, Book.category,
+            User.name.label("user_name"), User.email.label("user_email")
+        )
+        .join(Book, Book.book_id == loans.c.book_id)
+        .join(User, User.user_id == loans.c.user_id)
+        .order_by(loans.c.loan_id)
+        .execution_options(stream_results=True)
+        .yield_per(chunk_size)
+    )
+
+
+def _read_state(out_dir: str) -> dict:
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"last_loan_id": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_state(out_dir: str, state: dict):
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# Записує одну частину партиції: .npy на кожну колонку та CSV
+def _write_part(partition_dir: str, rows: list):
+    os.makedirs(partition_dir, exist_ok=True)
+    part = f"part-{rows[0].loan_id:010d}-{rows[-1].loan_id:010d}"
+    part_dir = os.path.join(partition_dir, part)
+    os.makedirs(part_dir, exist_ok=True)
+
+    for column in COLUMNS:
+        values = [getattr(r, column) for r in rows]
+        if column in INT_COLUMNS:
+            np.save(os.path.join(part_dir, f"{column}.npy"), np.array(values, dtype=np.int64))
+        elif column in DATE_COLUMNS:
+            array = np.array([v if v is not None else "NaT" for v in values], dtype="datetime64[s]")
+            np.save(os.path.join(part_dir, f"{column}.npy"), array)
+        else:
+            # Словникове кодування рядків: унікальні значення + int32-коди
+            dictionary, codes = np.unique(np.array([v or "" for v in values], dtype=str), return_inverse=True)
+            np.save(os.path.join(part_dir, f"{column}.dict.npy"), dictionary)
+            np.save(os.path.join(part_dir, f"{column}.codes.npy"), codes.astype(np.int32))
+
+    with open(os.path.join(partition_dir, f"{part}.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for r in rows:
+            writer.writerow(_csv_values(r))
+
+
+def _csv_values(row) -> list:
+    return [
+        value.isoformat() if isinstance(value, datetime) else ("" if value is None else value)
+        for value in (getattr(row, c) for c in COLUMNS)
+    ]
+
+
+# Експорт історії видач у колонковому форматі з партиціюванням за місяцем видачі.
+# Повторний запуск експортує лише позики з loan_id, більшим за збережений high-water mark
+def export_circulation(db: Session, out_dir: str = EXPORT_DIR, full: bool = False,
+                       chunk_size: int = CHUNK_SIZE) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    if full:
+        # Повний експорт перезаписує всі партиції
+        for name in os.listdir(out_dir):
+            if re.fullmatch(r"\d{4}-\d{2}", name):
+                shutil.rmtree(os.path.join(out_dir, name))
+    state = {"last_loan_id": 0} if full else _read_state(out_dir)
+    last_loan_id = state["last_loan_id"]
+
+    buffers = defaultdict(list)
+    exported = 0
+    partitions = set()
+    for row in circulation_rows(db, last_loan_id, chunk_size):
+        partition = row.issue_date.strftime("%Y-%m")
+        buffers[partition].append(row)
+        if len(buffers[partition]) >= chunk_size:
+            _write_part(os.path.join(out_dir, partition), buffers.pop(partition))
+        partitions.add(partition)
+        last_loan_id = row.loan_id
+        exported += 1
+
+    for partition, rows in buffers.items():
+        _write_part(os.path.join(out_dir, partition), rows)
+
+    state = {"last_loan_id": last_loan_id, "exported_at": datetime.utcnow().isoformat()}
+    _write_state(out_dir, state)
+    return {"rows": exported, "partitions": sorted(partitions), "last_loan_id": last_loan_id}
+
+
+# Потоковий CSV для сумісності (відповідь формується частинами)
+def stream_circulation_csv(db: Session, after_loan_id: int = 0, chunk_size: int = CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for i, row in enumerate(circulation_rows(db, after_loan_id, chunk_size), start=1):
+        writer.writerow(_csv_values(row))
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        summary = export_circulation(session, full="--full" in sys.argv)
+        print(f"Експортовано позик: {summary['rows']}, партиції: {summary['partitions']}, "
+              f"high-water mark: {summary['last_loan_id']}")
+    finally:
+        session.close()
@@ -0,0 +1,118 @@
+from datetime import datetime
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import Book, Loan, FineLedger
+
+# Правила нарахування штрафів за категорією книги (суми в копійках)
+FINE_RULES = {
+    "default": {"daily_rate": 500, "cap": 20000, "grace_days": 3},
+    "Довідники": {"daily_rate": 1000, "cap": 50000, "grace_days": 0},
+}
+LEDGER_BATCH_SIZE = 50000
+
+
+# Відкриті позики у вигляді колонок NumPy: loan_id, user_id, due_date (юліанський день)
+# та код категорії (індекс у списку categories)
+def load_open_loans(db: Session) -> dict:
+    rows = db.execute(
+        select(Loan.loan_id, Loan.user_id, func.julianday(Loan.due_date), func.coalesce(Book.category, ""))
+        .join(Book, Book.book_id == Loan.book_id)
+        .where(Loan.return_date.is_(None))
+    ).all()
+    loan_ids, user_ids, due_dates, categories = zip(*rows) if rows else ((), (), (), ())
+    names = sorted(set(categories))
+    code_of = {name: code for code, name in enumerate(names)}
+    return {
+        "loan_id": np.fromiter(loan_ids, dtype=np.int64, count=len(rows)),
+        "user_id": np.fromiter(user_ids, dtype=np.int64, count=len(rows)),
+        "due_date": np.fromiter(due_dates, dtype=np.float64, count=len(rows)),
+        "category_code": np.fromiter((code_of[c] for c in categories), dtype=np.int64, count=len(rows)),
+        "categories": names,
+    }
+
+
+# Тарифи, індексовані кодом категорії
+def rule_arrays(categories: list[str], rules: dict = FINE_RULES):
+    table = [rules.get(name, rules["default"]) for name in categories] or [rules["default"]]
+    rates = np.array([r["daily_rate"] for r in table], dtype=np.int64)
+    caps = np.array([r["cap"] for r in table], dtype=np.int64)
+    grace = np.array([r["grace_days"] for r in table], dtype=np.int64)
+    return rates, caps, grace
+
+
+# Векторизований розрахунок штрафів за один прохід
+def compute_fines(due_date: np.ndarray, category_codes: np.ndarray, rates: np.ndarray,
+                  caps: np.ndarray, grace: np.ndarray, now_julian: float):
+    days_overdue = np.floor(now_julian - due_date).astype(np.int64)
+    np.maximum(days_overdue, 0, out=days_overdue)
+    chargeable = np.maximum(days_overdue - grace[category_codes], 0)
+    fines = np.minimum(chargeable * rates[category_codes], caps[category_codes])
+    return days_overdue, fines
+
+
+# Сума штрафів і кількість оштрафованих позик на кожного користувача з штрафом.
+# user_id у SQLite щільні, тому bincount працює прямо по id без сортування
+def aggregate_by_user(user_ids: np.ndarray, fines: np.ndarray):
+    totals = np.bincount(user_ids, weights=fines).astype(np.int64)
+    counts = np.bincount(user_ids, weights=fines > 0).astype(np.int64)
+    users = np.flatnonzero(totals)
+    return users, totals[users], counts[users]
+
+
+# Юліанський день (як julianday() у SQLite) для наївного UTC-часу
+def julian_day(moment: datetime) -> float:
+    return (moment - datetime(1970, 1, 1)).total_seconds() / 86400.0 + 2440587.5
+
+
+# Зберігає поточні суми штрафів по відкритих позиках у журнал штрафів.
+# Журнал — знімок поточного стану: рядки позик, які повернуто, продовжено чи вже не
+# оштрафовано (їх не оновив цей прохід), видаляються в тій самій транзакції
+def persist_fines(db: Session, loan_ids, user_ids, days_overdue, fines, assessed_at: datetime):
+    charged = np.nonzero(fines)[0]
+    for start in range(0, len(charged), LEDGER_BATCH_SIZE):
+        batch = charged[start:start + LEDGER_BATCH_SIZE]
+        stmt = insert(FineLedger)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["loan_id"],
+                set_={
+                    "amount": stmt.excluded.amount,
+                    "days_overdue": stmt.excluded.days_overdue,
+                    "assessed_at": stmt.excluded.assessed_at,
+                },
+            ),
+            [
+                {"loan_id": int(loan_ids[i]), "user_id": int(user_ids[i]), "amount": int(fines[i]),
+                 "days_overdue": int(days_overdue[i]), "assessed_at": assessed_at}
+                for i in batch
+            ],
+        )
+    db.execute(delete(FineLedger).where(FineLedger.assessed_at != assessed_at))
+    db.commit()
+
+
+# Повний цикл: завантаження, розрахунок, агрегація та (за потреби) запис у журнал
+def assess_fines(db: Session, rules: dict = FINE_RULES, persist: bool = True,
+                 now: datetime | None = None, top: int = 50) -> dict:
+    now = now or datetime.utcnow()
+    loans = load_open_loans(db)
+    rates, caps, grace = rule_arrays(loans["categories"], rules)
+    days_overdue, fines = compute_fines(
+        loans["due_date"], loans["category_code"], rates, caps, grace, julian_day(now)
+    )
+    users, totals, counts = aggregate_by_user(loans["user_id"], fines)
+
+    if persist:
+        persist_fines(db, loans["loan_id"], loans["user_id"], days_overdue, fines, now)
+
+    order = np.argsort(-totals, kind="stable")[:top]
+    return {
+        "assessed_at": now,
+        "open_loans": int(len(fines)),
+        "fined_loans": int(np.count_nonzero(fines)),
+        "total": int(fines.sum()),
+        "fined_users": int(len(users)),
+        "users": [(int(users[i]), int(totals[i]), int(counts[i])) for i in order],
+    }
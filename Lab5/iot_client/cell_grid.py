@@ -0,0 +1,60 @@
+import math
+import tkinter as tk
+
+CELL_GAP = 6
+MIN_CELL_SIZE = 28
+
+
+# Сітка комірок на одному Canvas: на комірку — прямокутник і два текстові елементи.
+# Зміна стану оновлює лише елементи змінених комірок (itemconfig), тож Tk перемальовує
+# тільки їхні області; повна перебудова координат — лише при зміні розміру вікна
+class CellGrid(tk.Canvas):
+    def __init__(self, parent, cells: dict, colors: dict, **kwargs):
+        super().__init__(parent, bg=colors['background'], highlightthickness=0, **kwargs)
+        self.cells = cells
+        self.colors = colors
+        self.items = {}
+        for cell_id in cells:
+            self.items[cell_id] = (
+                self.create_rectangle(0, 0, 0, 0, width=1),
+                self.create_text(0, 0, text=cell_id, font=('Consolas', 11, 'bold')),
+                self.create_text(0, 0, font=('Consolas', 9)),
+            )
+        self.update_cells(cells.keys())
+        self.bind("<Configure>", lambda event: self.layout(event.width, event.height))
+
+    # Кількість колонок, за якої квадратні комірки найкраще заповнюють область
+    @staticmethod
+    def _columns(count: int, width: int, height: int) -> int:
+        if count == 0:
+            return 1
+        return max(1, min(count, round(math.sqrt(count * width / max(height, 1)))))
+
+    def layout(self, width: int, height: int):
+        count = len(self.items)
+        columns = self._columns(count, width, height)
+        rows = math.ceil(count / columns)
+        size = max(MIN_CELL_SIZE, min((width - CELL_GAP) / columns, (height - CELL_GAP) / max(rows, 1)) - CELL_GAP)
+        show_status = size >= 70
+        for i, (rect, label, status) in enumerate(self.items.values()):
+            x = CELL_GAP + (i % columns) * (size + CELL_GAP)
+            y = CELL_GAP + (i // columns) * (size + CELL_GAP)
+            self.coords(rect, x, y, x + size, y + size)
+            self.coords(label, x + size / 2, y + size / 2 - (10 if show_status else 0))
+            self.coords(status, x + size / 2, y + size / 2 + 14)
+            self.itemconfig(status, state=tk.NORMAL if show_status else tk.HIDDEN)
+        self.configure(scrollregion=(0, 0, width, CELL_GAP + rows * (size + CELL_GAP)))
+
+    # Перемальовує лише передані комірки
+    def update_cells(self, changed):
+        for cell_id in changed:
+            rect, label, status = self.items[cell_id]
+            if self.cells[cell_id]["open"]:
+                fill, outline, text_color, text = (self.colors['secondary'], self.colors['secondary'],
+                                                   self.colors['text_light'], "ВІДКРИТА")
+            else:
+                fill, outline, text_color, text = (self.colors['panel_bg'], self.colors['grey_light'],
+                                                   self.colors['primary'], "ЗАБЛОКОВАНА")
+            self.itemconfig(rect, fill=fill, outline=outline)
+            self.itemconfig(label, fill=text_color if self.cells[cell_id]["open"] else self.colors['text_dark'])
+            self.itemconfig(status, text=text, fill=text_color)
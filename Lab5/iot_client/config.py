@@ -1,4 +1,32 @@
-SERVER_URL = "http://localhost:5000"
+import json
+import os
+
+# Параметри станції з config.json (поруч з цим файлом)
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"), encoding="utf-8") as f:
+    CONFIG = json.load(f)
+
+SERVER_URL = CONFIG.get("server_url", "http://localhost:5000")
+STATION_ID = CONFIG.get("locker_id_prefix", "A")
+NETWORK_TIMEOUT_SEC = CONFIG.get("network_timeout_sec", 5)
+RETRY_INTERVAL_SEC = CONFIG.get("retry_interval_sec", 30)
+PICKUP_TIMEOUT_SEC = CONFIG.get("pickup_timeout_sec", 60)
+OTP_SYNC_INTERVAL_SEC = CONFIG.get("otp_sync_interval_sec", 60)
+OTP_CACHE_MAX_AGE_SEC = CONFIG.get("otp_cache_max_age_sec", 7200)
+HTTP_POOL_SIZE = CONFIG.get("http_pool_size", 4)
+HTTP_RETRIES = CONFIG.get("http_retries", 2)
+HTTP_BACKOFF_FACTOR = CONFIG.get("http_backoff_factor", 0.3)
+WORKER_THREADS = CONFIG.get("worker_threads", 4)
+UI_POLL_INTERVAL_MS = CONFIG.get("ui_poll_interval_ms", 50)
+TELEMETRY_BUFFER_SIZE = CONFIG.get("telemetry_buffer_size", 10000)
+TELEMETRY_UPLOAD_INTERVAL_SEC = CONFIG.get("telemetry_upload_interval_sec", 60)
+TELEMETRY_BATCH_SIZE = CONFIG.get("telemetry_batch_size", 2000)
+# "binary" — компактний протокол wire.py для /iot/*, "json" — сумісний текстовий формат
+WIRE_FORMAT = CONFIG.get("wire_format", "json")
+# Ключ станції від сервера (GET /admin/stations/<id>/key); без нього офлайн-таблиця OTP вимкнена,
+# а журнал подій і телеметрія не приймаються сервером
+STATION_KEY = CONFIG.get("station_key", "")
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            CONFIG.get("journal_path", "station_journal.db"))
 
 COLORS = {
     'primary': '#4285F4',
@@ -11,10 +39,6 @@ COLORS = {
     'grey_light': '#E8EAED',
 }
 
-LOCKER_CELLS = {
-    "A1": {"occupied": False, "book_id": None, "open": False},
-    "A2": {"occupied": False, "book_id": None, "open": False},
-    "A3": {"occupied": False, "book_id": None, "open": False},
-    "A4": {"occupied": False, "book_id": None, "open": False},
-    "A5": {"occupied": False, "book_id": None, "open": False},
-}
\ No newline at end of file
+# Комірки станції <prefix>1..N, де N — max_locker_cells з config.json
+CELL_COUNT = CONFIG.get("max_locker_cells", 5)
+LOCKER_CELL_IDS = [f"{STATION_ID}{i}" for i in range(1, CELL_COUNT + 1)]
@@ -0,0 +1,107 @@
+import time
+import uuid
+from datetime import datetime
+
+# Протокол станції: шляхи та тіла запитів (однакові для GUI та навантажувального тесту)
+UNLOCK_PATH = "/iot/lockers/unlock"
+EVENTS_PATH = "/iot/events"
+
+
+def otp_path(reservation_id: int) -> str:
+    return f"/iot/reservations/{reservation_id}/otp"
+
+
+def unlock_body(station_id: str, otp: str) -> dict:
+    return {"otp": otp, "station_id": station_id}
+
+
+# Подія для /iot/events з власним ключем ідемпотентності
+def station_event(station_id: str, type: str, **payload) -> dict:
+    return {
+        "key": f"{station_id}-{uuid.uuid4().hex}",
+        "type": type,
+        "occurred_at": datetime.utcnow().isoformat(),
+        **payload,
+    }
+
+
+def events_body(station_id: str, events: list[dict]) -> dict:
+    return {"station_id": station_id, "events": events}
+
+
+class LockerError(Exception):
+    pass
+
+
+# Стан станції без прив'язки до інтерфейсу: комірки (заблокована/відкрита) та поточна сесія видачі.
+# Підписники отримують множину змінених комірок після кожного переходу
+class LockerEngine:
+    def __init__(self, station_id: str, cell_ids: list[str], pickup_timeout_sec: float = 60):
+        self.station_id = station_id
+        self.pickup_timeout_sec = pickup_timeout_sec
+        self.cells = {cell_id: {"occupied": False, "book_id": None, "open": False} for cell_id in cell_ids}
+        self.session = self._empty_session()
+        self._listeners = []
+
+    @staticmethod
+    def _empty_session() -> dict:
+        return {"locker_id": None, "book_id": None, "user_id": None, "reservation_id": None, "unlock_time": None}
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, changed: set):
+        if changed:
+            for callback in self._listeners:
+                callback(changed)
+
+    @property
+    def active(self) -> bool:
+        return self.session["locker_id"] is not None
+
+    # Відкриває комірку для видачі та починає сесію
+    def start_session(self, locker_id: str, user_id, book_id, reservation_id: int | None = None,
+                      now: float | None = None):
+        if locker_id not in self.cells:
+            raise LockerError(f"Комірка {locker_id} не існує")
+        if self.active:
+            raise LockerError(f"Комірка {self.session['locker_id']} ще відкрита")
+        self.session = {
+            "locker_id": locker_id,
+            "book_id": book_id,
+            "user_id": user_id,
+            "reservation_id": reservation_id,
+            "unlock_time": time.time() if now is None else now,
+        }
+        self.cells[locker_id].update(open=True, occupied=True, book_id=book_id)
+        self._notify({locker_id})
+
+    # Скільки секунд лишилося, щоб забрати книгу (None — сесії немає)
+    def remaining(self, now: float | None = None) -> float | None:
+        if not self.active:
+            return None
+        now = time.time() if now is None else now
+        return self.pickup_timeout_sec - (now - self.session["unlock_time"])
+
+    def close_cell(self, locker_id: str):
+        cell = self.cells.get(locker_id)
+        if cell is None:
+            raise LockerError(f"Комірка {locker_id} не існує")
+        cell.update(open=False, occupied=False, book_id=None)
+        self._notify({locker_id})
+
+    # Завершує сесію: комірка зачиняється; повертає дані сесії
+    def finish_session(self) -> dict:
+        session = self.session
+        if session["locker_id"] is not None:
+            self.close_cell(session["locker_id"])
+        self.session = self._empty_session()
+        return session
+
+    # Зачиняє всі відкриті комірки
+    def reset(self):
+        changed = {cell_id for cell_id, cell in self.cells.items() if cell["open"]}
+        for cell_id in changed:
+            self.cells[cell_id].update(open=False, occupied=False, book_id=None)
+        self.session = self._empty_session()
+        self._notify(changed)
@@ -1,10 +1,24 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 import requests
 import threading
 import time
+import json
 from datetime import datetime
-from config import COLORS, SERVER_URL, LOCKER_CELLS
+from config import (
+    COLORS, SERVER_URL, LOCKER_CELL_IDS, STATION_ID, PICKUP_TIMEOUT_SEC, RETRY_INTERVAL_SEC, NETWORK_TIMEOUT_SEC,
+    OTP_SYNC_INTERVAL_SEC, OTP_CACHE_MAX_AGE_SEC, JOURNAL_PATH, HTTP_POOL_SIZE, HTTP_RETRIES,
+    HTTP_BACKOFF_FACTOR, WORKER_THREADS, UI_POLL_INTERVAL_MS, TELEMETRY_BUFFER_SIZE,
+    TELEMETRY_UPLOAD_INTERVAL_SEC, TELEMETRY_BATCH_SIZE, WIRE_FORMAT, STATION_KEY
+)
+from station_telemetry import TelemetryBuffer, TelemetryUploader
+from network import ApiClient
+from engine import LockerEngine, LockerError, UNLOCK_PATH, unlock_body
+from cell_grid import CellGrid
+from otp_cache import OtpCache, REPLAYED
+from station_auth import sign_headers
+from journal import EventJournal, JournalSender
+import wire
 
 class LockerSimulator:
     # Ініціалізація головного вікна
@@ -15,19 +29,44 @@ class LockerSimulator:
         
         self.colors = COLORS
         self.server_url = SERVER_URL
-        self.locker_cells = LOCKER_CELLS.copy() 
-        self.current_session = {
-            "locker_id": None,
-            "book_id": None,
-            "user_id": None,
-            "unlock_time": None
-        }
+        self.station_id = STATION_ID
+        # Стан комірок і сесії видачі живе в безголовому рушії; вікно лише відображає його
+        self.engine = LockerEngine(self.station_id, LOCKER_CELL_IDS, PICKUP_TIMEOUT_SEC)
+        self.locker_cells = self.engine.cells
+        self.last_event_seq = 0
+        # Усі запити йдуть через спільну keep-alive сесію та обмежений пул потоків;
+        # результати повертаються в потік Tk через чергу
+        self.api = ApiClient(SERVER_URL, NETWORK_TIMEOUT_SEC, WORKER_THREADS, HTTP_POOL_SIZE,
+                             HTTP_RETRIES, HTTP_BACKOFF_FACTOR)
+        # Метрики станції (RTT, час відкритих дверцят, тривалість видачі, помилки)
+        self.telemetry = TelemetryBuffer(TELEMETRY_BUFFER_SIZE)
+        self.api.on_request = self.on_api_request
+        self.telemetry_uploader = TelemetryUploader(
+            self.telemetry, self.station_id, STATION_KEY, self.server_url, self.api.session,
+            NETWORK_TIMEOUT_SEC, TELEMETRY_UPLOAD_INTERVAL_SEC, TELEMETRY_BATCH_SIZE
+        )
+        self.otp_cache = OtpCache(OTP_CACHE_MAX_AGE_SEC, STATION_KEY)
+        self.otp_sync_requested = threading.Event()
+        # Відкриття, видачі та повернення спершу пишуться в локальний журнал, а потім пакетами йдуть на сервер
+        self.journal = EventJournal(JOURNAL_PATH, self.station_id)
+        self.journal_sender = JournalSender(self.journal, self.server_url, STATION_KEY, NETWORK_TIMEOUT_SEC,
+                                            RETRY_INTERVAL_SEC, session=self.api.session, binary=WIRE_FORMAT == "binary")
+        self.journal_sender.on_result = lambda result: self.api.call_in_ui(self.on_journal_result, result)
         
         self.setup_styles()
         self.root.configure(bg=self.colors['background'])
         self.setup_ui()
         self.update_status("Вітаємо! Введіть OTP-код для отримання книги", self.colors['text_dark'])
+        self.pump_ui()
+        self.start_event_listener()
+        self.start_otp_sync()
+        self.journal_sender.start()
+        self.telemetry_uploader.start()
     
+    @property
+    def current_session(self):
+        return self.engine.session
+
     # Налаштовує стилі елементів інтерфейсу
     def setup_styles(self):
         style = ttk.Style()
@@ -174,64 +213,9 @@ class LockerSimulator:
                  bg=self.colors['text_dark'],
                  fg=self.colors['text_light']).pack(expand=True)
         
-        cells_container = tk.Frame(right_column, bg=self.colors['background'])
-        cells_container.pack(fill=tk.BOTH, expand=True, pady=20)
-        
-        self.cell_widgets = {}
-        
-        for col in range(3):
-            cells_container.grid_columnconfigure(col, weight=1, uniform='cell')
-        for row in range(2):
-            cells_container.grid_rowconfigure(row, weight=1, uniform='cell')
-        
-        cell_ids = sorted(self.locker_cells.keys())
-        for i, cell_id in enumerate(cell_ids):
-            row = i // 3
-            col = i % 3
-            
-            cell_frame = tk.Frame(cells_container,
-                                  bg=self.colors['panel_bg'],
-                                  relief=tk.FLAT,
-                                  bd=1,
-                                  highlightbackground=self.colors['grey_light'],
-                                  highlightthickness=1)
-            cell_frame.grid(row=row, column=col, padx=10, pady=30, sticky='nsew')
-            
-            status_icon = tk.Label(cell_frame,
-                                   text="🔒",
-                                   font=('Consolas', 30),
-                                   bg=self.colors['panel_bg'],
-                                   fg=self.colors['primary'])
-            status_icon.pack(pady=(25, 10))
-            
-            cell_id_label = tk.Label(cell_frame,
-                                     text=f"КОМІРКА {cell_id}",
-                                     font=('Consolas', 14, 'bold'),
-                                     bg=self.colors['panel_bg'],
-                                     fg=self.colors['text_dark'])
-            cell_id_label.pack()
-
-            status_label = tk.Label(cell_frame,
-                                    text="ЗАБЛОКОВАНА",
-                                    font=('Consolas', 11),
-                                    bg=self.colors['panel_bg'],
-                                    fg=self.colors['primary'])
-            status_label.pack(pady=(5, 20))
-            
-            self.cell_widgets[cell_id] = {
-                'frame': cell_frame,
-                'icon': status_icon,
-                'id_label': cell_id_label,
-                'status': status_label
-            }
-        
-        total_cells = len(cell_ids)
-        if total_cells < 6:
-            for i in range(total_cells, 6):
-                row = i // 3
-                col = i % 3
-                empty_frame = tk.Frame(cells_container, bg=self.colors['background'])
-                empty_frame.grid(row=row, column=col, padx=10, pady=10, sticky='nsew')
+        self.cell_grid = CellGrid(right_column, self.locker_cells, self.colors)
+        self.cell_grid.pack(fill=tk.BOTH, expand=True, pady=20)
+        self.engine.subscribe(self.cell_grid.update_cells)
         
         log_frame = tk.Frame(self.root, bg=self.colors['panel_bg'], relief=tk.FLAT, bd=0)
         log_frame.pack(fill=tk.X, padx=40, pady=(0, 20))
@@ -266,9 +250,94 @@ class LockerSimulator:
         menubar.add_cascade(label="Управління", menu=admin_menu)
         admin_menu.add_command(label="Відкрити комірку (Адмін)", command=self.admin_unlock_cell)
         admin_menu.add_command(label="Примусово завершити (Адмін)", command=self.admin_force_confirm)
+        admin_menu.add_command(label="Повернення книги", command=self.admin_return_book)
         admin_menu.add_separator()
         admin_menu.add_command(label="Перезавантажити Систему", command=self.reset_system)
     
+    # Телеметрія кожного запиту до сервера (викликається з робочих потоків)
+    def on_api_request(self, path, elapsed, status):
+        if status is None:
+            self.telemetry.record("error.network")
+        else:
+            self.telemetry.record("rtt_ms", elapsed * 1000)
+            if status >= 500:
+                self.telemetry.record("error.server")
+
+    # Виконує в потоці Tk результати мережевих операцій
+    def pump_ui(self):
+        self.api.pump()
+        self.root.after(UI_POLL_INTERVAL_MS, self.pump_ui)
+
+    # Запускає фонову підписку станції на події бронювань (SSE)
+    def start_event_listener(self):
+        threading.Thread(target=self._listen_station_events, daemon=True).start()
+
+    # Читає потік подій; після розриву з'єднання перепідключається з Last-Event-ID
+    def _listen_station_events(self):
+        url = f"{self.server_url}/iot/stations/{self.station_id}/events"
+        # Потік тримає з'єднання постійно, тому має власну сесію поза пулом
+        stream_session = requests.Session()
+        while True:
+            try:
+                headers = {"Last-Event-ID": str(self.last_event_seq), "Accept": "text/event-stream"}
+                with stream_session.get(url, headers=headers, stream=True,
+                                        timeout=(NETWORK_TIMEOUT_SEC, 60)) as response:
+                    response.raise_for_status()
+                    event = {}
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line is None:
+                            continue
+                        if line == "":
+                            if "id" in event:
+                                self.last_event_seq = int(event["id"])
+                            if "data" in event:
+                                self.api.call_in_ui(self.on_station_event, json.loads(event["data"]))
+                            event = {}
+                        elif not line.startswith(":") and ":" in line:
+                            field, value = line.split(":", 1)
+                            event[field] = value.lstrip()
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+            time.sleep(RETRY_INTERVAL_SEC)
+
+    # Запускає фонову синхронізацію таблиці OTP
+    def start_otp_sync(self):
+        if not STATION_KEY:
+            self.log("Ключ станції не задано — OTP перевіряються лише сервером, журнал і телеметрія не приймаються")
+            return
+        threading.Thread(target=self._otp_sync_loop, daemon=True).start()
+
+    def _otp_sync_loop(self):
+        while True:
+            try:
+                path = f"/iot/stations/{self.station_id}/otp-digests"
+                response = self.api.get(path, headers=sign_headers(STATION_KEY, "GET", path))
+                response.raise_for_status()
+                self.otp_cache.load(response.json())
+            except (requests.exceptions.RequestException, ValueError, KeyError):
+                pass
+            self.otp_sync_requested.wait(OTP_SYNC_INTERVAL_SEC)
+            self.otp_sync_requested.clear()
+
+    # Результат події журналу, підтвердженої сервером
+    def on_journal_result(self, result):
+        if result.get("status") == "rejected":
+            self.log(f"Сервер відхилив подію {result.get('key')}: {result.get('error')}")
+
+    # Обробляє подію бронювання для цієї станції
+    def on_station_event(self, event):
+        # Нове або змінене бронювання — таблиця OTP застаріла
+        self.otp_sync_requested.set()
+        messages = {
+            "reservation_created": "Нове бронювання",
+            "reservation_staged": "Книгу розміщено в комірці",
+            "reservation_cancelled": "Бронювання скасовано",
+            "reservation_completed": "Бронювання виконано",
+            "reservation_expired": "Бронювання прострочено",
+        }
+        title = messages.get(event.get("type"), event.get("type"))
+        self.log(f"{title} #{event.get('reservation_id')} (книга {event.get('book_id')})")
+
     # Додає повідомлення у журнал системи
     def log(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -304,40 +373,56 @@ class LockerSimulator:
             messagebox.showerror("Помилка", "OTP має містити рівно 6 цифр")
             return
         
+        # Свіжа таблиця дайджестів дозволяє перевірити код без звернення до сервера
+        if self.otp_cache.is_fresh():
+            entry, error = self.otp_cache.verify(otp)
+            self.telemetry.record("otp.local")
+            if entry:
+                self.unlock_offline(entry)
+                return
+            if error == REPLAYED:
+                self.show_error(error)
+                return
+
         self.update_status("Перевірка OTP...", self.colors['primary'])
         self.verify_btn.state(['disabled'])
         self.otp_entry.config(state=tk.DISABLED)
         
-        threading.Thread(target=self._verify_otp_async, args=(otp,), daemon=True).start()
+        self.api.submit(
+            self._request_unlock, otp,
+            on_done=self.on_unlock_response,
+            on_error=lambda e: self.show_error(f"Помилка з'єднання: {str(e)}")
+        )
 
-    # Асинхронно надсилає OTP на сервер для перевірки   
-    def _verify_otp_async(self, otp):
-        try:
-            response = requests.post(
-                f"{self.server_url}/iot/lockers/unlock",
-                json={"otp": otp},
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.current_session.update({
-                    "locker_id": data.get('locker_id'),
-                    "book_id": data.get('book_id'),
-                    "user_id": data.get('user_id'),
-                    "unlock_time": time.time()
-                })
-                
-                self.root.after(0, self.unlock_cell, data.get('locker_id'))
-            else:
-                error_msg = response.json().get('error', 'Невідома помилка')
-                self.root.after(0, self.show_error, error_msg)
-                
-        except requests.exceptions.RequestException as e:
-            self.root.after(0, self.show_error, f"Помилка з'єднання: {str(e)}")
+    # Відкриває комірку за локально перевіреним кодом; сервер дізнається про це пізніше
+    def unlock_offline(self, entry):
+        self.journal.append("unlock", reservation_id=entry["reservation_id"], locker_id=entry["locker_id"])
+        self.journal_sender.wake()
+        self.unlock_cell(entry["locker_id"], None, entry["book_id"], entry["reservation_id"])
+
+    # Надсилає OTP на сервер для перевірки (у пулі потоків)
+    def _request_unlock(self, otp):
+        if WIRE_FORMAT == "binary":
+            response = self.api.post(UNLOCK_PATH, data=wire.encode_unlock(self.station_id, otp),
+                                     headers={"Content-Type": wire.CONTENT_TYPE})
+            return response.status_code, wire.decode_response(response.content, self.station_id)
+        response = self.api.post(UNLOCK_PATH, json=unlock_body(self.station_id, otp))
+        return response.status_code, response.json()
+
+    # Обробляє відповідь сервера на OTP (у потоці UI)
+    def on_unlock_response(self, response):
+        status_code, data = response
+        if status_code != 200:
+            self.show_error(data.get('error', 'Невідома помилка'))
+            return
+
+        if data.get('reservation_id'):
+            self.otp_cache.mark_redeemed(data['reservation_id'])
+        self.unlock_cell(data.get('locker_id'), data.get('user_id'), data.get('book_id'), data.get('reservation_id'))
 
     # Показує помилку користувачу та відновлює інтерфейс       
     def show_error(self, message):
+        self.telemetry.record("error.ui")
         self.update_status(f"Помилка: {message}", self.colors['danger'])
         messagebox.showerror("Помилка", message)
         self.clear_otp()
@@ -345,29 +430,20 @@ class LockerSimulator:
         self.verify_btn.state(['!disabled'])
 
     # Відчиняє комірку та змінює її стан в інтерфейсі 
-    def unlock_cell(self, locker_id):
-        if locker_id not in self.locker_cells:
-            self.show_error(f"Комірка {locker_id} не існує")
+    def unlock_cell(self, locker_id, user_id, book_id, reservation_id=None):
+        try:
+            self.engine.start_session(locker_id, user_id, book_id, reservation_id)
+        except LockerError as e:
+            self.show_error(str(e))
             return
         
         self.log(f"Відкриття комірки {locker_id}")
         
-        cell = self.cell_widgets[locker_id]
-        cell['frame'].config(bg=self.colors['secondary'], highlightbackground=self.colors['secondary'])
-        cell['icon'].config(text="🔓", fg=self.colors['text_light'], bg=self.colors['secondary'])
-        cell['status'].config(text="ВІДКРИТА - ЗАБЕРІТЬ", fg=self.colors['text_light'], bg=self.colors['secondary'], font=('Consolas', 11, 'bold'))
-        
-        self.locker_cells[locker_id]['open'] = True
-        
         self.update_status(
-            f"Комірка {locker_id} відкрита!\nЗаберіть книгу протягом 60 секунд.",
+            f"Комірка {locker_id} відкрита!\nЗаберіть книгу протягом {int(PICKUP_TIMEOUT_SEC)} секунд.",
             self.colors['secondary']
         )
         
-        self.otp_entry.config(state=tk.DISABLED)
-        self.verify_btn.state(['disabled'])
-        self.clear_btn.state(['disabled'])
-
         self.otp_entry.config(state=tk.DISABLED)
         self.verify_btn.state(['disabled'])
         self.clear_btn.state(['disabled'])
@@ -376,13 +452,11 @@ class LockerSimulator:
     
     # Запускає таймер    
     def start_pickup_timer(self):
-        timeout = 60
-        
         def countdown():
-            if not self.current_session['unlock_time']:
+            remaining = self.engine.remaining()
+            if remaining is None:
                 return
-                
-            remaining = timeout - int(time.time() - self.current_session['unlock_time'])
+            remaining = int(remaining)
             
             if remaining <= 0:
                 self.root.after(0, self.confirm_pickup_dialog)
@@ -417,48 +491,57 @@ class LockerSimulator:
             return
             
         self.update_status("...Підтвердження видачі...", self.colors['primary'])
+        self.telemetry.record("pickup_sec", time.time() - self.current_session['unlock_time'])
+
+        pickup = {
+            "reservation_id": self.current_session['reservation_id'],
+            "user_id": self.current_session['user_id'],
+            "book_id": self.current_session['book_id'],
+            "locker_id": locker_id
+        }
+        self.api.submit(
+            self._journal_pickup, pickup,
+            on_done=self.on_pickup_result,
+            on_error=lambda e: self.show_error(f"Помилка підтвердження: {str(e)}")
+        )
 
-        threading.Thread(target=self._confirm_pickup_async, daemon=True).start()
+    # Підтверджує видачу книги: подія спершу фіксується в журналі,
+    # тож навіть без зв'язку позика буде створена, щойно сервер стане доступним
+    def _journal_pickup(self, pickup):
+        key = self.journal.append("pickup", **pickup)
+        self.journal_sender.flush()
+        status, result = self.journal.result(key)
+        return pickup['locker_id'], status, result
 
-    # Асинхронно підтверджує видачу книги
-    def _confirm_pickup_async(self):
-        locker_id = self.current_session['locker_id']
-        try:
-            response = requests.post(
-                f"{self.server_url}/iot/lockers/confirm_pickup",
-                json={
-                    "user_id": self.current_session['user_id'],
-                    "book_id": self.current_session['book_id']
-                },
-                timeout=5
+    # Показує результат видачі (у потоці UI)
+    def on_pickup_result(self, outcome):
+        locker_id, status, result = outcome
+        if status == "sent":
+            loan_id = result.get('loan_id')
+            due_date = result.get('due_date')
+
+            self.update_status(
+                f"🎉 Успішно!\nПозика #{loan_id}\nТермін: {due_date[:10]}\n\nПриємного читання!",
+                self.colors['secondary']
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                loan_id = data.get('loan_id')
-                due_date = data.get('due_date')
-                
-                self.root.after(0, lambda: self.update_status(
-                    f"🎉 Успішно!\nПозика #{loan_id}\nТермін: {due_date[:10]}\n\nПриємного читання!",
-                    self.colors['secondary']
-                ))
-                
-                self.log(f"Книгу видано (Позика #{loan_id})")
-                self.root.after(0, self.close_cell, locker_id)
-                
-                self.root.after(0, lambda: messagebox.showinfo(
-                    "Успіх!",
-                    f"Книгу видано!\nПозика #{loan_id}\n"
-                    f"Повернути до: {due_date[:10]}"
-                ))
-                
-                self.root.after(3000, self.reset_session)
-            else:
-                error = response.json().get('error', 'Невідома помилка')
-                self.root.after(0, self.show_error, error)
-                
-        except requests.exceptions.RequestException as e:
-            self.root.after(0, self.show_error, f"Помилка підтвердження: {str(e)}")
+            self.log(f"Книгу видано (Позика #{loan_id})")
+            self.close_cell(locker_id)
+            self.root.after(3000, self.reset_session)
+            messagebox.showinfo(
+                "Успіх!",
+                f"Книгу видано!\nПозика #{loan_id}\n"
+                f"Повернути до: {due_date[:10]}"
+            )
+        elif status == "rejected":
+            self.show_error(result.get('error', 'Невідома помилка'))
+        else:
+            self.update_status(
+                "Видачу збережено на станції.\nПозику буде оформлено, щойно з'явиться зв'язок.\n\nПриємного читання!",
+                self.colors['secondary']
+            )
+            self.log(f"Сервер недоступний, видача в журналі ({self.journal.pending_count()} в черзі)")
+            self.close_cell(locker_id)
+            self.root.after(3000, self.reset_session)
 
     # Обробляє ситуацію, коли книгу не забрали
     def cancel_pickup(self):
@@ -479,28 +562,17 @@ class LockerSimulator:
     # Зачиняє комірку та скидає її стан
     def close_cell(self, locker_id):
         self.log(f"Закриття комірки {locker_id}")
+        if locker_id == self.current_session['locker_id'] and self.locker_cells.get(locker_id, {}).get('open'):
+            self.telemetry.record("door_open_sec", time.time() - self.current_session['unlock_time'])
         
-        if locker_id not in self.cell_widgets:
-             self.log(f"Помилка: Віджет для комірки {locker_id} не знайдено.")
-             return
-             
-        cell = self.cell_widgets[locker_id]
-        cell['frame'].config(bg=self.colors['panel_bg'], highlightbackground=self.colors['grey_light'])
-        cell['icon'].config(text="🔒", fg=self.colors['primary'], bg=self.colors['panel_bg'])
-        cell['status'].config(text="ЗАБЛОКОВАНА", fg=self.colors['primary'], bg=self.colors['panel_bg'], font=('Consolas', 11))
-        
-        self.locker_cells[locker_id]['open'] = False
-        self.locker_cells[locker_id]['occupied'] = False
-        self.locker_cells[locker_id]['book_id'] = None
+        try:
+            self.engine.close_cell(locker_id)
+        except LockerError as e:
+            self.log(f"Помилка: {e}")
 
     # Скидає поточну сесію та повертає систему у початковий стан   
     def reset_session(self):
-        self.current_session = {
-            "locker_id": None,
-            "book_id": None,
-            "user_id": None,
-            "unlock_time": None
-        }
+        self.engine.finish_session()
         
         self.update_status("Вітаємо! Введіть OTP код для отримання книги", self.colors['text_dark'])
         self.timer_label.config(text="")
@@ -535,11 +607,7 @@ class LockerSimulator:
         def unlock():
             locker_id = locker_var.get()
             if locker_id:
-                self.current_session['locker_id'] = locker_id
-                self.current_session['book_id'] = f"BOOK-{locker_id}"
-                self.current_session['user_id'] = "ADMIN-001"
-                self.current_session['unlock_time'] = time.time()
-                self.unlock_cell(locker_id)
+                self.unlock_cell(locker_id, "ADMIN-001", f"BOOK-{locker_id}")
                 dialog.destroy()
         
         ttk.Button(dialog,
@@ -555,12 +623,18 @@ class LockerSimulator:
         self.log(f"Адмін: Примусове завершення сесії для комірки {self.current_session['locker_id']}")
         self.confirm_pickup_dialog()
 
+    # Повернення книги в поштомат (подія йде через журнал)
+    def admin_return_book(self):
+        book_id = simpledialog.askinteger("Повернення книги", "ID книги:", parent=self.root, minvalue=1)
+        if not book_id:
+            return
+        self.journal.append("return", book_id=book_id)
+        self.journal_sender.wake()
+        self.log(f"Повернення книги #{book_id} записано в журнал")
+
     # перезавантаження системи
     def reset_system(self):
-        for locker_id in self.locker_cells:
-            if self.locker_cells[locker_id]['open']:
-                self.close_cell(locker_id)
-        
+        self.engine.reset()
         self.reset_session()
         self.log("СИСТЕМА ПЕРЕЗАВАНТАЖЕНА")
         messagebox.showinfo("Система", "Поштомат перезавантажено")
\ No newline at end of file
@@ -0,0 +1,171 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+import requests
+import wire
+from engine import EVENTS_PATH
+from station_auth import sign_headers
+
+BATCH_SIZE = 50
+BACKOFF_BASE_SEC = 2
+BACKOFF_MAX_SEC = 300
+
+
+# Локальний журнал подій станції (SQLite). Подія записується й фіксується на диску
+# до будь-якого звернення до сервера, тож видача не губиться при збої мережі чи перезапуску
+class EventJournal:
+    def __init__(self, path: str, station_id: str):
+        self.station_id = station_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                result TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_journal_due ON journal (status, next_attempt_at)")
+
+    # Записує подію; повертає її ключ ідемпотентності
+    def append(self, type: str, **payload) -> str:
+        key = f"{self.station_id}-{uuid.uuid4().hex}"
+        payload.setdefault("occurred_at", datetime.utcnow().isoformat())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (idempotency_key, type, payload, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (key, type, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        return key
+
+    # Події, готові до відправки
+    def due(self, limit: int = BATCH_SIZE, now: float | None = None) -> list[dict]:
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idempotency_key, type, payload, attempts FROM journal "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+        return [
+            {"key": key, "type": type, "attempts": attempts, **json.loads(payload)}
+            for key, type, payload, attempts in rows
+        ]
+
+    # Фіксує відповіді сервера: applied/duplicate — відправлено, rejected — відхилено назавжди
+    def complete(self, results: list[dict]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for result in results:
+                status = "rejected" if result.get("status") == "rejected" or result.get("outcome") == "rejected" \
+                    else "sent"
+                self._conn.execute(
+                    "UPDATE journal SET status = ?, result = ? WHERE idempotency_key = ?",
+                    (status, json.dumps(result, ensure_ascii=False), result.get("key"))
+                )
+            self._conn.execute("COMMIT")
+
+    # Відкладає пакет з експоненційною затримкою (з джитером, щоб станції не стукали одночасно)
+    def retry_later(self, keys: list[str], error: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for key in keys:
+                attempts = self._conn.execute(
+                    "SELECT attempts FROM journal WHERE idempotency_key = ?", (key,)
+                ).fetchone()[0] + 1
+                delay = min(BACKOFF_BASE_SEC * 2 ** attempts, BACKOFF_MAX_SEC) * random.uniform(0.5, 1.0)
+                self._conn.execute(
+                    "UPDATE journal SET attempts = ?, next_attempt_at = ?, result = ? WHERE idempotency_key = ?",
+                    (attempts, now + delay, json.dumps({"error": error}, ensure_ascii=False), key)
+                )
+            self._conn.execute("COMMIT")
+
+    def result(self, key: str) -> tuple[str, dict | None]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result FROM journal WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None, None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal WHERE status = 'pending'").fetchone()[0]
+
+
+# Фоновий відправник журналу пакетами на /iot/events (запити підписуються ключем станції)
+class JournalSender:
+    def __init__(self, journal: EventJournal, server_url: str, station_key: str, timeout: float,
+                 idle_interval: float, session: requests.Session | None = None, binary: bool = False):
+        self.journal = journal
+        self.station_key = station_key
+        self.binary = binary
+        self.http = session or requests
+        self.url = f"{server_url}{EVENTS_PATH}"
+        self.timeout = timeout
+        self.idle_interval = idle_interval
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.on_result = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # Просить відправника не чекати наступного інтервалу
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self.flush()
+            self._wakeup.wait(self.idle_interval)
+            self._wakeup.clear()
+
+    # Відправляє всі готові події; повертає кількість підтверджених сервером
+    def flush(self) -> int:
+        with self._flush_lock:
+            confirmed = 0
+            while True:
+                batch = self.journal.due()
+                if not batch:
+                    return confirmed
+                keys = [item["key"] for item in batch]
+                events = [{k: v for k, v in item.items() if k != "attempts"} for item in batch]
+                try:
+                    results = self._post(events)
+                except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                    self.journal.retry_later(keys, str(e))
+                    return confirmed
+                self.journal.complete(results)
+                confirmed += len(results)
+                if self.on_result:
+                    for result in results:
+                        self.on_result(result)
+
+    def _post(self, events: list[dict]) -> list[dict]:
+        station_id = self.journal.station_id
+        headers = sign_headers(self.station_key, "POST", EVENTS_PATH)
+        if self.binary:
+            response = self.http.post(
+                self.url, data=wire.encode_events(station_id, events),
+                headers={**headers, "Content-Type": wire.CONTENT_TYPE}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            return wire.decode_response(response.content, station_id)["results"]
+        response = self.http.post(self.url, json={"station_id": station_id, "events": events},
+                                  headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["results"]
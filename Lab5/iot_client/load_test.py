@@ -0,0 +1,255 @@
+"""
+Навантажувальний тест протоколу поштомату без графічного інтерфейсу.
+
+Запускає N віртуальних станцій в одному процесі (asyncio). Кожна станція має
+власний LockerEngine і проходить цикл: отримання OTP -> відкриття комірки ->
+підтвердження видачі -> повернення книги. Наприкінці друкується пропускна
+здатність і затримки (p50/p95/p99) для кожного кроку.
+
+    python load_test.py --stations 200 --rounds 3 --server http://localhost:5000
+"""
+import argparse
+import asyncio
+import json
+import string
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+from engine import (
+    LockerEngine, LockerError, UNLOCK_PATH, EVENTS_PATH,
+    otp_path, unlock_body, station_event, events_body
+)
+from station_auth import sign_headers
+
+STEPS = ("otp", "unlock", "confirm", "return")
+
+
+class HttpError(Exception):
+    pass
+
+
+# Мінімальний HTTP/1.1 JSON-клієнт на asyncio-потоках з одним keep-alive з'єднанням
+# (перепідключається, якщо сервер закрив з'єднання)
+class AsyncHttpClient:
+    def __init__(self, base_url: str, timeout: float):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.timeout = timeout
+        self.token = None   # токен сесії для маршрутів бібліотекаря та адміністратора
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, body: dict | None = None, headers: dict | None = None):
+        return await asyncio.wait_for(self._request(method, path, body, headers), self.timeout)
+
+    async def _request(self, method: str, path: str, body: dict | None, extra_headers: dict | None):
+        if self._writer is None:
+            await self._connect()
+        payload = json.dumps(body).encode() if body is not None else b""
+        auth = f"Authorization: Bearer {self.token}\r\n" if self.token else ""
+        auth += "".join(f"{name}: {value}\r\n" for name, value in (extra_headers or {}).items())
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n{auth}"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+        )
+        self._writer.write(head.encode() + payload)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            # Сервер закрив keep-alive з'єднання — повторюємо на новому
+            await self.close()
+            return await self._request(method, path, body, extra_headers)
+        version, status = status_line.decode().split(" ", 2)[:2]
+        headers = {}
+        while True:
+            line = (await self._reader.readline()).decode().strip()
+            if not line:
+                break
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            data = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self._reader.read()
+        if version == "HTTP/1.0" or headers.get("connection", "").lower() == "close":
+            await self.close()
+        return int(status), json.loads(data) if data else {}
+
+
+# Статистика затримок по кроках
+class StepStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first = {}
+        self.last = {}
+
+    def record(self, step: str, started: float, finished: float, ok: bool):
+        if ok:
+            self.latencies[step].append(finished - started)
+        else:
+            self.errors[step] += 1
+        self.first[step] = min(self.first.get(step, started), started)
+        self.last[step] = max(self.last.get(step, finished), finished)
+
+    @staticmethod
+    def _percentile(values: list[float], q: float) -> float:
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, max(0, round(q * (len(values) - 1))))
+        return values[index]
+
+    def report(self) -> str:
+        lines = [f"{'крок':<10}{'успішно':>9}{'помилок':>9}{'зап/с':>9}{'p50 мс':>9}{'p95 мс':>9}"
+                 f"{'p99 мс':>9}{'max мс':>9}"]
+        for step in STEPS:
+            values = sorted(self.latencies[step])
+            span = self.last.get(step, 0) - self.first.get(step, 0)
+            throughput = len(values) / span if span > 0 else 0.0
+            lines.append(
+                f"{step:<10}{len(values):>9}{self.errors[step]:>9}{throughput:>9.1f}"
+                + "".join(f"{self._percentile(values, q) * 1000:>9.1f}" for q in (0.5, 0.95, 0.99))
+                + f"{(values[-1] * 1000 if values else 0):>9.1f}"
+            )
+        return "\n".join(lines)
+
+
+# Ідентифікатори станцій складаються лише з літер: LTA, LTB, ..., LTAA, ...
+def station_name(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = string.ascii_uppercase[rest] + letters
+    return f"LT{letters}"
+
+
+# Підготовка: станція з комірками, її ключ і по одному бронюванню нової книги на кожен раунд
+async def prepare_station(client: AsyncHttpClient, station_id: str, rounds: int,
+                          user_id: int) -> tuple[str, list[int]]:
+    status, data = await client.request("POST", "/admin/stations/", {"station_id": station_id, "cells": rounds})
+    if status not in (201, 400):
+        raise HttpError(f"{station_id}: станцію не створено ({status})")
+    status, data = await client.request("GET", f"/admin/stations/{station_id}/key")
+    if status != 200:
+        raise HttpError(f"{station_id}: ключ станції не отримано ({status})")
+    key = data["station_key"]
+
+    reservations = []
+    for i in range(rounds):
+        status, book = await client.request("POST", "/librarian/books/", {
+            "title": f"Навантажувальний тест {station_id}-{i}", "author": "Load Test"
+        })
+        if status != 201:
+            raise HttpError(f"{station_id}: книгу не створено ({book.get('error')})")
+        status, res = await client.request("POST", "/reservations/", {
+            "user_id": user_id, "book_id": book["book_id"], "station_id": station_id
+        })
+        if status != 201 or not res.get("locker_id"):
+            raise HttpError(f"{station_id}: бронювання не розміщено ({res.get('error')})")
+        reservations.append(res["reservation_id"])
+    return key, reservations
+
+
+# Один цикл видачі й повернення на станції
+async def run_cycle(client: AsyncHttpClient, engine: LockerEngine, key: str, reservation_id: int,
+                    stats: StepStats):
+    async def step(name, method, path, body=None, expect=200, signed=False):
+        started = time.perf_counter()
+        try:
+            headers = sign_headers(key, method, path) if signed else None
+            status, data = await client.request(method, path, body, headers)
+            ok = status == expect
+        except (OSError, asyncio.TimeoutError, ValueError):
+            status, data, ok = None, {}, False
+        stats.record(name, started, time.perf_counter(), ok)
+        if not ok:
+            raise HttpError(f"{name}: {status} {data.get('error', '')}")
+        return data
+
+    station_id = engine.station_id
+    otp = (await step("otp", "GET", otp_path(reservation_id)))["otp"]
+    unlocked = await step("unlock", "POST", UNLOCK_PATH, unlock_body(station_id, otp))
+    engine.start_session(unlocked["locker_id"], unlocked["user_id"], unlocked["book_id"], reservation_id)
+
+    pickup = station_event(station_id, "pickup", user_id=unlocked["user_id"], book_id=unlocked["book_id"])
+    result = (await step("confirm", "POST", EVENTS_PATH, events_body(station_id, [pickup]), signed=True))["results"][0]
+    engine.finish_session()
+    if result["status"] == "rejected":
+        raise HttpError(f"confirm: {result['error']}")
+
+    returned = station_event(station_id, "return", book_id=unlocked["book_id"])
+    result = (await step("return", "POST", EVENTS_PATH, events_body(station_id, [returned]), signed=True))["results"][0]
+    if result["status"] == "rejected":
+        raise HttpError(f"return: {result['error']}")
+
+
+async def run_station(server: str, timeout: float, station_id: str, key: str, reservations: list[int],
+                      cells: int, stats: StepStats, failures: list):
+    client = AsyncHttpClient(server, timeout)
+    engine = LockerEngine(station_id, [f"{station_id}{i}" for i in range(1, cells + 1)])
+    try:
+        for reservation_id in reservations:
+            try:
+                await run_cycle(client, engine, key, reservation_id, stats)
+            except (HttpError, LockerError, KeyError) as e:
+                failures.append(f"{station_id}: {e}")
+                engine.reset()
+    finally:
+        await client.close()
+
+
+async def main(args):
+    stations = [station_name(i) for i in range(args.stations)]
+    setup_client = AsyncHttpClient(args.server, args.timeout)
+    plan = {}
+    started = time.perf_counter()
+    try:
+        status, session = await setup_client.request("POST", "/auth/login", {
+            "email": args.admin_email, "password": args.admin_password
+        })
+        if status != 200:
+            raise HttpError(f"вхід адміністратора: {status} {session.get('error', '')}")
+        setup_client.token = session["token"]
+        for station_id in stations:
+            plan[station_id] = await prepare_station(setup_client, station_id, args.rounds, args.user_id)
+    finally:
+        await setup_client.close()
+    print(f"Підготовка: {len(stations)} станцій, {len(stations) * args.rounds} бронювань "
+          f"за {time.perf_counter() - started:.1f} с")
+
+    stats = StepStats()
+    failures = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_station(args.server, args.timeout, station_id, *plan[station_id], args.rounds, stats, failures)
+        for station_id in stations
+    ))
+    elapsed = time.perf_counter() - started
+    cycles = len(stats.latencies["return"])
+    print(f"Цикли: {cycles} за {elapsed:.1f} с ({cycles / elapsed:.1f} циклів/с), помилок: {len(failures)}")
+    print(stats.report())
+    for failure in failures[:10]:
+        print("  " + failure)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Навантажувальний тест протоколу поштомату")
+    parser.add_argument("--server", default="http://localhost:5000")
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=2, help="циклів видачі на станцію")
+    parser.add_argument("--user-id", type=int, default=1, help="читач, від імені якого створюються бронювання")
+    parser.add_argument("--admin-email", default="li.li@test.com", help="обліковий запис для підготовки станцій")
+    parser.add_argument("--admin-password", default="123")
+    parser.add_argument("--timeout", type=float, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Сесія з пулом keep-alive з'єднань і повторами на рівні адаптера.
+# Автоматично повторюються лише GET: повтор POST /iot/lockers/unlock списує зайві спроби
+# обмежувача OTP і може вдруге відкрити комірку, а пакети журналу повторює сам JournalSender
+def build_session(pool_size: int, retries: int, backoff_factor: float) -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Мережевий шар станції: спільна сесія, обмежений пул потоків і черга результатів для UI.
+# Колбеки ніколи не викликаються з робочих потоків — їх виконує pump() у потоці Tk
+class ApiClient:
+    def __init__(self, server_url: str, timeout: float, workers: int, pool_size: int,
+                 retries: int, backoff_factor: float):
+        self.server_url = server_url
+        self.timeout = timeout
+        self.session = build_session(pool_size, retries, backoff_factor)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="locker-net")
+        self._ui_queue = queue.Queue()
+        # on_request(path, секунди, статус або None при мережевій помилці) — для телеметрії
+        self.on_request = None
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.server_url}{path}", **kwargs)
+        except requests.exceptions.RequestException:
+            self._observe(path, time.perf_counter() - started, None)
+            raise
+        self._observe(path, time.perf_counter() - started, response.status_code)
+        return response
+
+    def _observe(self, path: str, elapsed: float, status):
+        if self.on_request:
+            self.on_request(path, elapsed, status)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    # Виконує fn у пулі; on_done(result) або on_error(exception) отримає потік UI
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        def run():
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if on_error:
+                    self._ui_queue.put((on_error, (e,)))
+                return
+            if on_done:
+                self._ui_queue.put((on_done, (result,)))
+        return self.executor.submit(run)
+
+    # Передає виклик у потік UI (для фонових потоків, що не йдуть через submit)
+    def call_in_ui(self, callback, *args):
+        self._ui_queue.put((callback, args))
+
+    # Виконує накопичені колбеки; викликається таймером Tk
+    def pump(self, limit: int = 100):
+        for _ in range(limit):
+            try:
+                callback, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,64 @@
+import threading
+import time
+from station_auth import otp_digest
+
+REPLAYED = "Цей код уже використано"
+
+
+# Локальна таблиця дайджестів OTP станції (HMAC з ключем станції).
+# Перевірка коду — один HMAC і пошук у словнику; використані бронювання
+# запам'ятовуються, щоб код не можна було ввести вдруге (навіть після синхронізації)
+class OtpCache:
+    def __init__(self, max_age_sec: float, key: str):
+        self.max_age_sec = max_age_sec
+        self.key = key
+        self._lock = threading.Lock()
+        self._salt = None
+        self._entries = {}     # digest -> [entry, ...]
+        self._redeemed = {}    # reservation_id -> час використання
+        self.synced_at = None
+
+    # Замінює таблицю даними з сервера
+    def load(self, table: dict):
+        entries = {}
+        for entry in table.get("entries", []):
+            entries.setdefault(entry["digest"], []).append(entry)
+        active = {entry["reservation_id"] for entry in table.get("entries", [])}
+        with self._lock:
+            self._salt = table["salt"]
+            self._entries = entries
+            # Бронювання, яких сервер уже не надсилає, завершені — пам'ятати їх не потрібно
+            self._redeemed = {rid: ts for rid, ts in self._redeemed.items() if rid in active}
+            self.synced_at = time.time()
+
+    # Таблиця придатна, якщо її отримано не раніше ніж max_age_sec тому
+    def is_fresh(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        return self.synced_at is not None and now - self.synced_at <= self.max_age_sec
+
+    # Повертає (запис бронювання, None) або (None, причина відмови)
+    def verify(self, otp: str, now: float | None = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._salt is None:
+                return None, "Таблиця кодів ще не завантажена"
+            digest = otp_digest(self.key, self._salt, otp)
+            candidates = self._entries.get(digest, [])
+            valid = [e for e in candidates if e["valid_from"] <= now < e["valid_until"]]
+            if not valid:
+                return None, "Неправильний або прострочений OTP"
+            unused = [e for e in valid if e["reservation_id"] not in self._redeemed]
+            if not unused:
+                return None, REPLAYED
+            entry = unused[0]
+            self._redeemed[entry["reservation_id"]] = now
+            return dict(entry), None
+
+    # Позначає бронювання використаним (після відкриття комірки через сервер)
+    def mark_redeemed(self, reservation_id: int):
+        with self._lock:
+            self._redeemed[reservation_id] = time.time()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
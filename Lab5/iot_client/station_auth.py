@@ -0,0 +1,38 @@
+import hashlib
+import hmac
+import time
+
+# Автентифікація станції ключем, який видає сервер (GET /admin/stations/<id>/key).
+# Запит підписується HMAC над методом, шляхом і часом; сам ключ мережею не передається
+HEADER_TIMESTAMP = "X-Station-Timestamp"
+HEADER_SIGNATURE = "X-Station-Signature"
+# Допустиме розходження годинників станції та сервера
+MAX_SKEW_SEC = 300
+DIGEST_LENGTH = 16
+
+
+def request_signature(key: str, method: str, path: str, timestamp: int) -> str:
+    return hmac.new(key.encode(), f"{method.upper()} {path} {timestamp}".encode(), hashlib.sha256).hexdigest()
+
+
+# Заголовки підпису для запиту станції
+def sign_headers(key: str, method: str, path: str, now: float | None = None) -> dict:
+    timestamp = int(time.time() if now is None else now)
+    return {HEADER_TIMESTAMP: str(timestamp), HEADER_SIGNATURE: request_signature(key, method, path, timestamp)}
+
+
+def verify_headers(key: str, method: str, path: str, headers, now: float | None = None) -> bool:
+    try:
+        timestamp = int(headers.get(HEADER_TIMESTAMP, ""))
+    except ValueError:
+        return False
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > MAX_SKEW_SEC:
+        return False
+    expected = request_signature(key, method, path, timestamp)
+    return hmac.compare_digest(expected.encode(), headers.get(HEADER_SIGNATURE, "").encode())
+
+
+# Дайджест OTP з ключем станції: без ключа таблицю не можна перебрати офлайн
+def otp_digest(key: str, salt: str, otp: str) -> str:
+    return hmac.new(key.encode(), f"{salt}:{otp}".encode(), hashlib.sha256).hexdigest()[:DIGEST_LENGTH]
@@ -0,0 +1,83 @@
+import gzip
+import json
+import threading
+import time
+from collections import deque
+import requests
+from station_auth import sign_headers
+
+
+# Кільцевий буфер семплів (час, метрика, значення): при переповненні витісняються найстаріші,
+# тож тривалий офлайн не з'їдає пам'ять станції
+class TelemetryBuffer:
+    def __init__(self, capacity: int):
+        self._samples = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def record(self, metric: str, value: float = 1, ts: float | None = None):
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                self.dropped += 1
+            self._samples.append((time.time() if ts is None else ts, metric, value))
+
+    def take(self, limit: int) -> list:
+        with self._lock:
+            return [self._samples.popleft() for _ in range(min(limit, len(self._samples)))]
+
+    # Повертає невідправлені семпли на початок буфера (якщо вони ще вміщаються)
+    def give_back(self, samples: list):
+        with self._lock:
+            room = self._samples.maxlen - len(self._samples)
+            for sample in reversed(samples[-room:] if room else []):
+                self._samples.appendleft(sample)
+            self.dropped += max(0, len(samples) - room)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+# Періодично відправляє буфер стисненими gzip пакетами на /iot/telemetry (з підписом ключем станції)
+class TelemetryUploader:
+    PATH = "/iot/telemetry"
+
+    def __init__(self, buffer: TelemetryBuffer, station_id: str, station_key: str, server_url: str,
+                 session: requests.Session, timeout: float, interval: float, batch_size: int):
+        self.buffer = buffer
+        self.station_id = station_id
+        self.station_key = station_key
+        self.url = f"{server_url}{self.PATH}"
+        self.session = session
+        self.timeout = timeout
+        self.interval = interval
+        self.batch_size = batch_size
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.upload()
+
+    def upload(self) -> int:
+        sent = 0
+        while len(self.buffer):
+            samples = self.buffer.take(self.batch_size)
+            body = gzip.compress(json.dumps(
+                {"station_id": self.station_id, "samples": [[round(ts, 3), m, v] for ts, m, v in samples]},
+                separators=(",", ":")
+            ).encode())
+            try:
+                response = self.session.post(
+                    self.url, data=body, timeout=self.timeout,
+                    headers={"Content-Type": "application/json", "Content-Encoding": "gzip",
+                             **sign_headers(self.station_key, "POST", self.PATH)}
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException:
+                self.buffer.give_back(samples)
+                return sent
+            sent += len(samples)
+        return sent
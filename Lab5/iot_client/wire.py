@@ -0,0 +1,260 @@
+"""
+Компактний бінарний протокол станція <-> сервер для /iot/* (Content-Type: application/vnd.locker+bin).
+
+Кадр: заголовок ">2sBBH" (магія b"LK", версія, тип повідомлення, кількість записів),
+далі записи фіксованої довжини для цього типу. Усі числа big-endian, ідентифікатори —
+беззнакові 32-бітні, час — секунди Unix, рядкові ідентифікатори — ASCII з доповненням нулями.
+Замість текстів помилок передаються однобайтові коди (таблиця ERRORS).
+Модуль без залежностей: його використовують і станція, і сервер.
+"""
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone
+
+CONTENT_TYPE = "application/vnd.locker+bin"
+MAGIC = b"LK"
+VERSION = 1
+
+HEADER = struct.Struct(">2sBBH")
+STATION = struct.Struct(">8s")
+
+# Типи повідомлень і формати їхніх записів
+UNLOCK_REQUEST, CONFIRM_REQUEST, RETURN_REQUEST, EVENTS_REQUEST = 0x01, 0x02, 0x03, 0x04
+UNLOCK_RESPONSE, CONFIRM_RESPONSE, RETURN_RESPONSE, EVENTS_RESPONSE = 0x81, 0x82, 0x83, 0x84
+ERROR_RESPONSE = 0xFF
+
+RECORDS = {
+    UNLOCK_REQUEST: struct.Struct(">8sI"),          # station_id, otp
+    CONFIRM_REQUEST: struct.Struct(">II"),          # user_id, book_id
+    RETURN_REQUEST: struct.Struct(">I"),            # book_id
+    EVENTS_REQUEST: struct.Struct(">16sBIIII"),     # key, type, occurred_at, reservation_id, user_id, book_id
+    UNLOCK_RESPONSE: struct.Struct(">8sIII"),       # locker_id, reservation_id, user_id, book_id
+    CONFIRM_RESPONSE: struct.Struct(">II"),         # loan_id, due_date
+    RETURN_RESPONSE: struct.Struct(">I"),           # return_date
+    EVENTS_RESPONSE: struct.Struct(">16sBBBII"),    # key, type, status, error, loan/reservation id, час
+    ERROR_RESPONSE: struct.Struct(">B"),            # код помилки
+}
+
+EVENT_TYPES = {"unlock": 1, "pickup": 2, "return": 3}
+EVENT_NAMES = {code: name for name, code in EVENT_TYPES.items()}
+EVENT_STATUSES = {"applied": 0, "duplicate": 1, "rejected": 2}
+STATUS_NAMES = {code: name for name, code in EVENT_STATUSES.items()}
+
+UNKNOWN_ERROR = 255
+ERRORS = {
+    1: "OTP має містити 6 цифр",
+    2: "Неправильний або прострочений OTP",
+    3: "Книгу ще не розміщено в поштоматі",
+    4: "Книга знаходиться в іншому поштоматі",
+    5: "user_id та book_id обов'язкові",
+    6: "Немає активного бронювання для цієї книги",
+    7: "book_id обов'язковий",
+    8: "Активна позика для цієї книги не знайдена",
+    9: "Книга не знайдена",
+    10: "Книга списана і недоступна",
+    11: "Книга вже видана",
+    12: "Книга зарезервована іншим користувачем",
+    13: "Позика не знайдена",
+    14: "Книга вже повернута",
+    15: "Подія без ключа або невідомого типу",
+    16: "Бронювання не розміщене в цьому поштоматі",
+    17: "Недійсний час події",
+    18: "station_id обов'язковий",
+    19: "Недійсний бінарний пакет",
+    20: "Забагато спроб введення OTP, спробуйте пізніше",
+    21: "Сервер перевантажений, спробуйте пізніше",
+    22: "reservation_id або user_id та book_id обов'язкові",
+    23: "Невідомий поштомат",
+    24: "Потрібна автентифікація станції",
+    25: "Станцію не знайдено",
+    UNKNOWN_ERROR: "Невідома помилка",
+}
+ERROR_CODES = {message: code for code, message in ERRORS.items()}
+
+
+class WireError(ValueError):
+    pass
+
+
+def error_code(message: str | None) -> int:
+    return ERROR_CODES.get(message, UNKNOWN_ERROR) if message else 0
+
+
+# Ідентифікатор для поля фіксованої довжини: лише ASCII і не довший за size байт
+def _ascii(value: str | None, size: int = 8) -> bytes:
+    try:
+        data = (value or "").encode("ascii")
+    except UnicodeEncodeError:
+        raise WireError(ERRORS[19])
+    if len(data) > size:
+        raise WireError(ERRORS[19])
+    return data
+
+
+def _text(value: bytes) -> str:
+    try:
+        return value.rstrip(b"\0").decode("ascii")
+    except UnicodeDecodeError:
+        raise WireError(ERRORS[19])
+
+
+# Єдиний запис повідомлення (запити й відповіді unlock/confirm/return, помилка)
+def _single(records: list) -> tuple:
+    if len(records) != 1:
+        raise WireError(ERRORS[19])
+    return records[0]
+
+
+def _epoch(value: str | None) -> int:
+    if not value:
+        return 0
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _iso(value: int) -> str | None:
+    return (EPOCH + timedelta(seconds=value)).isoformat() if value else None
+
+
+# Ключ ідемпотентності "<станція>-<uuid hex>" передається як 16 байт UUID
+def _key_bytes(key: str) -> bytes:
+    return uuid.UUID(key.rsplit("-", 1)[-1]).bytes
+
+
+def encode_frame(msg_type: int, records: list[tuple], prefix: bytes = b"") -> bytes:
+    record = RECORDS[msg_type]
+    return HEADER.pack(MAGIC, VERSION, msg_type, len(records)) + prefix + b"".join(
+        record.pack(*values) for values in records
+    )
+
+
+# Повертає (тип, записи, префікс) або кидає WireError
+def decode_frame(data: bytes):
+    try:
+        magic, version, msg_type, count = HEADER.unpack_from(data)
+        record = RECORDS[msg_type]
+    except (struct.error, KeyError):
+        raise WireError(ERRORS[19])
+    if magic != MAGIC or version != VERSION:
+        raise WireError(ERRORS[19])
+    prefix_size = STATION.size if msg_type == EVENTS_REQUEST else 0
+    offset = HEADER.size + prefix_size
+    if len(data) != offset + count * record.size:
+        raise WireError(ERRORS[19])
+    records = list(record.iter_unpack(data[offset:])) if count else []
+    return msg_type, records, data[HEADER.size:offset]
+
+
+# ----- Станція: кодування запитів і декодування відповідей -----
+
+def encode_unlock(station_id: str, otp: str) -> bytes:
+    return encode_frame(UNLOCK_REQUEST, [(_ascii(station_id), int(otp))])
+
+
+def encode_confirm(user_id: int, book_id: int) -> bytes:
+    return encode_frame(CONFIRM_REQUEST, [(user_id, book_id)])
+
+
+def encode_return(book_id: int) -> bytes:
+    return encode_frame(RETURN_REQUEST, [(book_id,)])
+
+
+def encode_events(station_id: str, events: list[dict]) -> bytes:
+    return encode_frame(EVENTS_REQUEST, [
+        (_key_bytes(e["key"]), EVENT_TYPES[e["type"]], _epoch(e.get("occurred_at")),
+         e.get("reservation_id") or 0, e.get("user_id") or 0, e.get("book_id") or 0)
+        for e in events
+    ], prefix=STATION.pack(_ascii(station_id)))
+
+
+# Відповідь сервера у вигляді того ж dict, що й у JSON-варіанті
+def decode_response(data: bytes, station_id: str = "") -> dict:
+    msg_type, records, _ = decode_frame(data)
+    if msg_type == ERROR_RESPONSE:
+        return {"error": ERRORS.get(_single(records)[0], ERRORS[UNKNOWN_ERROR])}
+    if msg_type == UNLOCK_RESPONSE:
+        locker_id, reservation_id, user_id, book_id = _single(records)
+        return {"locker_id": _text(locker_id), "reservation_id": reservation_id,
+                "user_id": user_id, "book_id": book_id}
+    if msg_type == CONFIRM_RESPONSE:
+        loan_id, due_date = _single(records)
+        return {"loan_id": loan_id, "due_date": _iso(due_date)}
+    if msg_type == RETURN_RESPONSE:
+        return {"return_date": _iso(_single(records)[0])}
+    if msg_type == EVENTS_RESPONSE:
+        results = []
+        for key, type, status, error, entity_id, moment in records:
+            result = {"key": f"{station_id}-{key.hex()}", "status": STATUS_NAMES[status]}
+            if error:
+                result["error"] = ERRORS.get(error, ERRORS[UNKNOWN_ERROR])
+            if status == EVENT_STATUSES["duplicate"]:
+                result["outcome"] = "rejected" if error else "applied"
+            if not error:
+                if EVENT_NAMES.get(type) == "pickup":
+                    result.update(loan_id=entity_id, due_date=_iso(moment))
+                elif EVENT_NAMES.get(type) == "return":
+                    result.update(loan_id=entity_id, return_date=_iso(moment))
+                elif EVENT_NAMES.get(type) == "unlock":
+                    result["reservation_id"] = entity_id
+            results.append(result)
+        return {"results": results}
+    raise WireError(ERRORS[19])
+
+
+# ----- Сервер: декодування запитів і кодування відповідей -----
+
+# Тіло запиту у вигляді dict, який очікує відповідний JSON-маршрут
+def decode_request(data: bytes) -> tuple[int, dict]:
+    msg_type, records, prefix = decode_frame(data)
+    if msg_type == UNLOCK_REQUEST:
+        station_id, otp = _single(records)
+        return msg_type, {"otp": str(otp).zfill(6) if otp <= 999999 else str(otp), "station_id": _text(station_id)}
+    if msg_type == CONFIRM_REQUEST:
+        user_id, book_id = _single(records)
+        return msg_type, {"user_id": user_id or None, "book_id": book_id or None}
+    if msg_type == RETURN_REQUEST:
+        return msg_type, {"book_id": _single(records)[0] or None}
+    if msg_type == EVENTS_REQUEST:
+        station_id = _text(STATION.unpack(prefix)[0])
+        return msg_type, {"station_id": station_id, "events": [
+            {"key": f"{station_id}-{key.hex()}", "type": EVENT_NAMES.get(type),
+             "occurred_at": _iso(occurred_at), "reservation_id": reservation_id or None,
+             "user_id": user_id or None, "book_id": book_id or None}
+            for key, type, occurred_at, reservation_id, user_id, book_id in records
+        ]}
+    raise WireError(ERRORS[19])
+
+
+# Кодує JSON-відповідь маршруту (dict) для бінарного клієнта; request — декодоване тіло запиту
+# (звідти беруться типи подій пакета, яких немає у відповіді)
+def encode_response(request_type: int, status_code: int, data: dict, request: dict | None = None) -> bytes:
+    if status_code >= 400 or "error" in data:
+        return encode_frame(ERROR_RESPONSE, [(error_code(data.get("error")) or UNKNOWN_ERROR,)])
+    if request_type == UNLOCK_REQUEST:
+        return encode_frame(UNLOCK_RESPONSE, [(
+            _ascii(data["locker_id"]), data["reservation_id"], data["user_id"], data["book_id"]
+        )])
+    if request_type == CONFIRM_REQUEST:
+        return encode_frame(CONFIRM_RESPONSE, [(data["loan_id"], _epoch(data["due_date"]))])
+    if request_type == RETURN_REQUEST:
+        return encode_frame(RETURN_RESPONSE, [(_epoch(data["return_date"]),)])
+    if request_type == EVENTS_REQUEST:
+        types = {e["key"]: e["type"] for e in (request or {}).get("events", [])}
+        records = []
+        for result in data["results"]:
+            if not result.get("key"):
+                continue
+            rejected = result["status"] == "rejected" or result.get("outcome") == "rejected"
+            moment = result.get("due_date") or result.get("return_date")
+            records.append((
+                _key_bytes(result["key"]),
+                EVENT_TYPES.get(types.get(result["key"]), 0),
+                EVENT_STATUSES[result["status"]],
+                error_code(result.get("error")) if rejected else 0,
+                result.get("loan_id") or result.get("reservation_id") or 0,
+                _epoch(moment),
+            ))
+        return encode_frame(EVENTS_RESPONSE, records)
+    raise WireError(ERRORS[19])
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from models import Loan, Reservation, IotEventReceipt, ReservationStatus
+from events import append_event
+from lockers import cell_for_reservation, station_of_locker
+from crud.librarian import create_loan, return_book
+from suggest import suggest_index
+
+MAX_BATCH_SIZE = 200
+
+
+# Фактичний час події на станції; майбутній час (збитий годинник) обрізається до поточного.
+# Час зі зсувом ("+02:00", "Z") переводиться в наївний UTC, як і всі дати в БД
+def _occurred_at(item: dict) -> datetime:
+    now = datetime.utcnow()
+    try:
+        moment = datetime.fromisoformat(item["occurred_at"]) if item.get("occurred_at") else now
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Недійсний час події")
+    return min(moment, now)
+
+
+def _apply_unlock(db: Session, station_id: str, item: dict) -> dict:
+    res = db.query(Reservation).filter(
+        Reservation.reservation_id == item.get("reservation_id"),
+        Reservation.status == ReservationStatus.ACTIVE
+    ).first()
+    locker_id = cell_for_reservation(db, res.reservation_id) if res else None
+    if not locker_id or station_of_locker(locker_id) != station_id:
+        raise ValueError("Бронювання не розміщене в цьому поштоматі")
+    append_event(db, "locker_unlocked", res.reservation_id, locker_id=locker_id,
+                 user_id=res.user_id, book_id=res.book_id, offline=True, occurred_at=_occurred_at(item))
+    return {"reservation_id": res.reservation_id, "locker_id": locker_id}
+
+
+# Видача за reservation_id (офлайн-таблиця OTP не містить user_id) або за user_id
+def _apply_pickup(db: Session, station_id: str, item: dict) -> dict:
+    reservation_id, user_id, book_id = item.get("reservation_id"), item.get("user_id"), item.get("book_id")
+    if not (reservation_id or user_id) or not book_id:
+        raise ValueError("reservation_id або user_id та book_id обов'язкові")
+    occurred_at = _occurred_at(item)
+    owner = Reservation.reservation_id == reservation_id if reservation_id else Reservation.user_id == user_id
+    res = db.query(Reservation).filter(
+        owner,
+        Reservation.book_id == book_id,
+        Reservation.status == ReservationStatus.ACTIVE,
+        Reservation.expiry_date > occurred_at
+    ).first()
+    if not res:
+        raise ValueError("Немає активного бронювання для цієї книги")
+    user_id = res.user_id
+
+    loan = create_loan(db, user_id, book_id, issued_at=occurred_at, commit=False)
+    append_event(db, "locker_pickup_confirmed", res.reservation_id,
+                 user_id=user_id, book_id=book_id, station_id=station_id, occurred_at=occurred_at)
+    return {"loan_id": loan.loan_id, "due_date": loan.due_date.isoformat()}
+
+
+def _apply_return(db: Session, station_id: str, item: dict) -> dict:
+    book_id = item.get("book_id")
+    if not book_id:
+        raise ValueError("book_id обов'язковий")
+    loan = db.query(Loan).filter(Loan.book_id == book_id, Loan.return_date.is_(None)).first()
+    if not loan:
+        raise ValueError("Активна позика для цієї книги не знайдена")
+
+    occurred_at = _occurred_at(item)
+    return_book(db, loan.loan_id, returned_at=max(occurred_at, loan.issue_date), commit=False)
+    append_event(db, "locker_return", loan.loan_id, user_id=loan.user_id, book_id=book_id,
+                 station_id=station_id, occurred_at=occurred_at)
+    return {"loan_id": loan.loan_id, "return_date": loan.return_date.isoformat()}
+
+
+HANDLERS = {
+    "unlock": _apply_unlock,
+    "pickup": _apply_pickup,
+    "return": _apply_return,
+}
+
+
+# Застосовує пакет подій станції в одній транзакції.
+# Кожна подія має ключ ідемпотентності: повторно надіслана подія не застосовується вдруге,
+# а отримує збережений результат. Бізнес-помилки (ValueError) відхиляють лише свою подію —
+# перевірки в crud виконуються до будь-яких змін, тож транзакція лишається узгодженою
+def apply_station_events(db: Session, station_id: str, events: list[dict]) -> list[dict]:
+    if len(events) > MAX_BATCH_SIZE:
+        raise ValueError(f"Пакет не може містити більше {MAX_BATCH_SIZE} подій")
+
+    keys = [item.get("key") for item in events if item.get("key")]
+    receipts = {
+        receipt.idempotency_key: receipt
+        for receipt in db.query(IotEventReceipt).filter(IotEventReceipt.idempotency_key.in_(keys))
+    }
+
+    results = []
+    issued_books = []
+    for item in events:
+        key = item.get("key")
+        handler = HANDLERS.get(item.get("type"))
+        if not key or not handler:
+            results.append({"key": key, "status": "rejected", "error": "Подія без ключа або невідомого типу"})
+            continue
+        if key in receipts:
+            receipt = receipts[key]
+            results.append({"key": key, "status": "duplicate", "outcome": receipt.status,
+                            **json.loads(receipt.result)})
+            continue
+
+        try:
+            result = handler(db, station_id, item)
+            status = "applied"
+            if item["type"] == "pickup":
+                issued_books.append(item["book_id"])
+        except ValueError as e:
+            result = {"error": str(e)}
+            status = "rejected"
+
+        receipt = IotEventReceipt(
+            idempotency_key=key,
+            station_id=station_id,
+            type=item["type"],
+            status=status,
+            result=json.dumps(result, ensure_ascii=False),
+            received_at=datetime.utcnow()
+        )
+        db.add(receipt)
+        receipts[key] = receipt
+        results.append({"key": key, "status": status, **result})
+
+    db.commit()
+    for book_id in issued_books:
+        suggest_index.record_loan(book_id)
+    return results
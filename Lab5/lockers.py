@@ -0,0 +1,166 @@
+import re
+import threading
+from datetime import datetime
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from models import LockerStation, LockerCell
+
+DEFAULT_STATION = "A"
+DEFAULT_CELLS = 5
+# Класи розмірів від меншого до більшого; якщо потрібного немає — береться більший
+SIZE_CLASSES = ("S", "M", "L")
+DEFAULT_SIZE = "M"
+
+
+# Ідентифікатор станції з ідентифікатора комірки ("A3" -> "A")
+def station_of_locker(locker_id: str) -> str:
+    return re.sub(r"\d+$", "", locker_id)
+
+
+# Розподіл комірок: вільні комірки зберігаються у списках (стеках) за (станція, розмір),
+# тому пошук вільної комірки та звільнення — O(1).
+# Стан у БД (LockerCell.reservation_id) є джерелом істини: захоплення робиться умовним UPDATE,
+# а списки в пам'яті оновлюються лише після commit/rollback сесії
+class CellAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = {}       # (station_id, size) -> [cell_id, ...]
+        self._free_set = set()
+        self._sizes = {}      # cell_id -> (station_id, size)
+        self._stations = set()
+
+    # Побудова списків вільних комірок з БД
+    def build(self, db: Session):
+        cells = db.query(LockerCell.cell_id, LockerCell.station_id, LockerCell.size,
+                         LockerCell.reservation_id).order_by(LockerCell.position.desc()).all()
+        with self._lock:
+            self._free, self._free_set, self._sizes, self._stations = {}, set(), {}, set()
+            for cell in cells:
+                self._sizes[cell.cell_id] = (cell.station_id, cell.size)
+                self._stations.add(cell.station_id)
+                if cell.reservation_id is None:
+                    self._push(cell.cell_id)
+
+    def _push(self, cell_id: str):
+        if cell_id in self._free_set or cell_id not in self._sizes:
+            return
+        self._free.setdefault(self._sizes[cell_id], []).append(cell_id)
+        self._free_set.add(cell_id)
+
+    def _pop(self, station_id: str, size: str) -> str | None:
+        for candidate in SIZE_CLASSES[SIZE_CLASSES.index(size):]:
+            free = self._free.get((station_id, candidate))
+            if free:
+                cell_id = free.pop()
+                self._free_set.discard(cell_id)
+                return cell_id
+        return None
+
+    def add_cells(self, cells: list[LockerCell]):
+        with self._lock:
+            for cell in cells:
+                self._sizes[cell.cell_id] = (cell.station_id, cell.size)
+                self._stations.add(cell.station_id)
+                if cell.reservation_id is None:
+                    self._push(cell.cell_id)
+
+    # Закріплює вільну комірку за бронюванням у поточній транзакції
+    def allocate(self, db: Session, reservation_id: int, station_id: str = DEFAULT_STATION,
+                 size: str = DEFAULT_SIZE) -> str | None:
+        if size not in SIZE_CLASSES:
+            raise ValueError(f"Недійсний розмір комірки. Дозволені значення: {list(SIZE_CLASSES)}")
+        while True:
+            with self._lock:
+                cell_id = self._pop(station_id, size)
+            if cell_id is None:
+                return None
+            claimed = db.execute(
+                update(LockerCell)
+                .where(LockerCell.cell_id == cell_id, LockerCell.reservation_id.is_(None))
+                .values(reservation_id=reservation_id, allocated_at=datetime.utcnow())
+            ).rowcount
+            if claimed:
+                db.info.setdefault("cells_allocated", []).append(cell_id)
+                return cell_id
+            # Комірку вже зайняв інший процес — пробуємо наступну
+
+    # Звільняє комірку бронювання; у список вільних вона потрапить після commit
+    def release(self, db: Session, reservation_id: int) -> str | None:
+        cell = db.query(LockerCell).filter(LockerCell.reservation_id == reservation_id).first()
+        if not cell:
+            return None
+        cell.reservation_id = None
+        cell.allocated_at = None
+        db.info.setdefault("cells_released", []).append(cell.cell_id)
+        return cell.cell_id
+
+    def _after_commit(self, session):
+        session.info.pop("cells_allocated", None)
+        released = session.info.pop("cells_released", None)
+        if released:
+            with self._lock:
+                for cell_id in released:
+                    self._push(cell_id)
+
+    def _after_rollback(self, session):
+        session.info.pop("cells_released", None)
+        allocated = session.info.pop("cells_allocated", None)
+        if allocated:
+            with self._lock:
+                for cell_id in allocated:
+                    self._push(cell_id)
+
+    # Чи відома станція (має комірки) — без звернення до БД
+    def has_station(self, station_id: str) -> bool:
+        with self._lock:
+            return station_id in self._stations
+
+    def free_count(self, station_id: str) -> int:
+        with self._lock:
+            return sum(len(cells) for (station, _), cells in self._free.items() if station == station_id)
+
+
+cell_allocator = CellAllocator()
+
+
+@event.listens_for(Session, "after_commit")
+def _cells_after_commit(session):
+    cell_allocator._after_commit(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _cells_after_rollback(session):
+    cell_allocator._after_rollback(session)
+
+
+# Комірка, закріплена за бронюванням
+def cell_for_reservation(db: Session, reservation_id: int) -> str | None:
+    cell = db.query(LockerCell.cell_id).filter(LockerCell.reservation_id == reservation_id).first()
+    return cell.cell_id if cell else None
+
+
+# Створення станції з комірками (ідентифікатори <station_id>1..N)
+def create_station(db: Session, station_id: str, cells: int = DEFAULT_CELLS, size: str = DEFAULT_SIZE,
+                   name: str | None = None, location: str | None = None) -> LockerStation:
+    if not re.fullmatch(r"[A-Za-z]+", station_id or ""):
+        raise ValueError("Ідентифікатор станції має складатися лише з літер")
+    if size not in SIZE_CLASSES:
+        raise ValueError(f"Недійсний розмір комірки. Дозволені значення: {list(SIZE_CLASSES)}")
+    if db.get(LockerStation, station_id):
+        raise ValueError("Станція з таким ідентифікатором уже існує")
+
+    station = LockerStation(station_id=station_id, name=name, location=location)
+    station.cells = [
+        LockerCell(cell_id=f"{station_id}{i}", position=i, size=size)
+        for i in range(1, cells + 1)
+    ]
+    db.add(station)
+    db.commit()
+    cell_allocator.add_cells(station.cells)
+    return station
+
+
+# Станція за замовчуванням для наявних інсталяцій (одна станція "A" з п'ятьма комірками)
+def ensure_default_station(db: Session):
+    if not db.query(LockerStation).first():
+        create_station(db, DEFAULT_STATION, DEFAULT_CELLS, name="Поштомат A")
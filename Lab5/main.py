@@ -1,11 +1,39 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from database import engine, SessionLocal
 from models import (
-    Base, User, Book, Loan, Reservation,
-    UserRole, BookStatus, ReservationStatus
+    Base, User, Book, Loan, Reservation, BookSearchKey, BookTrigram,
+    CirculationRollup, LockerStation, LockerCell, UserRole, BookStatus, ReservationStatus
 )
-import hashlib
-from datetime import datetime, timedelta
+from suggest import suggest_index
+from rollups import backfill_rollups
+from export import export_circulation, stream_circulation_csv
+from archive import archive_returned_loans, ARCHIVE_AFTER_MONTHS
+from reminders import schedule_reminders, drain_outbox, REMIND_DAYS_AHEAD
+from events import append_event, events_since, event_to_dict
+from lockers import cell_allocator, cell_for_reservation, ensure_default_station, station_of_locker, create_station
+from iot_events import apply_station_events
+from telemetry import ingest_telemetry, fleet_health
+from throttle import otp_throttle, address_throttle
+from admission import admission, classify
+from coalesce import coalesced, single_flight, joins_in_flight
+from entity_cache import entity_cache
+from statements import compiled_cache_stats
+from passwords import password_hasher
+from sessions import session_store
+from station_keys import station_key
+from push import sse_stream, wait_for_station_events, start_expiry_sweeper
+from otp import generate_reservation_otp, station_otp_digests, epoch_seconds
+from iot_client.station_auth import verify_headers as verify_station_headers
+from iot_client.wire import (
+    CONTENT_TYPE as WIRE_CONTENT_TYPE, ERROR_RESPONSE, WireError,
+    decode_request, encode_response, encode_frame, error_code
+)
+import os
+import secrets
+import functools
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
 
 # Імпорти CRUD
 from crud.reader import (
@@ -16,9 +44,11 @@ from crud.reader import (
     get_active_loans,
     get_user_active_reservations,
     extend_loan,
-    get_user,
-    get_book,
-    cancel_reservation
+    get_user_summary,
+    cancel_reservation,
+    rebuild_search_keys,
+    fuzzy_search_books,
+    FUZZY_THRESHOLD
 )
 from crud.librarian import (
     create_loan,
@@ -27,22 +57,52 @@ from crud.librarian import (
     update_book,
     delete_book,
     get_all_readers,
-    get_reader_loans
+    get_reader_loans,
+    stage_reservation,
+    stage_pending_reservations
 )
 from crud.admin import (
     create_user,
+    import_users,
     get_users,
     update_user,
     delete_user,
     change_user_role,
     get_popular_books,
     get_overdue_loans,
-    get_reader_activity
+    get_reader_activity,
+    get_circulation_trends,
+    get_trend_leaders,
+    get_fines_report
 )
 
 app = Flask(__name__)
 Base.metadata.create_all(bind=engine)
 
+# create_all не додає нові індекси до вже наявних таблиць
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+# Заповнення похідних структур (ключі пошуку, триграми, підказки, агрегати)
+# для даних, доданих до їх появи
+def init_derived_data():
+    db = SessionLocal()
+    try:
+        if not db.query(BookSearchKey).first() or not db.query(BookTrigram).first():
+            rebuild_search_keys(db)
+        suggest_index.build(db)
+        if not db.query(CirculationRollup).first() and db.query(Loan).first():
+            backfill_rollups(db)
+        ensure_default_station(db)
+        cell_allocator.build(db)
+        stage_pending_reservations(db)
+    finally:
+        db.close()
+
+init_derived_data()
+
 
 # Управління сесією бази даних
 @app.before_request
@@ -56,16 +116,118 @@ def close_db_session(exception):
         db.close()
 
 
-# Допоміжна функція для генерації OTP
-def generate_reservation_otp(reservation: Reservation) -> str:
-    """
-    Генерує 6-значний OTP на основі reservation_id, user_id, book_id та години.
-    OTP дійсний протягом 1 години.
-    """
-    hour_key = int(datetime.utcnow().timestamp() // 3600)
-    seed = f"{reservation.reservation_id}{reservation.user_id}{reservation.book_id}{hour_key}"
-    hash_val = hashlib.sha256(seed.encode()).hexdigest()
-    return str(int(hash_val[:12], 16) % 1000000).zfill(6)
+# Бінарний протокол станцій (iot_client/wire.py): тіло запиту декодується в той самий dict,
+# що й JSON, а JSON-відповідь маршруту перекодовується назад. Формат обирається за Content-Type
+@app.before_request
+def decode_wire_request():
+    if not request.path.startswith("/iot/") or request.mimetype != WIRE_CONTENT_TYPE:
+        return None
+    try:
+        g.wire_kind, g.wire_payload = decode_request(request.get_data())
+    except WireError as e:
+        return Response(encode_frame(ERROR_RESPONSE, [(error_code(str(e)),)]),
+                        status=400, mimetype=WIRE_CONTENT_TYPE)
+
+@app.after_request
+def encode_wire_response(response):
+    kind = g.pop('wire_kind', None)
+    if kind is None or response.mimetype != "application/json":
+        return response
+    try:
+        body = encode_response(kind, response.status_code, response.get_json(), g.pop('wire_payload'))
+    except WireError as e:
+        # Відповідь не вміщується у формат (напр. ідентифікатор комірки довший за 8 байт)
+        body = encode_frame(ERROR_RESPONSE, [(error_code(str(e)),)])
+        response.status_code = 500
+    response.set_data(body)
+    response.mimetype = WIRE_CONTENT_TYPE
+    return response
+
+
+# Допуск за пріоритетом: IoT > видача > перегляд каталогу > звіти.
+# Кожен клас має власний пул; переповнений клас отримує 503 і не тримає потоки інших.
+# Запити, що приєднуються до вже запущеного однакового обчислення (@coalesced), місця не займають
+@app.before_request
+def admit_request():
+    priority_class = classify(request.path)
+    if priority_class is None or joins_in_flight():
+        return None
+    retry_after = admission.acquire(priority_class)
+    if retry_after:
+        return jsonify({"error": "Сервер перевантажений, спробуйте пізніше"}), 503, {"Retry-After": str(retry_after)}
+    g.admission_class = priority_class
+
+@app.teardown_request
+def release_admission(exception):
+    priority_class = g.pop('admission_class', None)
+    if priority_class is not None:
+        admission.release(priority_class)
+
+
+# Сесія користувача з заголовка "Authorization: Bearer <токен>"; роль і id беруться
+# зі сховища сесій у пам'яті, тож перевірка доступу не звертається до БД
+@app.before_request
+def load_user_session():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    g.user_session = session_store.resolve(token.strip()) if scheme.lower() == "bearer" else None
+
+
+def _role_allowed(allowed: set[str]):
+    session = g.user_session
+    if session is None:
+        return jsonify({"error": "Потрібна авторизація"}), 401
+    if session.role not in allowed:
+        return jsonify({"error": "Недостатньо прав доступу"}), 403
+    return None
+
+
+# Доступ лише для сесій з однією з ролей
+def require_role(*roles: UserRole):
+    allowed = {role.value for role in roles}
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return _role_allowed(allowed) or view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+STAFF_ROLES = {UserRole.LIBRARIAN.value, UserRole.ADMIN.value}
+
+
+# Дані користувача бачить він сам, бібліотекар або адміністратор
+def require_self_or_staff(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        session = g.user_session
+        if session is not None and session.user_id == kwargs.get("user_id"):
+            return view(*args, **kwargs)
+        return _role_allowed(STAFF_ROLES) or view(*args, **kwargs)
+    return wrapper
+
+
+# Перевірка підпису запиту ключем станції (iot_client/station_auth.py); None, якщо запит дозволено
+def _station_denied(station_id: str):
+    if not verify_station_headers(station_key(station_id), request.method, request.path, request.headers):
+        return jsonify({"error": "Потрібна автентифікація станції"}), 401
+    if g.db.get(LockerStation, station_id) is None:
+        return jsonify({"error": "Станцію не знайдено"}), 404
+    return None
+
+
+# Запит має бути підписаний ключем станції з <station_id> у шляху
+def require_station(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return _station_denied(kwargs["station_id"]) or view(*args, **kwargs)
+    return wrapper
+
+
+# Тіло запиту станції незалежно від формату (JSON або бінарний)
+def iot_payload() -> dict:
+    if 'wire_payload' in g:
+        return g.wire_payload
+    return request.get_json()
 
 
 # ===== АВТЕНТИФІКАЦІЯ =====
@@ -80,16 +242,31 @@ def login():
         "user_id": user.user_id,
         "name": user.name,
         "email": user.email,
-        "role": user.role.value
+        "role": user.role.value,
+        "token": session_store.create(user.user_id, user.role.value),
+        "expires_in": session_store.ttl_sec
     })
 
 
+@app.route("/auth/logout", methods=["POST"])
+def logout():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not session_store.revoke(token.strip()):
+        return jsonify({"error": "Сесію не знайдено"}), 404
+    return jsonify({"message": "Сесію завершено"})
+
+
 # ===== ЧИТАЧ =====
 @app.route("/books/search")
+@coalesced(ttl=2)
 def search_books_route():
     db = g.db
     q = request.args.get("q", "")
+    threshold = request.args.get("threshold", FUZZY_THRESHOLD, type=float)
     books = search_books(db, q)
+    # Якщо точний пошук нічого не дав — пошук з урахуванням помилок
+    if not books and q.strip():
+        books = fuzzy_search_books(db, q, threshold)
     return jsonify([{
         "book_id": b.book_id,
         "title": b.title,
@@ -98,31 +275,60 @@ def search_books_route():
     } for b in books])
 
 
+@app.route("/books/suggest")
+def suggest_books_route():
+    prefix = request.args.get("prefix", "")
+    limit = min(request.args.get("limit", 10, type=int), 50)
+    return jsonify(suggest_index.suggest(prefix, limit))
+
+
 @app.route("/reservations/", methods=["POST"])
+@require_role(UserRole.READER, UserRole.LIBRARIAN, UserRole.ADMIN)
 def create_reservation_route():
     db = g.db
     data = request.get_json()
+    session = g.user_session
+    if session.role not in STAFF_ROLES and data.get("user_id") != session.user_id:
+        return jsonify({"error": "Недостатньо прав доступу"}), 403
     try:
-        res = create_reservation(db, data["user_id"], data["book_id"])
+        res = create_reservation(db, data["user_id"], data["book_id"], station_id=data.get("station_id"))
         return jsonify({
             "reservation_id": res.reservation_id,
             "book_id": res.book_id,
+            "locker_id": cell_for_reservation(db, res.reservation_id),
             "expiry_date": res.expiry_date.isoformat()
         }), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+# Дата з параметра запиту як наївний UTC (так зберігаються дати в БД); None, якщо не задано
+def parse_date_arg(name: str) -> datetime | None:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError):
+        raise ValueError(f"Недійсна дата у параметрі {name}")
+    return moment
+
+
 @app.route("/users/<int:user_id>/loans", methods=["GET"])
+@require_self_or_staff
 def get_user_loans_route(user_id):
     db = g.db
-    loans = get_user_loans(db, user_id)
+    try:
+        loans = get_user_loans(db, user_id, parse_date_arg("from"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     result = []
     for loan in loans:
-        book = get_book(db, loan.book_id)
         result.append({
             "loan_id": loan.loan_id,
-            "book_title": book.title,
+            "book_title": loan.book_title,
             "due_date": loan.due_date.isoformat(),
             "return_date": loan.return_date.isoformat() if loan.return_date else None
         })
@@ -130,21 +336,22 @@ def get_user_loans_route(user_id):
 
 
 @app.route("/users/<int:user_id>/loans/active", methods=["GET"])
+@require_self_or_staff
 def get_user_active_loans_route(user_id):
     db = g.db
     loans = get_active_loans(db, user_id)
     result = []
     for loan in loans:
-        book = get_book(db, loan.book_id)
         result.append({
             "loan_id": loan.loan_id,
-            "book_title": book.title,
+            "book_title": loan.book_title,
             "due_date": loan.due_date.isoformat()
         })
     return jsonify(result)
 
 
 @app.route("/users/<int:user_id>/reservations/active", methods=["GET"])
+@require_self_or_staff
 def get_user_active_reservations_route(user_id):
     db = g.db
     reservations = get_user_active_reservations(db, user_id)
@@ -156,25 +363,32 @@ def get_user_active_reservations_route(user_id):
 
 
 @app.route("/loans/<int:loan_id>/extend", methods=["POST"])
+@require_role(UserRole.READER, UserRole.LIBRARIAN, UserRole.ADMIN)
 def extend_loan_route(loan_id):
     db = g.db
     data = request.get_json()
     days = data.get("days", 7)
+    session = g.user_session
     try:
-        loan = extend_loan(db, loan_id, days)
+        loan = extend_loan(db, loan_id, days, caller_id=session.user_id, is_staff=session.role in STAFF_ROLES)
         return jsonify({
             "loan_id": loan.loan_id,
             "new_due_date": loan.due_date.isoformat()
         })
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
 @app.route("/reservations/<int:reservation_id>/cancel", methods=["POST"])
+@require_role(UserRole.READER, UserRole.LIBRARIAN, UserRole.ADMIN)
 def cancel_reservation_route(reservation_id):
     db = g.db
+    session = g.user_session
     try:
-        res = cancel_reservation(db, reservation_id)
+        res = cancel_reservation(db, reservation_id, caller_id=session.user_id,
+                                 is_staff=session.role in STAFF_ROLES)
         if not res:
             return jsonify({"error": "Бронювання не знайдено"}), 404
         return jsonify({
@@ -182,6 +396,8 @@ def cancel_reservation_route(reservation_id):
             "status": res.status.value,
             "message": "Бронювання успішно скасовано"
         })
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
@@ -190,6 +406,7 @@ def cancel_reservation_route(reservation_id):
 
 # ===== БІБЛІОТЕКАР =====
 @app.route("/librarian/users", methods=["GET"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_get_readers():
     db = g.db
     readers = get_all_readers(db)
@@ -201,15 +418,18 @@ def librarian_get_readers():
 
 
 @app.route("/librarian/users/<int:user_id>/loans", methods=["GET"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_get_reader_loans(user_id):
     db = g.db
-    loans = get_reader_loans(db, user_id)
+    try:
+        loans = get_reader_loans(db, user_id, parse_date_arg("from"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     result = []
     for loan in loans:
-        book = get_book(db, loan.book_id)
         result.append({
             "loan_id": loan.loan_id,
-            "book_title": book.title,
+            "book_title": loan.book_title,
             "due_date": loan.due_date.isoformat(),
             "return_date": loan.return_date.isoformat() if loan.return_date else None
         })
@@ -217,6 +437,7 @@ def librarian_get_reader_loans(user_id):
 
 
 @app.route("/librarian/loans/", methods=["POST"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_create_loan():
     db = g.db
     data = request.get_json()
@@ -232,6 +453,7 @@ def librarian_create_loan():
 
 
 @app.route("/librarian/loans/<int:loan_id>/return", methods=["POST"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_return_loan(loan_id):
     db = g.db
     try:
@@ -245,6 +467,7 @@ def librarian_return_loan(loan_id):
 
 
 @app.route("/librarian/books/", methods=["POST"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_create_book():
     db = g.db
     data = request.get_json()
@@ -261,6 +484,7 @@ def librarian_create_book():
 
 
 @app.route("/librarian/books/<int:book_id>", methods=["PUT"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_update_book(book_id):
     db = g.db
     data = request.get_json() or {}
@@ -281,6 +505,7 @@ def librarian_update_book(book_id):
 
 
 @app.route("/librarian/books/<int:book_id>", methods=["DELETE"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
 def librarian_delete_book(book_id):
     db = g.db
     try:
@@ -294,8 +519,21 @@ def librarian_delete_book(book_id):
         return jsonify({"error": "Внутрішня помилка сервера"}), 500
 
 
+@app.route("/librarian/reservations/<int:reservation_id>/stage", methods=["POST"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
+def librarian_stage_reservation(reservation_id):
+    db = g.db
+    data = request.get_json(silent=True) or {}
+    try:
+        locker_id = stage_reservation(db, reservation_id, data.get("station_id"), data.get("size"))
+        return jsonify({"reservation_id": reservation_id, "locker_id": locker_id})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 # ===== АДМІНІСТРАТОР =====
 @app.route("/admin/users/", methods=["POST"])
+@require_role(UserRole.ADMIN)
 def admin_create_user():
     db = g.db
     data = request.get_json()
@@ -310,7 +548,21 @@ def admin_create_user():
         return jsonify({"error": str(e)}), 400
 
 
+# Масовий імпорт користувачів (паролі хешуються в пулі процесів)
+@app.route("/admin/users/import", methods=["POST"])
+@require_role(UserRole.ADMIN)
+def admin_import_users():
+    db = g.db
+    data = request.get_json() or {}
+    try:
+        users = import_users(db, data.get("users", []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"created": len(users), "user_ids": [u.user_id for u in users]}), 201
+
+
 @app.route("/admin/users/", methods=["GET"])
+@require_role(UserRole.ADMIN)
 def admin_get_all_users():
     db = g.db
     role = request.args.get("role")
@@ -324,6 +576,7 @@ def admin_get_all_users():
 
 
 @app.route("/admin/users/<int:user_id>", methods=["PUT"])
+@require_role(UserRole.ADMIN)
 def admin_update_user(user_id):
     db = g.db
     data = request.get_json() or {}
@@ -345,6 +598,7 @@ def admin_update_user(user_id):
 
 
 @app.route("/admin/users/<int:user_id>/role", methods=["PUT"])
+@require_role(UserRole.ADMIN)
 def admin_change_role(user_id):
     db = g.db
     data = request.get_json()
@@ -364,6 +618,7 @@ def admin_change_role(user_id):
 
 
 @app.route("/admin/users/<int:user_id>", methods=["DELETE"])
+@require_role(UserRole.ADMIN)
 def admin_delete_user(user_id):
     db = g.db
     try:
@@ -376,6 +631,8 @@ def admin_delete_user(user_id):
 
 
 @app.route("/admin/reports/popular-books", methods=["GET"])
+@require_role(UserRole.ADMIN)
+@coalesced(ttl=5)
 def admin_popular_books():
     db = g.db
     books = get_popular_books(db)
@@ -388,23 +645,94 @@ def admin_popular_books():
 
 
 @app.route("/admin/reports/overdue", methods=["GET"])
+@require_role(UserRole.ADMIN)
+@coalesced(ttl=5)
 def admin_overdue_loans():
     db = g.db
     loans = get_overdue_loans(db)
     result = []
     for loan in loans:
-        user = get_user(db, loan.user_id)
-        book = get_book(db, loan.book_id)
         result.append({
-            "user": user.name,
-            "email": user.email,
-            "book": book.title,
+            "user": loan.user_name,
+            "email": loan.email,
+            "book": loan.book_title,
             "due_date": loan.due_date.isoformat()
         })
     return jsonify(result)
 
 
+# GET лише розраховує штрафи; POST додатково записує їх у журнал нарахувань
+@app.route("/admin/reports/fines", methods=["GET", "POST"])
+@require_role(UserRole.ADMIN)
+def admin_fines_report():
+    db = g.db
+    limit = request.args.get("limit", 50, type=int)
+    report = get_fines_report(db, limit=limit, persist=request.method == "POST")
+    return jsonify({
+        "assessed_at": report["assessed_at"].isoformat(),
+        "open_loans": report["open_loans"],
+        "fined_loans": report["fined_loans"],
+        "fined_users": report["fined_users"],
+        "total": report["total"] / 100,
+        "users": [{**u, "amount": u["amount"] / 100} for u in report["users"]]
+    })
+
+
+# Стан парку поштоматів за телеметрією
+@app.route("/admin/reports/fleet-health", methods=["GET"])
+@require_role(UserRole.ADMIN)
+@coalesced(ttl=5)
+def admin_fleet_health():
+    db = g.db
+    hours = request.args.get("hours", 24, type=int)
+    return jsonify(fleet_health(db, hours))
+
+
+# Завантаженість пулів допуску за класами пріоритету
+@app.route("/admin/reports/admission", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_admission():
+    return jsonify(admission.stats())
+
+
+# Лічильники об'єднання однакових одночасних запитів читання
+@app.route("/admin/reports/coalescing", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_coalescing():
+    return jsonify(single_flight.stats())
+
+
+# Частка влучань кешу користувачів і книг
+@app.route("/admin/reports/entity-cache", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_entity_cache():
+    return jsonify(entity_cache.stats())
+
+
+# Влучання в кеш скомпільованих SQL-запитів рушія
+@app.route("/admin/reports/statement-cache", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_statement_cache():
+    return jsonify(compiled_cache_stats.stats())
+
+
+# Активні сесії та лічильники сховища сесій
+@app.route("/admin/reports/sessions", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_sessions():
+    return jsonify(session_store.stats())
+
+
+# Лічильники обмежувача спроб OTP
+@app.route("/admin/reports/otp-throttle", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_otp_throttle():
+    return jsonify({"station": otp_throttle.stats(), "address": address_throttle.stats()})
+
+
 @app.route("/admin/reports/reader-activity", methods=["GET"])
+@require_role(UserRole.ADMIN)
+@coalesced(ttl=5)
 def admin_reader_activity():
     db = g.db
     limit = request.args.get("limit", 10, type=int)
@@ -417,10 +745,150 @@ def admin_reader_activity():
     } for r in readers])
 
 
+# Спільний розбір параметрів звітів за період
+def parse_trend_args(default_granularity: str, default_group_by: str):
+    end = parse_date_arg("to") or datetime.utcnow()
+    start = parse_date_arg("from") or end - timedelta(days=30)
+    return (
+        start,
+        end,
+        request.args.get("granularity", default_granularity),
+        request.args.get("group_by", default_group_by)
+    )
+
+
+@app.route("/admin/reports/trends", methods=["GET"])
+@require_role(UserRole.ADMIN)
+@coalesced(ttl=5)
+def admin_circulation_trends():
+    db = g.db
+    try:
+        start, end, granularity, group_by = parse_trend_args("day", "all")
+        rows = get_circulation_trends(db, start, end, granularity, group_by)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify([{
+        "bucket": r.bucket.isoformat(),
+        "group": r.group_key or None,
+        "loans": r.loans,
+        "returns": r.returns
+    } for r in rows])
+
+
+@app.route("/admin/reports/trends/top", methods=["GET"])
+@require_role(UserRole.ADMIN)
+@coalesced(ttl=5)
+def admin_trend_leaders():
+    db = g.db
+    limit = request.args.get("limit", 10, type=int)
+    try:
+        start, end, granularity, group_by = parse_trend_args("day", "category")
+        rows = get_trend_leaders(db, start, end, granularity, group_by, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify([{
+        "group": r.group_key or None,
+        "loan_count": r.loan_count,
+        "return_count": r.return_count
+    } for r in rows])
+
+
+@app.route("/admin/exports/circulation", methods=["POST"])
+@require_role(UserRole.ADMIN)
+def admin_export_circulation():
+    db = g.db
+    data = request.get_json(silent=True) or {}
+    try:
+        summary = export_circulation(db, full=bool(data.get("full", False)))
+        return jsonify(summary)
+    except Exception as e:
+        return jsonify({"error": "Помилка експорту: " + str(e)}), 500
+
+
+@app.route("/admin/exports/circulation.csv", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_export_circulation_csv():
+    db = g.db
+    since = request.args.get("since_loan_id", 0, type=int)
+    return Response(
+        stream_with_context(stream_circulation_csv(db, since)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=circulation.csv"}
+    )
+
+
+@app.route("/admin/maintenance/archive-loans", methods=["POST"])
+@require_role(UserRole.ADMIN)
+def admin_archive_loans():
+    db = g.db
+    data = request.get_json(silent=True) or {}
+    months = data.get("months", ARCHIVE_AFTER_MONTHS)
+    try:
+        moved = archive_returned_loans(db, int(months))
+        return jsonify({"archived": moved, "months": int(months)})
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": "Помилка архівації: " + str(e)}), 500
+
+
+@app.route("/admin/stations/", methods=["POST"])
+@require_role(UserRole.ADMIN)
+def admin_create_station():
+    db = g.db
+    data = request.get_json() or {}
+    try:
+        station = create_station(
+            db,
+            data.get("station_id"),
+            int(data.get("cells", 5)),
+            data.get("size", "M"),
+            data.get("name"),
+            data.get("location")
+        )
+        return jsonify({
+            "station_id": station.station_id,
+            "cells": [c.cell_id for c in station.cells],
+            "station_key": station_key(station.station_id)
+        }), 201
+    except ValueError as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 400
+
+
+# Ключ станції для її config.json (station_key)
+@app.route("/admin/stations/<station_id>/key", methods=["GET"])
+@require_role(UserRole.ADMIN)
+def admin_station_key(station_id):
+    if g.db.get(LockerStation, station_id) is None:
+        return jsonify({"error": "Станцію не знайдено"}), 404
+    return jsonify({"station_id": station_id, "station_key": station_key(station_id)})
+
+
+@app.route("/admin/reminders/schedule", methods=["POST"])
+@require_role(UserRole.ADMIN)
+def admin_schedule_reminders():
+    db = g.db
+    data = request.get_json(silent=True) or {}
+    try:
+        created = schedule_reminders(db, int(data.get("days", REMIND_DAYS_AHEAD)))
+        return jsonify({"scheduled": created})
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/admin/reminders/drain", methods=["POST"])
+@require_role(UserRole.ADMIN)
+def admin_drain_reminders():
+    db = g.db
+    return jsonify(drain_outbox(db))
+
+
 @app.route("/users/<int:user_id>", methods=["GET"])
+@require_self_or_staff
 def get_user_route(user_id):
     db = g.db
-    user = get_user(db, user_id)
+    user = get_user_summary(db, user_id)
     if not user:
         return jsonify({"error": "Not found"}), 404
     return jsonify({
@@ -431,6 +899,21 @@ def get_user_route(user_id):
     })
 
 
+# ===== ПОДІЇ =====
+@app.route("/events", methods=["GET"])
+@require_role(UserRole.LIBRARIAN, UserRole.ADMIN)
+def get_events():
+    db = g.db
+    since = request.args.get("since", 0, type=int)
+    limit = min(request.args.get("limit", 500, type=int), 5000)
+    types = request.args.get("types")
+    records = events_since(db, since, limit, types.split(",") if types else None)
+    return jsonify({
+        "events": [event_to_dict(r) for r in records],
+        "last_seq": records[-1].seq if records else since
+    })
+
+
 # ===== IoT =====
 @app.route("/iot/reservations/<int:reservation_id>/otp", methods=["GET"])
 def get_reservation_otp(reservation_id):
@@ -452,14 +935,127 @@ def get_reservation_otp(reservation_id):
     })
 
 
+# Стан комірок станції
+@app.route("/iot/stations/<station_id>/cells", methods=["GET"])
+def iot_station_cells(station_id):
+    db = g.db
+    cells = db.query(LockerCell).filter(LockerCell.station_id == station_id).order_by(LockerCell.position).all()
+    if not cells:
+        return jsonify({"error": "Станцію не знайдено"}), 404
+    return jsonify([{
+        "cell_id": c.cell_id,
+        "size": c.size,
+        "reservation_id": c.reservation_id
+    } for c in cells])
+
+
+# Таблиця солених дайджестів OTP для офлайн-перевірки кодів на станції
+@app.route("/iot/stations/<station_id>/otp-digests", methods=["GET"])
+@require_station
+def iot_station_otp_digests(station_id):
+    db = g.db
+    salt = secrets.token_hex(8)
+    return jsonify({
+        "station_id": station_id,
+        "salt": salt,
+        "generated_at": epoch_seconds(datetime.utcnow()),
+        "entries": station_otp_digests(db, station_id, salt)
+    })
+
+
+# Пакет подій поштомату (відкриття, видачі, повернення) з локального журналу станції.
+# Застосовується в одній транзакції; результат повертається для кожного ключа ідемпотентності
+@app.route("/iot/events", methods=["POST"])
+def iot_events_batch():
+    db = g.db
+    data = iot_payload() or {}
+    station_id = data.get("station_id")
+    if not station_id:
+        return jsonify({"error": "station_id обов'язковий"}), 400
+    # Події застосовуються від імені станції, чиїм ключем підписано запит
+    denied = _station_denied(station_id)
+    if denied:
+        return denied
+    try:
+        results = apply_station_events(db, station_id, data.get("events", []))
+        return jsonify({"results": results})
+    except ValueError as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 400
+
+
+# Пакет телеметрії станції (JSON, за потреби стиснений gzip), підписаний ключем станції
+@app.route("/iot/telemetry", methods=["POST"])
+def iot_telemetry():
+    db = g.db
+    try:
+        body = request.get_data()
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        data = json.loads(body)
+    except (OSError, ValueError):
+        return jsonify({"error": "Недійсний пакет телеметрії"}), 400
+    if not isinstance(data, dict) or not isinstance(data.get("samples", []), list):
+        return jsonify({"error": "Недійсний пакет телеметрії"}), 400
+
+    station_id = data.get("station_id")
+    if not station_id:
+        return jsonify({"error": "station_id обов'язковий"}), 400
+    denied = _station_denied(station_id)
+    if denied:
+        return denied
+    return jsonify(ingest_telemetry(db, station_id, data.get("samples", [])))
+
+
+# Потік подій бронювань для станції (SSE); відновлення з Last-Event-ID або ?since=
+@app.route("/iot/stations/<station_id>/events", methods=["GET"])
+def iot_station_events_stream(station_id):
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", 0, type=int)
+    return Response(
+        sse_stream(station_id, since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Long-poll альтернатива для клієнтів без підтримки SSE
+@app.route("/iot/stations/<station_id>/events/poll", methods=["GET"])
+def iot_station_events_poll(station_id):
+    since = request.args.get("since", 0, type=int)
+    timeout = min(request.args.get("timeout", 25, type=float), 60)
+    events, cursor = wait_for_station_events(station_id, since, timeout)
+    return jsonify({"events": events, "last_seq": cursor})
+
+
 @app.route("/iot/lockers/unlock", methods=["POST"])
 def iot_unlock_locker():
     db = g.db
-    data = request.get_json()
+    data = iot_payload()
     otp_input = data.get("otp")
+    station_id = data.get("station_id")
+    if not station_id:
+        return jsonify({"error": "station_id обов'язковий"}), 400
+    # Невідомі станції відкидаються до обмежувача: інакше кожен вигаданий station_id давав би нове відро
+    if not cell_allocator.has_station(station_id):
+        return jsonify({"error": "Невідомий поштомат"}), 400
+
+    # Обмеження перебору — до будь-якої роботи з БД: відро пари (станція, адреса)
+    # і спільне для адреси, щоб перебір не можна було розподілити між станціями
+    address = request.remote_addr
+    throttle_key = (station_id, address)
+    retry_after = address_throttle.check(address) or otp_throttle.check(throttle_key)
+    if retry_after:
+        return jsonify({"error": "Забагато спроб введення OTP, спробуйте пізніше"}), 429, {"Retry-After": str(retry_after)}
+
+    def failure(message):
+        otp_throttle.record_failure(throttle_key)
+        address_throttle.record_failure(address)
+        return jsonify({"error": message}), 400
 
     if not otp_input or len(otp_input) != 6 or not otp_input.isdigit():
-        return jsonify({"error": "OTP має містити 6 цифр"}), 400
+        return failure("OTP має містити 6 цифр")
 
     active_reservations = db.query(Reservation).filter(
         Reservation.status == ReservationStatus.ACTIVE,
@@ -473,13 +1069,21 @@ def iot_unlock_locker():
             matched_reservation = res
             break
 
-    if not matched_reservation:
-        return jsonify({"error": "Неправильний або прострочений OTP"}), 400
+    locker_id = cell_for_reservation(db, matched_reservation.reservation_id) if matched_reservation else None
+    # Код бронювання, не розміщеного в цій станції (в іншій або ще ніде), відхиляється так само,
+    # як неправильний, інакше відповідь підтверджувала б, що код дійсний
+    if not locker_id or station_of_locker(locker_id) != station_id:
+        return failure("Неправильний або прострочений OTP")
+    otp_throttle.record_success(throttle_key)
+    address_throttle.record_success(address)
 
-    locker_id = f"A{(matched_reservation.book_id % 5) + 1}"
+    append_event(db, "locker_unlocked", matched_reservation.reservation_id,
+                 locker_id=locker_id, user_id=matched_reservation.user_id, book_id=matched_reservation.book_id)
+    db.commit()
 
     return jsonify({
         "locker_id": locker_id,
+        "reservation_id": matched_reservation.reservation_id,
         "book_id": matched_reservation.book_id,
         "user_id": matched_reservation.user_id
     })
@@ -488,7 +1092,7 @@ def iot_unlock_locker():
 @app.route("/iot/lockers/confirm_pickup", methods=["POST"])
 def iot_confirm_pickup():
     db = g.db
-    data = request.get_json()
+    data = iot_payload()
     user_id = data.get("user_id")
     book_id = data.get("book_id")
 
@@ -506,6 +1110,8 @@ def iot_confirm_pickup():
         return jsonify({"error": "Немає активного бронювання для цієї книги"}), 400
 
     try:
+        # Подія потрапляє в ту саму транзакцію, що й створення позики
+        append_event(db, "locker_pickup_confirmed", res.reservation_id, user_id=user_id, book_id=book_id)
         loan = create_loan(db, user_id, book_id)
         res.status = ReservationStatus.COMPLETED
         db.commit()
@@ -522,7 +1128,7 @@ def iot_confirm_pickup():
 @app.route("/iot/loans/return_by_book", methods=["POST"])
 def iot_return_by_book():
     db = g.db
-    data = request.get_json()
+    data = iot_payload()
     book_id = data.get("book_id")
 
     if not book_id:
@@ -537,15 +1143,25 @@ def iot_return_by_book():
         return jsonify({"error": "Активна позика для цієї книги не знайдена"}), 404
 
     try:
+        append_event(db, "locker_return", loan.loan_id, user_id=loan.user_id, book_id=book_id)
         updated_loan = return_book(db, loan.loan_id)
         return jsonify({
             "message": "Книга повернута через поштомат",
             "return_date": updated_loan.return_date.isoformat()
         })
     except Exception as e:
+        db.rollback()
         return jsonify({"error": str(e)}), 400
 
 
 # ===== ЗАПУСК =====
+DEBUG = True
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Процеси для scrypt і фоновий потік прострочень створюються лише в процесі, що обслуговує
+    # запити (процеси scrypt — до появи потоків сервера): з debug=True батьківський процес
+    # перезавантажувача запитів не приймає
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        password_hasher.start()
+        start_expiry_sweeper()
+    app.run(host="0.0.0.0", port=5000, debug=DEBUG)
\ No newline at end of file
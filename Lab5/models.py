@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -36,6 +36,7 @@ class User(Base):
     phone = Column(String(20))
     role = Column(SQLEnum(UserRole), default=UserRole.READER, nullable=False)
     loans = relationship("Loan", back_populates="user", cascade="all, delete-orphan")
+    archived_loans = relationship("LoanArchive", back_populates="user", cascade="all, delete-orphan")
     reservations = relationship("Reservation", back_populates="user", cascade="all, delete-orphan")
 
 class Book(Base):
@@ -50,7 +51,27 @@ class Book(Base):
     location = Column(String(100))
     tags = Column(String(200))
     loans = relationship("Loan", back_populates="book", cascade="all, delete-orphan")
+    archived_loans = relationship("LoanArchive", back_populates="book", cascade="all, delete-orphan")
     reservations = relationship("Reservation", back_populates="book", cascade="all, delete-orphan")
+    search_keys = relationship("BookSearchKey", back_populates="book", cascade="all, delete-orphan")
+    trigrams = relationship("BookTrigram", back_populates="book", cascade="all, delete-orphan")
+
+# Попередньо обчислені ключі пошуку (транслітерація та фонетичний ключ) для кожного слова книги
+class BookSearchKey(Base):
+    __tablename__ = "book_search_keys"
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.book_id"), nullable=False, index=True)
+    kind = Column(String(10), nullable=False)
+    key = Column(String(100), nullable=False)
+    book = relationship("Book", back_populates="search_keys")
+    __table_args__ = (Index("ix_book_search_keys_kind_key", "kind", "key"),)
+
+# Таблиця входжень триграм назви та автора для нечіткого пошуку
+class BookTrigram(Base):
+    __tablename__ = "book_trigrams"
+    trigram = Column(String(3), primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.book_id"), primary_key=True, index=True)
+    book = relationship("Book", back_populates="trigrams")
 
 class Loan(Base):
     __tablename__ = "loans"
@@ -62,6 +83,20 @@ class Loan(Base):
     return_date = Column(DateTime)
     user = relationship("User", back_populates="loans")
     book = relationship("Book", back_populates="loans")
+    __table_args__ = (Index("ix_loans_open_due", "return_date", "due_date"),)
+
+# Архів повернених позик (той самий набір колонок, що й у loans)
+class LoanArchive(Base):
+    __tablename__ = "loans_archive"
+    loan_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
+    book_id = Column(Integer, ForeignKey("books.book_id"), nullable=False, index=True)
+    issue_date = Column(DateTime, nullable=False)
+    due_date = Column(DateTime, nullable=False)
+    return_date = Column(DateTime, nullable=False, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    user = relationship("User", back_populates="archived_loans")
+    book = relationship("Book", back_populates="archived_loans")
 
 class Reservation(Base):
     __tablename__ = "reservations"
@@ -72,4 +107,101 @@ class Reservation(Base):
     expiry_date = Column(DateTime, nullable=False)
     status = Column(SQLEnum(ReservationStatus), default=ReservationStatus.ACTIVE, nullable=False)
     user = relationship("User", back_populates="reservations")
-    book = relationship("Book", back_populates="reservations")
\ No newline at end of file
+    book = relationship("Book", back_populates="reservations")
+
+# Погодинні, щоденні та щомісячні агрегати видач і повернень
+class CirculationRollup(Base):
+    __tablename__ = "circulation_rollups"
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String(5), nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    group_by = Column(String(10), nullable=False)
+    group_key = Column(String(100), nullable=False, default="")
+    loans = Column(Integer, nullable=False, default=0)
+    returns = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket", "group_by", "group_key"),
+        Index("ix_circulation_rollups_lookup", "granularity", "group_by", "bucket"),
+    )
+
+# Журнал штрафів: поточна нарахована сума (у копійках) по кожній простроченій позиці
+class FineLedger(Base):
+    __tablename__ = "fine_ledger"
+    loan_id = Column(Integer, ForeignKey("loans.loan_id"), primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
+    amount = Column(Integer, nullable=False, default=0)
+    days_overdue = Column(Integer, nullable=False, default=0)
+    assessed_at = Column(DateTime, nullable=False)
+
+# Черга вихідних повідомлень (нагадування читачам)
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(100), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)
+    recipient = Column(String(100), nullable=False)
+    subject = Column(String(200), nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String(10), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String(500))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime)
+    __table_args__ = (Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+# Журнал доменних подій (лише додавання); seq монотонно зростає і не перевикористовується
+class DomainEvent(Base):
+    __tablename__ = "events"
+    seq = Column(Integer, primary_key=True)
+    type = Column(String(40), nullable=False, index=True)
+    entity_id = Column(Integer)
+    payload = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# Станція поштомату
+class LockerStation(Base):
+    __tablename__ = "locker_stations"
+    station_id = Column(String(20), primary_key=True)
+    name = Column(String(100))
+    location = Column(String(100))
+    cells = relationship("LockerCell", back_populates="station", cascade="all, delete-orphan",
+                         order_by="LockerCell.position")
+
+# Комірка станції; reservation_id заповнений, поки в ній чекає заброньована книга
+class LockerCell(Base):
+    __tablename__ = "locker_cells"
+    cell_id = Column(String(30), primary_key=True)
+    station_id = Column(String(20), ForeignKey("locker_stations.station_id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    size = Column(String(1), default="M", nullable=False)
+    reservation_id = Column(Integer, ForeignKey("reservations.reservation_id"), unique=True)
+    allocated_at = Column(DateTime)
+    station = relationship("LockerStation", back_populates="cells")
+
+# Квитанція про оброблену подію поштомату (ключ ідемпотентності -> результат)
+class IotEventReceipt(Base):
+    __tablename__ = "iot_event_receipts"
+    idempotency_key = Column(String(64), primary_key=True)
+    station_id = Column(String(20), nullable=False)
+    type = Column(String(20), nullable=False)
+    status = Column(String(10), nullable=False)
+    result = Column(String)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# Телеметрія станцій, зведена до хвилини: кількість, сума, мінімум і максимум значень метрики
+class TelemetryMinute(Base):
+    __tablename__ = "telemetry_minutes"
+    id = Column(Integer, primary_key=True)
+    station_id = Column(String(20), nullable=False)
+    metric = Column(String(50), nullable=False)
+    minute = Column(DateTime, nullable=False, index=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0)
+    min = Column(Float)
+    max = Column(Float)
+    __table_args__ = (
+        UniqueConstraint("station_id", "metric", "minute"),
+    )
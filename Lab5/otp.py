@@ -0,0 +1,67 @@
+import hashlib
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from models import Reservation, LockerCell, ReservationStatus
+from station_keys import station_key
+from iot_client.station_auth import otp_digest
+
+OTP_WINDOW_SEC = 3600
+# Скільки годинних вікон (поточне + наступні) отримує станція, щоб працювати без мережі
+DIGEST_WINDOWS = 2
+
+
+# Секунди Unix для наївного UTC-часу (так зберігаються дати в БД)
+def epoch_seconds(moment: datetime) -> int:
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+
+def otp_window(moment: datetime | None = None) -> int:
+    return epoch_seconds(moment or datetime.utcnow()) // OTP_WINDOW_SEC
+
+
+def generate_reservation_otp(reservation: Reservation, window: int | None = None) -> str:
+    """
+    Генерує 6-значний OTP на основі reservation_id, user_id, book_id та години.
+    OTP дійсний протягом 1 години.
+    """
+    hour_key = otp_window() if window is None else window
+    seed = f"{reservation.reservation_id}{reservation.user_id}{reservation.book_id}{hour_key}"
+    hash_val = hashlib.sha256(seed.encode()).hexdigest()
+    return str(int(hash_val[:12], 16) % 1000000).zfill(6)
+
+
+# Таблиця дайджестів OTP для бронювань, розміщених у комірках станції. Дайджест — HMAC
+# з ключем станції (солі недостатньо: 6-значний код перебирається за секунди).
+# На кожне бронювання — запис на поточне і наступні годинні вікна; valid_until
+# обрізається терміном бронювання. Час у секундах Unix
+def station_otp_digests(db: Session, station_id: str, salt: str, windows: int = DIGEST_WINDOWS,
+                        now: datetime | None = None) -> list[dict]:
+    now = now or datetime.utcnow()
+    rows = (
+        db.query(Reservation, LockerCell.cell_id)
+        .join(LockerCell, LockerCell.reservation_id == Reservation.reservation_id)
+        .filter(
+            LockerCell.station_id == station_id,
+            Reservation.status == ReservationStatus.ACTIVE,
+            Reservation.expiry_date > now
+        )
+        .all()
+    )
+    first = otp_window(now)
+    key = station_key(station_id)
+    entries = []
+    for res, locker_id in rows:
+        expires = epoch_seconds(res.expiry_date)
+        for window in range(first, first + windows):
+            valid_from = window * OTP_WINDOW_SEC
+            if valid_from >= expires:
+                break
+            entries.append({
+                "digest": otp_digest(key, salt, generate_reservation_otp(res, window)),
+                "reservation_id": res.reservation_id,
+                "locker_id": locker_id,
+                "book_id": res.book_id,
+                "valid_from": valid_from,
+                "valid_until": min(valid_from + OTP_WINDOW_SEC, expires),
+            })
+    return entries
@@ -0,0 +1,127 @@
+import base64
+import functools
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Формат хешу з версією: "scrypt$<версія>$<n>$<r>$<p>$<сіль>$<хеш>" (base64 без "=").
+# Старі хеші — 64 шістнадцяткові символи SHA-256 без солі (версія 0); вони ще перевіряються,
+# а після успішного входу замінюються поточним форматом (ліниве перехешування)
+SCHEME = "scrypt"
+VERSION = 1
+SCRYPT_N = 2 ** 14   # ~16 МБ пам'яті на обчислення при r=8
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+# Процеси для перевірок і масового хешування; за замовчуванням — кількість ядер
+WORKERS = int(os.environ.get("PASSWORD_WORKERS", os.cpu_count() or 1))
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=KEY_BYTES)
+    return f"{SCHEME}${VERSION}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+# Перевіряє пароль; повертає (збігається, потрібне_перехешування)
+def verify_password(password: str, stored: str) -> tuple[bool, bool]:
+    if not stored:
+        return False, False
+    if not stored.startswith(SCHEME + "$"):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+    # Пошкоджений хеш (будь-яке поле) вважається неуспішною перевіркою
+    try:
+        _, version, n, r, p, salt, key = stored.split("$")
+        version, n, r, p = int(version), int(n), int(r), int(p)
+        expected = _unb64(key)
+        actual = hashlib.scrypt(password.encode(), salt=_unb64(salt), n=n, r=r, p=p, dklen=len(expected))
+    except ValueError:
+        return False, False
+    ok = hmac.compare_digest(actual, expected)
+    return ok, ok and (version != VERSION or (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P))
+
+
+# Хеш для відсутнього користувача: перевірка займає стільки ж часу, тож за часом
+# відповіді не можна дізнатися, чи існує email. Обчислюється під час першого виклику,
+# а не під час імпорту модуля
+@functools.cache
+def _dummy_hash() -> str:
+    return hash_password(secrets.token_hex(8))
+
+
+def verify_missing(password: str) -> tuple[bool, bool]:
+    verify_password(password, _dummy_hash())
+    return False, False
+
+
+# Пул процесів для scrypt: обчислення не займають потоки Flask і не конкурують з ними за GIL.
+# Пул створюється під час запуску сервера зі стандартним для платформи способом запуску
+# процесів (spawn у Windows); якщо він не стартує або зламався, обчислення виконується
+# в поточному потоці
+class PasswordHasher:
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._pool is None and self.workers > 0:
+                pool = None
+                try:
+                    pool = ProcessPoolExecutor(self.workers)
+                    # Процеси створюються під час першого завдання — робимо це одразу
+                    pool.submit(int).result()
+                except (OSError, ValueError, NotImplementedError, BrokenProcessPool):
+                    if pool is not None:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    return
+                self._pool = pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        pool = self._pool
+        if pool is None:
+            return fn(*args)
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self.shutdown()
+            return fn(*args)
+
+    def hash(self, password: str) -> str:
+        return self._run(hash_password, password)
+
+    def verify(self, password: str, stored: str | None) -> tuple[bool, bool]:
+        if stored is None:
+            return self._run(verify_missing, password)
+        return self._run(verify_password, password, stored)
+
+    # Масове хешування (імпорт користувачів) розподіляється між усіма процесами пулу
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        pool = self._pool
+        if pool is None:
+            return [hash_password(p) for p in passwords]
+        return list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))))
+
+
+password_hasher = PasswordHasher()
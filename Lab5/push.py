@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from database import SessionLocal
+from events import subscribe, events_since
+from lockers import station_of_locker
+
+RESERVATION_EVENTS = (
+    "reservation_created",
+    "reservation_staged",
+    "reservation_cancelled",
+    "reservation_completed",
+    "reservation_expired",
+)
+HEARTBEAT_SEC = 15
+# БД читається лише після сповіщення про нову подію. Подію, зафіксовану іншим процесом,
+# підписка не побачить — для цього з'єднання зрідка звіряється з БД
+RESYNC_SEC = 60
+EXPIRY_SWEEP_SEC = 60
+
+_condition = threading.Condition()
+_latest_seq = 0
+
+
+def _on_reservation_event(record: dict):
+    global _latest_seq
+    with _condition:
+        _latest_seq = max(_latest_seq, record["seq"])
+        _condition.notify_all()
+
+
+subscribe(_on_reservation_event, RESERVATION_EVENTS)
+
+
+# Події бронювань, що стосуються станції, після since.
+# Повертає (події, seq останньої переглянутої події) — курсор зсувається і на чужих подіях
+def station_events(station_id: str, since: int, limit: int = 100):
+    db = SessionLocal()
+    try:
+        records = events_since(db, since, limit, RESERVATION_EVENTS)
+        relevant = []
+        for record in records:
+            payload = json.loads(record.payload) if record.payload else {}
+            # Станції цікаві лише бронювання, закріплені за її комірками
+            if payload.get("locker_id") and station_of_locker(payload["locker_id"]) == station_id:
+                relevant.append({
+                    "seq": record.seq,
+                    "type": record.type,
+                    "reservation_id": record.entity_id,
+                    **payload,
+                    "created_at": record.created_at.isoformat(),
+                })
+        return relevant, (records[-1].seq if records else since)
+    finally:
+        db.close()
+
+
+# Чекає на події станції до timeout секунд. synced_at — коли з'єднання востаннє читало БД
+# (None — прочитати одразу); повертає (події, курсор, synced_at)
+def _wait(station_id: str, since: int, timeout: float, synced_at: float | None):
+    deadline = time.monotonic() + timeout
+    while True:
+        now = time.monotonic()
+        if synced_at is None or _latest_seq > since or now - synced_at >= RESYNC_SEC:
+            events, since = station_events(station_id, since)
+            synced_at = now
+            if events:
+                return events, since, synced_at
+        remaining = deadline - now
+        if remaining <= 0:
+            return [], since, synced_at
+        with _condition:
+            if _latest_seq <= since:
+                _condition.wait(min(remaining, synced_at + RESYNC_SEC - now))
+
+
+# Long-poll: чекає на події станції до timeout секунд
+def wait_for_station_events(station_id: str, since: int, timeout: float = HEARTBEAT_SEC):
+    events, cursor, _ = _wait(station_id, since, timeout, None)
+    return events, cursor
+
+
+# Потік Server-Sent Events для станції з відновленням з останнього seq
+def sse_stream(station_id: str, since: int):
+    yield "retry: 3000\n\n"
+    synced_at = None
+    while True:
+        # Після пакета подій БД читається знову одразу: там може лишатися продовження
+        events, cursor, synced_at = _wait(station_id, since, HEARTBEAT_SEC, synced_at)
+        if events:
+            synced_at = None
+            for e in events:
+                data = json.dumps(e, ensure_ascii=False, separators=(",", ":"))
+                yield f"id: {e['seq']}\nevent: {e['type']}\ndata: {data}\n\n"
+        if cursor != since and (not events or events[-1]["seq"] != cursor):
+            # Зсуває Last-Event-ID клієнта без доставки чужих подій
+            yield f"id: {cursor}\n\n"
+        elif not events:
+            yield ": keepalive\n\n"
+        since = cursor
+
+
+# Фоновий потік, що позначає прострочені бронювання (генерує reservation_expired)
+def start_expiry_sweeper(interval: int = EXPIRY_SWEEP_SEC):
+    from crud.reader import expire_reservations
+
+    def run():
+        while True:
+            db = SessionLocal()
+            try:
+                expire_reservations(db)
+            except Exception:
+                db.rollback()
+            finally:
+                db.close()
+            time.sleep(interval)
+
+    threading.Thread(target=run, daemon=True, name="reservation-expiry").start()
@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from datetime import datetime
+from models import Book, BookStatus, User, UserRole
+
+# Легкі моделі читання для списків: запит вибирає лише потрібні колонки, а рядки
+# розкладаються в незмінні dataclass зі __slots__ — без identity map, стану ORM
+# і невикористаних полів. Для змін потрібно завантажувати ORM-об'єкти
+
+
+@dataclass(frozen=True, slots=True)
+class BookRow:
+    book_id: int
+    title: str
+    author: str
+    status: BookStatus
+
+
+@dataclass(frozen=True, slots=True)
+class UserRow:
+    user_id: int
+    name: str
+    email: str
+    role: UserRole
+
+
+@dataclass(frozen=True, slots=True)
+class LoanRow:
+    loan_id: int
+    book_id: int
+    book_title: str | None
+    issue_date: datetime
+    due_date: datetime
+    return_date: datetime | None
+
+
+@dataclass(frozen=True, slots=True)
+class OverdueRow:
+    user_name: str
+    email: str
+    book_title: str
+    due_date: datetime
+
+
+BOOK_COLUMNS = (Book.book_id, Book.title, Book.author, Book.status)
+USER_COLUMNS = (User.user_id, User.name, User.email, User.role)
+
+
+# Колонки LoanRow для loans або loans_archive; назва книги — через outer join з books
+def loan_query(db, model):
+    return db.query(
+        model.loan_id, model.book_id, Book.title, model.issue_date, model.due_date, model.return_date
+    ).outerjoin(Book, Book.book_id == model.book_id)
+
+
+# Розкладає результат запиту по колонках у рядки read-моделі (порядок колонок = порядок полів)
+def project(query, row_type) -> list:
+    return [row_type(*values) for values in query]
@@ -0,0 +1,189 @@
+import json
+import os
+import smtplib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import Book, Loan, User, OutboxMessage
+
+REMIND_DAYS_AHEAD = 3
+DRAIN_BATCH_SIZE = 100
+DRAIN_WORKERS = 4
+MAX_ATTEMPTS = 5
+RETRY_BASE_SEC = 30
+CLAIM_LEASE_SEC = 300
+
+
+# Відбирає всі позики з терміном у найближчі N днів (та прострочені) одним запитом
+# по індексу (return_date, due_date), групує по користувачах і пише листи в outbox.
+# Ключ ідемпотентності (тип, користувач, дата) не дає створити дублікати за день
+def schedule_reminders(db: Session, days_ahead: int = REMIND_DAYS_AHEAD, now: datetime | None = None) -> int:
+    now = now or datetime.utcnow()
+    rows = (
+        db.query(Loan.user_id, Loan.due_date, User.name, User.email, Book.title)
+        .join(User, User.user_id == Loan.user_id)
+        .join(Book, Book.book_id == Loan.book_id)
+        .filter(Loan.return_date.is_(None), Loan.due_date < now + timedelta(days=days_ahead))
+        .order_by(Loan.user_id, Loan.due_date)
+        .all()
+    )
+
+    grouped = defaultdict(list)
+    for row in rows:
+        kind = "overdue" if row.due_date < now else "due_soon"
+        grouped[(row.user_id, kind)].append(row)
+
+    messages = []
+    for (user_id, kind), loans in grouped.items():
+        lines = [f"- {loan.title}: до {loan.due_date:%Y-%m-%d}" for loan in loans]
+        if kind == "overdue":
+            subject = "Прострочені книги"
+            intro = "Термін повернення цих книг минув:"
+        else:
+            subject = "Нагадування про повернення книг"
+            intro = f"Термін повернення цих книг спливає протягом {days_ahead} днів:"
+        messages.append({
+            "idempotency_key": f"{kind}:{user_id}:{now:%Y-%m-%d}",
+            "user_id": user_id,
+            "kind": kind,
+            "recipient": loans[0].email,
+            "subject": subject,
+            "body": f"Вітаємо, {loans[0].name}!\n\n{intro}\n" + "\n".join(lines),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+
+    created = 0
+    if messages:
+        stmt = insert(OutboxMessage).on_conflict_do_nothing(index_elements=["idempotency_key"])
+        created = db.connection().execute(stmt, messages).rowcount
+    db.commit()
+    return created
+
+
+# Відправник у файли (для тестів і локального запуску): один файл на ключ ідемпотентності
+class FileSender:
+    def __init__(self, directory: str = "outbox_mail"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, message: dict):
+        path = os.path.join(self.directory, message["idempotency_key"].replace(":", "_") + ".json")
+        if os.path.exists(path):
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(message, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+
+
+# Відправник через SMTP; Message-ID з ключа ідемпотентності дозволяє серверу відкинути повтор
+class SmtpSender:
+    def __init__(self, host: str, port: int = 25, sender: str = "library@localhost", timeout: int = 10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+
+    def send(self, message: dict):
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message["recipient"]
+        email["Subject"] = message["subject"]
+        email["Message-ID"] = f"<{message['idempotency_key'].replace(':', '.')}@library>"
+        email.set_content(message["body"])
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(email)
+
+
+# Відправник за змінними середовища: REMINDER_SENDER=smtp та SMTP_HOST/SMTP_PORT
+def default_sender():
+    if os.environ.get("REMINDER_SENDER") == "smtp":
+        return SmtpSender(os.environ.get("SMTP_HOST", "localhost"), int(os.environ.get("SMTP_PORT", 25)))
+    return FileSender(os.environ.get("REMINDER_DIR", "outbox_mail"))
+
+
+# Захоплює пакет готових до відправки повідомлень (з орендою на випадок збою воркера)
+def _claim_batch(db: Session, batch_size: int, now: datetime) -> list[dict]:
+    ids = [row.id for row in (
+        db.query(OutboxMessage.id)
+        .filter(OutboxMessage.status.in_(["pending", "sending"]), OutboxMessage.next_attempt_at <= now)
+        .order_by(OutboxMessage.next_attempt_at)
+        .limit(batch_size)
+    )]
+    if not ids:
+        return []
+    db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids))
+        .values(status="sending", next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SEC))
+    )
+    db.commit()
+    return [
+        {
+            "id": m.id, "idempotency_key": m.idempotency_key, "recipient": m.recipient,
+            "subject": m.subject, "body": m.body, "attempts": m.attempts,
+        }
+        for m in db.query(OutboxMessage).filter(OutboxMessage.id.in_(ids))
+    ]
+
+
+def _send(sender, message: dict):
+    try:
+        sender.send(message)
+        return message, None
+    except Exception as e:
+        return message, str(e)
+
+
+# Вичерпує outbox: обмежений пул потоків відправляє повідомлення, невдалі
+# повторюються з експоненційною затримкою до MAX_ATTEMPTS спроб
+def drain_outbox(db: Session, sender=None, workers: int = DRAIN_WORKERS,
+                 batch_size: int = DRAIN_BATCH_SIZE) -> dict:
+    sender = sender or default_sender()
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            now = datetime.utcnow()
+            batch = _claim_batch(db, batch_size, now)
+            if not batch:
+                break
+            for message, error in pool.map(lambda m: _send(sender, m), batch):
+                values = {"attempts": message["attempts"] + 1}
+                if error is None:
+                    values.update(status="sent", sent_at=datetime.utcnow(), last_error=None)
+                    stats["sent"] += 1
+                elif values["attempts"] >= MAX_ATTEMPTS:
+                    values.update(status="failed", last_error=error[:500])
+                    stats["failed"] += 1
+                else:
+                    delay = RETRY_BASE_SEC * 2 ** message["attempts"]
+                    values.update(status="pending", last_error=error[:500],
+                                  next_attempt_at=datetime.utcnow() + timedelta(seconds=delay))
+                    stats["retried"] += 1
+                db.execute(update(OutboxMessage).where(OutboxMessage.id == message["id"]).values(**values))
+            db.commit()
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal, engine
+    from models import Base
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        command = sys.argv[1] if len(sys.argv) > 1 else "run"
+        if command in ("schedule", "run"):
+            print(f"Заплановано повідомлень: {schedule_reminders(session)}")
+        if command in ("drain", "run"):
+            print(f"Відправка: {drain_outbox(session)}")
+    finally:
+        session.close()
@@ -0,0 +1,87 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import Book, CirculationRollup
+from archive import all_loans
+
+GRANULARITIES = ("hour", "day", "month")
+GROUP_BY = ("all", "category", "author")
+
+
+# Початок часового інтервалу, до якого належить подія
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity in ("day", "month"):
+        moment = moment.replace(hour=0)
+    if granularity == "month":
+        moment = moment.replace(day=1)
+    return moment
+
+
+def _group_keys(category: str | None, author: str | None) -> dict[str, str]:
+    return {"all": "", "category": category or "", "author": author or ""}
+
+
+# Інкрементально оновлює агрегати для події видачі ("loans") або повернення ("returns").
+# Викликається в тій самій транзакції, що й зміна позики
+def record_circulation(db: Session, event: str, moment: datetime, book: Book):
+    for granularity in GRANULARITIES:
+        bucket = bucket_start(moment, granularity)
+        for group_by, group_key in _group_keys(book.category, book.author).items():
+            stmt = insert(CirculationRollup).values(
+                granularity=granularity,
+                bucket=bucket,
+                group_by=group_by,
+                group_key=group_key,
+                loans=1 if event == "loans" else 0,
+                returns=1 if event == "returns" else 0,
+            )
+            column = getattr(CirculationRollup, event)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["granularity", "bucket", "group_by", "group_key"],
+                set_={event: column + 1},
+            ))
+
+
+# Повний перерахунок агрегатів з таблиць loans та loans_archive
+def backfill_rollups(db: Session, batch_size: int = 10000) -> int:
+    counters = defaultdict(lambda: [0, 0])
+    loans = all_loans(db)
+    rows = (
+        db.query(loans.c.issue_date, loans.c.return_date, Book.category, Book.author)
+        .join(Book, Book.book_id == loans.c.book_id)
+        .yield_per(batch_size)
+    )
+    processed = 0
+    for row in rows:
+        groups = _group_keys(row.category, row.author)
+        for index, moment in enumerate((row.issue_date, row.return_date)):
+            if moment is None:
+                continue
+            for granularity in GRANULARITIES:
+                bucket = bucket_start(moment, granularity)
+                for group_by, group_key in groups.items():
+                    counters[(granularity, bucket, group_by, group_key)][index] += 1
+        processed += 1
+
+    db.query(CirculationRollup).delete()
+    if counters:
+        db.execute(CirculationRollup.__table__.insert(), [
+            {"granularity": g, "bucket": b, "group_by": gb, "group_key": gk, "loans": c[0], "returns": c[1]}
+            for (g, b, gb, gk), c in counters.items()
+        ])
+    db.commit()
+    return processed
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    from models import Base
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        print(f"Оброблено позик: {backfill_rollups(session)}")
+    finally:
+        session.close()
@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# Сесія живе SESSION_TTL_SEC з моменту останнього запиту; у пам'яті — не більше MAX_SESSIONS
+# (найдавніше використані витісняються першими)
+SESSION_TTL_SEC = 8 * 3600
+MAX_SESSIONS = 10000
+# Ключ підпису токенів; без SESSION_SECRET генерується під час запуску
+# (сесії однаково зберігаються лише в пам'яті процесу)
+SECRET = os.environ.get("SESSION_SECRET", "").encode() or secrets.token_bytes(32)
+
+
+class UserSession:
+    def __init__(self, user_id: int, role: str, expires_at: float):
+        self.user_id = user_id
+        self.role = role
+        self.expires_at = expires_at
+
+
+def _sign(session_id: str) -> str:
+    digest = hmac.new(SECRET, session_id.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:24]).decode()
+
+
+# Сховище сесій у пам'яті: токен "<id>.<підпис HMAC>" перевіряється без звернення до БД.
+# Підробленим токенам відмовляється ще до пошуку в сховищі
+class SessionStore:
+    def __init__(self, ttl_sec: int = SESSION_TTL_SEC, max_sessions: int = MAX_SESSIONS):
+        self.ttl_sec = ttl_sec
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # id -> UserSession
+        self.counters = {"issued": 0, "resolved": 0, "rejected": 0, "expired": 0, "evicted": 0, "revoked": 0}
+
+    def create(self, user_id: int, role: str, now: float | None = None) -> str:
+        now = time.time() if now is None else now
+        session_id = secrets.token_urlsafe(24)
+        session = UserSession(user_id, role, now + self.ttl_sec)
+        with self._lock:
+            self._sessions[session_id] = session
+            self.counters["issued"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.counters["evicted"] += 1
+        return f"{session_id}.{_sign(session_id)}"
+
+    # Сесія за токеном або None; кожне звернення продовжує сесію на ttl
+    def resolve(self, token: str | None, now: float | None = None) -> UserSession | None:
+        session_id = self._verified_id(token)
+        if session_id is None:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self.counters["rejected"] += 1
+                return None
+            if session.expires_at <= now:
+                del self._sessions[session_id]
+                self.counters["expired"] += 1
+                return None
+            session.expires_at = now + self.ttl_sec
+            self._sessions.move_to_end(session_id)
+            self.counters["resolved"] += 1
+            return session
+
+    def _verified_id(self, token: str | None) -> str | None:
+        session_id, _, signature = (token or "").partition(".")
+        if not session_id or not hmac.compare_digest(signature.encode(), _sign(session_id).encode()):
+            if token:
+                with self._lock:
+                    self.counters["rejected"] += 1
+            return None
+        return session_id
+
+    def revoke(self, token: str | None) -> bool:
+        session_id = self._verified_id(token)
+        with self._lock:
+            if session_id is not None and self._sessions.pop(session_id, None) is not None:
+                self.counters["revoked"] += 1
+                return True
+        return False
+
+    # Завершує всі сесії користувача (зміна ролі чи пароля, видалення)
+    def revoke_user(self, user_id: int) -> int:
+        with self._lock:
+            doomed = [sid for sid, s in self._sessions.items() if s.user_id == user_id]
+            for sid in doomed:
+                del self._sessions[sid]
+            self.counters["revoked"] += len(doomed)
+            return len(doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "active": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+session_store = SessionStore()
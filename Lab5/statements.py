@@ -0,0 +1,66 @@
+import threading
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.orm import Session
+from database import engine, compiled_cache, COMPILED_CACHE_SIZE
+from models import User, Book, Loan, Reservation, ReservationStatus
+
+# Готові select() для гарячих шляхів crud. Конструкції створюються один раз під час
+# імпорту; значення передаються через bindparam, тож ключ кешу скомпільованих запитів
+# однаковий для кожного виклику і SQL не компілюється повторно
+
+USER_BY_ID = select(User).where(User.user_id == bindparam("user_id"))
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+BOOK_BY_ID = select(Book).where(Book.book_id == bindparam("book_id"))
+LOAN_BY_ID = select(Loan).where(Loan.loan_id == bindparam("loan_id"))
+
+# Бронювання книги, що ще не минуло (будь-якого статусу) — перевірка у create_reservation
+RESERVATION_FOR_BOOK = select(Reservation).where(
+    Reservation.book_id == bindparam("book_id"),
+    Reservation.expiry_date > bindparam("now")
+).limit(1)
+
+# Активне бронювання книги; найстаріше — першим (черга на книгу)
+ACTIVE_RESERVATION_FOR_BOOK = select(Reservation).where(
+    Reservation.book_id == bindparam("book_id"),
+    Reservation.expiry_date > bindparam("now"),
+    Reservation.status == ReservationStatus.ACTIVE
+).order_by(Reservation.reservation_date.asc()).limit(1)
+
+
+# Перший об'єкт результату готового запиту або None
+def fetch_first(db: Session, statement, **params):
+    return db.scalars(statement, params).first()
+
+
+# Статистика кешу скомпільованих запитів рушія (за кожним виконаним SQL)
+class CompiledCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {stat.name.lower(): 0 for stat in CacheStats}
+
+    def record(self, cache_hit):
+        if cache_hit is None:
+            return
+        with self._lock:
+            self.counters[CacheStats(cache_hit).name.lower()] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["cache_hit"] + counters["cache_miss"]
+        return {
+            **counters,
+            "hit_ratio": round(counters["cache_hit"] / lookups, 4) if lookups else 0.0,
+            "cached_statements": len(compiled_cache),
+            "capacity": COMPILED_CACHE_SIZE,
+        }
+
+
+compiled_cache_stats = CompiledCacheStats()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _count_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        compiled_cache_stats.record(getattr(context, "cache_hit", None))
@@ -0,0 +1,32 @@
+import hashlib
+import hmac
+import os
+import secrets
+
+# Перець для ключів станцій: змінна STATION_PEPPER або файл поруч з БД, створений під час
+# першого запуску. Перець не залишає сервер; станції отримують лише власні похідні ключі,
+# тож після перезапуску ключі станцій не змінюються
+PEPPER_PATH = "station_pepper.key"
+
+
+def _load_pepper() -> bytes:
+    if os.environ.get("STATION_PEPPER"):
+        return os.environ["STATION_PEPPER"].encode()
+    try:
+        with open(PEPPER_PATH, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    pepper = secrets.token_hex(32).encode()
+    fd = os.open(PEPPER_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pepper)
+    return pepper
+
+
+PEPPER = _load_pepper()
+
+
+# Ключ станції: підписує її запити та дайджести OTP у таблиці для офлайн-перевірки
+def station_key(station_id: str) -> str:
+    return hmac.new(PEPPER, f"station:{station_id}".encode(), hashlib.sha256).hexdigest()
@@ -0,0 +1,208 @@
+import threading
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Book
+from archive import all_loans
+from translit import tokenize, transliterate
+
+
+# Ключі для автодоповнення: текст з кожного слова (щоб "шевч" знаходив "Тарас Шевченко")
+# у нижньому регістрі та в транслітерації
+def _suggest_keys(text: str) -> set[str]:
+    words = tokenize(text)
+    keys = set()
+    for i in range(len(words)):
+        tail = " ".join(words[i:])
+        keys.add(tail)
+        keys.add(" ".join(transliterate(w) for w in words[i:]))
+    return keys
+
+
+# Нормалізує префікс запиту так само, як ключі
+def _prefix_variants(prefix: str) -> set[str]:
+    words = tokenize(prefix)
+    if not words:
+        return set()
+    # Пробіл у кінці означає, що останнє слово вже завершене
+    tail = " " if prefix[-1:].isspace() else ""
+    return {
+        " ".join(words) + tail,
+        " ".join(transliterate(w) for w in words) + tail,
+    }
+
+
+# Усі непорожні префікси ключа
+def _prefixes(key: str):
+    return (key[:n] for n in range(1, len(key) + 1))
+
+
+# In-memory індекс назв та авторів на відсортованому масиві ключів.
+# Вага підказки — кількість видач усіх книг з цією назвою/автором.
+# Для кожного префікса зберігається готовий топ-TOP_N за популярністю: короткі префікси
+# (до SHORT_PREFIX символів, під якими найбільше ключів) — для всіх, довші — після першого
+# запиту. Нова видача лише піднімає підказку в топах її префіксів, тож нічого не скидається
+class SuggestIndex:
+    TOP_N = 50
+    SHORT_PREFIX = 3
+    CACHE_SIZE = 4096
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []       # відсортований список (key, kind, text)
+        self._refs = {}       # (kind, text) -> кількість книг, що посилаються на підказку
+        self._weights = {}    # (kind, text) -> сумарна кількість видач
+        self._books = {}      # book_id -> (title, author, loan_count)
+        self._short = {}      # префікс до SHORT_PREFIX символів -> топ [(kind, text), ...]
+        self._cache = {}      # довший префікс -> топ, обчислений під час запиту
+
+    def _rank(self, item):
+        return -self._weights[item], item[1], item[0]
+
+    # Топ-TOP_N префікса переглядом діапазону відсортованих ключів
+    def _scan(self, prefix: str) -> list:
+        found = set()
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            found.add(self._keys[i][1:])
+            i += 1
+        return nsmallest(self.TOP_N, found, key=self._rank)
+
+    # Повна побудова індексу з таблиці books
+    def build(self, db: Session):
+        loans = all_loans(db)
+        loan_counts = dict(
+            db.query(loans.c.book_id, func.count(loans.c.loan_id)).group_by(loans.c.book_id).all()
+        )
+        books = db.query(Book.book_id, Book.title, Book.author).all()
+        with self._lock:
+            self._keys, self._refs, self._weights, self._books = [], {}, {}, {}
+            keys = set()
+            for b in books:
+                loans = loan_counts.get(b.book_id, 0)
+                self._books[b.book_id] = (b.title, b.author, loans)
+                for kind, text in (("title", b.title), ("author", b.author)):
+                    item = (kind, text)
+                    self._refs[item] = self._refs.get(item, 0) + 1
+                    self._weights[item] = self._weights.get(item, 0) + loans
+                    keys.update((key, kind, text) for key in _suggest_keys(text))
+            self._keys = sorted(keys)
+
+            matches = {}
+            for key, kind, text in self._keys:
+                for prefix in _prefixes(key[:self.SHORT_PREFIX]):
+                    matches.setdefault(prefix, set()).add((kind, text))
+            self._short = {
+                prefix: nsmallest(self.TOP_N, items, key=self._rank) for prefix, items in matches.items()
+            }
+            self._cache.clear()
+
+    def _add(self, book_id: int, title: str, author: str, loans: int):
+        self._books[book_id] = (title, author, loans)
+        for kind, text in (("title", title), ("author", author)):
+            item = (kind, text)
+            if item not in self._refs:
+                for key in _suggest_keys(text):
+                    insort(self._keys, (key, kind, text))
+            self._refs[item] = self._refs.get(item, 0) + 1
+            self._weights[item] = self._weights.get(item, 0) + loans
+
+    def _remove(self, book_id: int):
+        title, author, loans = self._books.pop(book_id)
+        for kind, text in (("title", title), ("author", author)):
+            item = (kind, text)
+            self._refs[item] -= 1
+            self._weights[item] -= loans
+            if self._refs[item] == 0:
+                del self._refs[item]
+                del self._weights[item]
+                for key in _suggest_keys(text):
+                    i = bisect_left(self._keys, (key, kind, text))
+                    if i < len(self._keys) and self._keys[i] == (key, kind, text):
+                        del self._keys[i]
+
+    # Перераховує топи префіксів ключів назви й автора (після зміни чи видалення книги)
+    def _refresh(self, title: str, author: str):
+        for text in (title, author):
+            for key in _suggest_keys(text):
+                for prefix in _prefixes(key):
+                    if len(prefix) <= self.SHORT_PREFIX:
+                        top = self._scan(prefix)
+                        if top:
+                            self._short[prefix] = top
+                        else:
+                            self._short.pop(prefix, None)
+                    else:
+                        self._cache.pop(prefix, None)
+
+    # Додавання або оновлення книги (виклик після commit у create_book/update_book)
+    def upsert_book(self, book_id: int, title: str, author: str):
+        with self._lock:
+            loans = 0
+            old = self._books.get(book_id)
+            if old is not None:
+                loans = old[2]
+                self._remove(book_id)
+            self._add(book_id, title, author, loans)
+            if old is not None:
+                self._refresh(old[0], old[1])
+            self._refresh(title, author)
+
+    def remove_book(self, book_id: int):
+        with self._lock:
+            if book_id in self._books:
+                title, author, _ = self._books[book_id]
+                self._remove(book_id)
+                self._refresh(title, author)
+
+    # Підказка стала популярнішою: піднімається в наявних топах своїх префіксів
+    def _promote(self, item):
+        for key in _suggest_keys(item[1]):
+            for prefix in _prefixes(key):
+                top = (self._short if len(prefix) <= self.SHORT_PREFIX else self._cache).get(prefix)
+                if top is None:
+                    continue
+                if item in top:
+                    top.remove(item)
+                elif len(top) >= self.TOP_N and self._rank(item) >= self._rank(top[-1]):
+                    continue
+                insort(top, item, key=self._rank)
+                del top[self.TOP_N:]
+
+    # Збільшує популярність книги після нової видачі
+    def record_loan(self, book_id: int):
+        with self._lock:
+            if book_id not in self._books:
+                return
+            title, author, loans = self._books[book_id]
+            self._books[book_id] = (title, author, loans + 1)
+            for item in (("title", title), ("author", author)):
+                self._weights[item] += 1
+                self._promote(item)
+
+    # Топ-N підказок для префікса
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict]:
+        variants = _prefix_variants(prefix)
+        if not variants:
+            return []
+        with self._lock:
+            found = set()
+            for variant in variants:
+                if len(variant) <= self.SHORT_PREFIX:
+                    top = self._short.get(variant, [])
+                else:
+                    top = self._cache.get(variant)
+                    if top is None:
+                        if len(self._cache) >= self.CACHE_SIZE:
+                            self._cache.pop(next(iter(self._cache)))
+                        top = self._cache[variant] = self._scan(variant)
+                found.update(top[:limit])
+
+            return [
+                {"kind": kind, "text": text, "loan_count": self._weights[(kind, text)]}
+                for kind, text in nsmallest(limit, found, key=self._rank)
+            ]
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,150 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import LockerStation, TelemetryMinute
+from lockers import cell_allocator
+
+RETENTION_DAYS = 30
+# Станція вважається офлайн, якщо від неї немає телеметрії довше за цей час
+OFFLINE_AFTER_MIN = 10
+MAX_CLOCK_SKEW_SEC = 300
+MAX_METRIC_LENGTH = 50
+PRUNE_INTERVAL_SEC = 3600
+
+_last_prune = 0.0
+
+
+def _minute(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts - ts % 60, timezone.utc).replace(tzinfo=None)
+
+
+# Приймає пакет семплів [[ts, metric, value], ...] від станції: зводить їх до хвилин
+# у пам'яті й записує одним upsert на кожну пару (метрика, хвилина).
+# Семпли старші за термін зберігання або з майбутнього (збитий годинник) відкидаються
+def ingest_telemetry(db: Session, station_id: str, samples: list, now: float | None = None) -> dict:
+    now = time.time() if now is None else now
+    oldest = now - RETENTION_DAYS * 86400
+    buckets = defaultdict(lambda: [0, 0.0, None, None])
+    rejected = 0
+    for sample in samples:
+        try:
+            ts, metric, value = float(sample[0]), str(sample[1]), float(sample[2])
+        except (TypeError, ValueError, IndexError):
+            rejected += 1
+            continue
+        if not oldest <= ts <= now + MAX_CLOCK_SKEW_SEC or not metric or len(metric) > MAX_METRIC_LENGTH:
+            rejected += 1
+            continue
+        bucket = buckets[(metric, _minute(ts))]
+        bucket[0] += 1
+        bucket[1] += value
+        bucket[2] = value if bucket[2] is None else min(bucket[2], value)
+        bucket[3] = value if bucket[3] is None else max(bucket[3], value)
+
+    if buckets:
+        stmt = insert(TelemetryMinute)
+        table = TelemetryMinute.__table__
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["station_id", "metric", "minute"],
+                set_={
+                    "count": table.c.count + stmt.excluded.count,
+                    "sum": table.c.sum + stmt.excluded.sum,
+                    "min": func.min(table.c.min, stmt.excluded.min),
+                    "max": func.max(table.c.max, stmt.excluded.max),
+                },
+            ),
+            [
+                {"station_id": station_id, "metric": metric, "minute": minute,
+                 "count": count, "sum": total, "min": low, "max": high}
+                for (metric, minute), (count, total, low, high) in buckets.items()
+            ],
+        )
+    db.commit()
+    _maybe_prune(db, now)
+    return {"accepted": len(samples) - rejected, "rejected": rejected, "minutes": len(buckets)}
+
+
+# Видаляє хвилинні агрегати, старші за термін зберігання
+def prune_telemetry(db: Session, days: int = RETENTION_DAYS) -> int:
+    deleted = (
+        db.query(TelemetryMinute)
+        .filter(TelemetryMinute.minute < datetime.utcnow() - timedelta(days=days))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def _maybe_prune(db: Session, now: float):
+    global _last_prune
+    if now - _last_prune >= PRUNE_INTERVAL_SEC:
+        _last_prune = now
+        prune_telemetry(db)
+
+
+# Стан парку поштоматів за останні hours годин: останній зв'язок, помилки,
+# середні/максимальні значення метрик і вільні комірки
+def fleet_health(db: Session, hours: int = 24) -> list[dict]:
+    now = datetime.utcnow()
+    rows = (
+        db.query(
+            TelemetryMinute.station_id,
+            TelemetryMinute.metric,
+            func.sum(TelemetryMinute.count).label("count"),
+            func.sum(TelemetryMinute.sum).label("sum"),
+            func.min(TelemetryMinute.min).label("min"),
+            func.max(TelemetryMinute.max).label("max"),
+            func.max(TelemetryMinute.minute).label("last_minute"),
+        )
+        .filter(TelemetryMinute.minute >= now - timedelta(hours=hours))
+        .group_by(TelemetryMinute.station_id, TelemetryMinute.metric)
+        .all()
+    )
+
+    stations = {
+        s.station_id: {"station_id": s.station_id, "last_seen": None, "errors": 0, "metrics": {}}
+        for s in db.query(LockerStation.station_id)
+    }
+    for row in rows:
+        station = stations.setdefault(
+            row.station_id, {"station_id": row.station_id, "last_seen": None, "errors": 0, "metrics": {}}
+        )
+        last_minute = datetime.fromisoformat(row.last_minute) if isinstance(row.last_minute, str) else row.last_minute
+        if station["last_seen"] is None or last_minute > station["last_seen"]:
+            station["last_seen"] = last_minute
+        if row.metric.startswith("error"):
+            station["errors"] += row.count
+        station["metrics"][row.metric] = {
+            "count": row.count,
+            "avg": round(row.sum / row.count, 3) if row.count else None,
+            "min": row.min,
+            "max": row.max,
+        }
+
+    offline_before = now - timedelta(minutes=OFFLINE_AFTER_MIN)
+    report = []
+    for station in sorted(stations.values(), key=lambda s: s["station_id"]):
+        if station["last_seen"] is None:
+            station["status"] = "no_data"
+        else:
+            station["status"] = "online" if station["last_seen"] >= offline_before else "offline"
+            station["last_seen"] = station["last_seen"].isoformat()
+        station["free_cells"] = cell_allocator.free_count(station["station_id"])
+        report.append(station)
+    return report
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    from models import Base
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        print(f"Видалено хвилинних агрегатів телеметрії: {prune_telemetry(session)}")
+    finally:
+        session.close()
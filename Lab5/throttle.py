@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Маркерне відро на пару (станція, адреса клієнта): BURST спроб підряд,
+# далі поповнення RATE_PER_SEC спроб за секунду
+RATE_PER_SEC = 5 / 60
+BURST = 5
+# Відро на адресу клієнта незалежно від станції: списується лише невдалими кодами,
+# тож перебір через різні станції обмежено, а успішні видачі (багато станцій за NAT) — ні
+ADDRESS_BURST = 20
+ADDRESS_RATE_PER_SEC = 20 / 60
+ADDRESS_LOCKOUT_AFTER = 20
+# Після LOCKOUT_AFTER невдалих кодів поспіль ключ блокується; кожна наступна невдача
+# подвоює блокування (60 с, 120 с, 240 с, ... до LOCKOUT_MAX_SEC)
+LOCKOUT_AFTER = 5
+LOCKOUT_BASE_SEC = 60
+LOCKOUT_MAX_SEC = 3600
+# Обмеження пам'яті: понад MAX_KEYS забуваються найдавніше використані ключі
+MAX_KEYS = 10000
+
+
+class _Bucket:
+    def __init__(self, now: float, burst: int):
+        self.tokens = float(burst)
+        self.updated = now
+        self.failures = 0
+        self.locked_until = 0.0
+
+
+# Обмежувач спроб OTP у пам'яті процесу. Перевірка виконується до будь-яких запитів у БД,
+# тож перебір кодів не навантажує базу й обчислення OTP.
+# failures_only: маркер списується не за кожну спробу, а лише за невдалу
+class OtpThrottle:
+    def __init__(self, burst: int = BURST, rate_per_sec: float = RATE_PER_SEC,
+                 lockout_after: int = LOCKOUT_AFTER, failures_only: bool = False):
+        self.burst = burst
+        self.rate_per_sec = rate_per_sec
+        self.lockout_after = lockout_after
+        self.failures_only = failures_only
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # LRU: ключ -> _Bucket
+        self.counters = {"allowed": 0, "throttled": 0, "locked_out": 0, "failures": 0, "lockouts": 0}
+
+    # Повертає 0, якщо спробу дозволено (і списує маркер), інакше — скільки секунд чекати
+    def check(self, key: tuple, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_KEYS:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = _Bucket(now, self.burst)
+            else:
+                self._buckets.move_to_end(key)
+
+            if bucket.locked_until > now:
+                self.counters["locked_out"] += 1
+                return math.ceil(bucket.locked_until - now)
+
+            self._refill(bucket, now)
+            if bucket.tokens < 1:
+                self.counters["throttled"] += 1
+                return math.ceil((1 - bucket.tokens) / self.rate_per_sec)
+            if not self.failures_only:
+                bucket.tokens -= 1
+            self.counters["allowed"] += 1
+            return 0
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate_per_sec)
+        bucket.updated = now
+
+    def record_failure(self, key: tuple, now: float | None = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return
+            if self.failures_only:
+                self._refill(bucket, now)
+                bucket.tokens = max(0.0, bucket.tokens - 1)
+            bucket.failures += 1
+            self.counters["failures"] += 1
+            if bucket.failures >= self.lockout_after:
+                delay = min(LOCKOUT_BASE_SEC * 2 ** (bucket.failures - self.lockout_after), LOCKOUT_MAX_SEC)
+                bucket.locked_until = now + delay
+                self.counters["lockouts"] += 1
+
+    # Правильний код скидає лічильник невдач
+    def record_success(self, key: tuple):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.failures = 0
+
+    def stats(self, now: float | None = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            return {
+                **self.counters,
+                "tracked_keys": len(self._buckets),
+                "locked_keys": sum(1 for b in self._buckets.values() if b.locked_until > now),
+            }
+
+
+otp_throttle = OtpThrottle()
+address_throttle = OtpThrottle(ADDRESS_BURST, ADDRESS_RATE_PER_SEC, ADDRESS_LOCKOUT_AFTER, failures_only=True)
@@ -0,0 +1,76 @@
+import re
+
+# Транслітерація за національним стандартом (Постанова КМУ №55 від 27.01.2010)
+UA_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e",
+    "є": "ie", "ж": "zh", "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i",
+    "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch",
+    "ш": "sh", "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "'": "", "’": "",
+    "ʼ": "",
+}
+
+# На початку слова є, ї, й, ю, я передаються інакше
+UA_TO_LATIN_INITIAL = {"є": "ye", "ї": "yi", "й": "y", "ю": "yu", "я": "ya"}
+
+# Спрощені фонетичні заміни; порядок має значення (довші спершу)
+PHONETIC_RULES = [
+    ("shch", "sch"), ("kh", "h"), ("zh", "j"), ("ts", "c"), ("tz", "c"),
+    ("ya", "ja"), ("ia", "ja"), ("yu", "ju"), ("iu", "ju"), ("ye", "je"),
+    ("ie", "je"), ("yi", "i"), ("w", "v"), ("x", "ks"), ("ck", "k"),
+    ("q", "k"), ("y", "i"),
+]
+
+TOKEN_RE = re.compile(r"[\w'’ʼ]+", re.UNICODE)
+
+
+# Транслітерує одне слово кирилицею в латиницю
+def transliterate(word: str) -> str:
+    word = word.lower()
+    result = []
+    for i, ch in enumerate(word):
+        if i == 0 and ch in UA_TO_LATIN_INITIAL:
+            result.append(UA_TO_LATIN_INITIAL[ch])
+        elif ch == "г" and i > 0 and word[i - 1] == "з":
+            # Сполучення "зг" передається як "zgh"
+            result.append("gh")
+        else:
+            result.append(UA_TO_LATIN.get(ch, ch))
+    return "".join(result)
+
+
+# Фонетичний ключ, який зводить різні варіанти написання до одного
+def phonetic_key(word: str) -> str:
+    key = transliterate(word)
+    for src, dst in PHONETIC_RULES:
+        key = key.replace(src, dst)
+    # Подвоєні літери скорочуються до однієї
+    return re.sub(r"(.)\1+", r"\1", key)
+
+
+# Розбиває текст на слова
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [t.lower() for t in TOKEN_RE.findall(text)]
+
+
+# Усі ключі для слова: {"translit": ..., "phonetic": ...}
+def search_keys(word: str) -> dict[str, str]:
+    return {
+        "translit": transliterate(word),
+        "phonetic": phonetic_key(word),
+    }
+
+
+# Триграми слів (з доповненням пробілами, як у pg_trgm) у фонетичній формі,
+# щоб кирилиця та латиниця давали однакові триграми
+def trigrams(text: str | None) -> set[str]:
+    result = set()
+    for word in tokenize(text):
+        key = phonetic_key(word)
+        if not key:
+            continue
+        padded = f"  {key} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result